@@ -41,6 +41,11 @@ class Settings:
         print("Warning: ADMIN_IDS is not set in .env")
     
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FILE: Optional[str] = os.getenv("LOG_FILE", "app.log") or None
+    # "logger=rate,...": fraction of INFO/DEBUG lines kept for the per-update loggers; WARNING and above are never sampled
+    LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "app.middlewares=0.1")
+    # "logger=LEVEL,...", e.g. "app.middlewares.db=WARNING" to demote a chatty logger entirely
+    LOG_LEVEL_OVERRIDES: str = os.getenv("LOG_LEVEL_OVERRIDES", "")
 
     deep_seek_api_key: str = os.getenv("DEEP_SEEK_API_KEY", "YOUR_DEEP_SEEK_API_KEY_HERE")
 
@@ -52,6 +57,97 @@ class Settings:
 
     TRIAL_PERIOD_DAYS: int = 7
 
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    # Writes refresh only this process's cache. Polling runs a single instance, so they take effect at once there;
+    # webhook mode may run several instances, which see another instance's block, unblock or payment only after this TTL
+    USER_CACHE_TTL_SECONDS: int = int(os.getenv(
+        "USER_CACHE_TTL_SECONDS", "2" if os.getenv("BOT_RUN_MODE", "polling").lower() == "webhook" else "60"
+    ))
+    AI_STREAMING_ENABLED: bool = os.getenv("AI_STREAMING_ENABLED", "true").lower() == "true"
+    # Minimum gap between progressive edits of one message; Telegram throttles frequent edits per chat
+    STREAM_EDIT_INTERVAL_SECONDS: float = float(os.getenv("STREAM_EDIT_INTERVAL_SECONDS", "1.5"))
+
+    # Per-model admission limits for AI calls; 0 disables a limit. AI_MODEL_LIMITS overrides them per model as "model=concurrency/rpm/tpm,..."
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+    AI_REQUESTS_PER_MINUTE: int = int(os.getenv("AI_REQUESTS_PER_MINUTE", "500"))
+    AI_TOKENS_PER_MINUTE: int = int(os.getenv("AI_TOKENS_PER_MINUTE", "200000"))
+    AI_MODEL_LIMITS: str = os.getenv("AI_MODEL_LIMITS", "")
+    AI_MAX_RETRIES: int = int(os.getenv("AI_MAX_RETRIES", "2"))
+    AI_RETRY_BASE_DELAY_SECONDS: float = float(os.getenv("AI_RETRY_BASE_DELAY_SECONDS", "0.5"))
+    AI_RETRY_MAX_DELAY_SECONDS: float = float(os.getenv("AI_RETRY_MAX_DELAY_SECONDS", "20"))
+    # Provider order per task ("openai,deepseek"); providers without a configured key are skipped
+    AI_DEFAULT_PROVIDERS: str = os.getenv("AI_DEFAULT_PROVIDERS", "openai,deepseek")
+    AI_CASE_GENERATION_PROVIDERS: str = os.getenv("AI_CASE_GENERATION_PROVIDERS", "openai,deepseek")
+    AI_SOLUTION_ANALYSIS_PROVIDERS: str = os.getenv("AI_SOLUTION_ANALYSIS_PROVIDERS", "openai,deepseek")
+    AI_FEEDBACK_ANALYSIS_PROVIDERS: str = os.getenv("AI_FEEDBACK_ANALYSIS_PROVIDERS", "openai,deepseek")
+    # Latency percentile of the first provider after which a duplicate request goes to the next one; 0 disables hedging
+    AI_CASE_GENERATION_HEDGE_PERCENTILE: float = float(os.getenv("AI_CASE_GENERATION_HEDGE_PERCENTILE", "0.95"))
+    AI_SOLUTION_ANALYSIS_HEDGE_PERCENTILE: float = float(os.getenv("AI_SOLUTION_ANALYSIS_HEDGE_PERCENTILE", "0.95"))
+    AI_FEEDBACK_ANALYSIS_HEDGE_PERCENTILE: float = float(os.getenv("AI_FEEDBACK_ANALYSIS_HEDGE_PERCENTILE", "0"))
+    # Whole-call deadline per task; for streamed replies it bounds the wait for the first and each following chunk
+    AI_DEFAULT_DEADLINE_SECONDS: float = float(os.getenv("AI_DEFAULT_DEADLINE_SECONDS", "30"))
+    AI_CASE_GENERATION_DEADLINE_SECONDS: float = float(os.getenv("AI_CASE_GENERATION_DEADLINE_SECONDS", "45"))
+    AI_SOLUTION_ANALYSIS_DEADLINE_SECONDS: float = float(os.getenv("AI_SOLUTION_ANALYSIS_DEADLINE_SECONDS", "30"))
+    AI_FEEDBACK_ANALYSIS_DEADLINE_SECONDS: float = float(os.getenv("AI_FEEDBACK_ANALYSIS_DEADLINE_SECONDS", "30"))
+    AI_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))
+    AI_BREAKER_RESET_SECONDS: int = int(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+
+    # In-process LRU in front of the feedback_analysis_cache table; 0 keeps only the table
+    FEEDBACK_CACHE_LRU_SIZE: int = int(os.getenv("FEEDBACK_CACHE_LRU_SIZE", "1000"))
+    # Feedback is classified in batches of up to FEEDBACK_BATCH_SIZE texts, at most FEEDBACK_BATCH_MAX_WAIT_SECONDS after the first one
+    FEEDBACK_BATCH_SIZE: int = int(os.getenv("FEEDBACK_BATCH_SIZE", "10"))
+    FEEDBACK_BATCH_MAX_WAIT_SECONDS: float = float(os.getenv("FEEDBACK_BATCH_MAX_WAIT_SECONDS", "30"))
+    # Input-token budgets per AI task as "task=total/references/case_text/user_input,..."; 0 leaves a part unlimited.
+    # Over the total, references are dropped first, then the case text and finally the user's input are cut.
+    AI_PROMPT_BUDGETS: str = os.getenv(
+        "AI_PROMPT_BUDGETS",
+        "case_generation=8000/4000/0/1000,solution_analysis=12000/4000/3000/4000,feedback_analysis=3000/0/0/1000"
+    )
+    # Background job writing short AI digests of reference descriptions, used in prompts instead of the full text.
+    # Each run handles up to REFERENCE_DIGEST_BATCH_SIZE changed references; descriptions within REFERENCE_DIGEST_MAX_TOKENS are kept as is
+    REFERENCE_DIGESTS_ENABLED: bool = os.getenv("REFERENCE_DIGESTS_ENABLED", "true").lower() == "true"
+    REFERENCE_DIGESTS_IN_PROMPTS: bool = os.getenv("REFERENCE_DIGESTS_IN_PROMPTS", "true").lower() == "true"
+    REFERENCE_DIGEST_MAX_TOKENS: int = int(os.getenv("REFERENCE_DIGEST_MAX_TOKENS", "150"))
+    REFERENCE_DIGEST_BATCH_SIZE: int = int(os.getenv("REFERENCE_DIGEST_BATCH_SIZE", "10"))
+    REFERENCE_DIGEST_REFRESH_SECONDS: int = int(os.getenv("REFERENCE_DIGEST_REFRESH_SECONDS", "900"))
+    REFERENCE_CACHE_TTL_SECONDS: int = int(os.getenv("REFERENCE_CACHE_TTL_SECONDS", "300"))
+    # Solution analysis gets the REFERENCE_TOP_K most relevant references, case generation a varied sample; 0 sends all of them
+    REFERENCE_TOP_K: int = int(os.getenv("REFERENCE_TOP_K", "6"))
+    REFERENCE_CASE_SAMPLE_SIZE: int = int(os.getenv("REFERENCE_CASE_SAMPLE_SIZE", "6"))
+    CASE_POOL_SIZE: int = int(os.getenv("CASE_POOL_SIZE", "5"))
+    CASE_POOL_MAX_AGE_HOURS: int = int(os.getenv("CASE_POOL_MAX_AGE_HOURS", "72"))
+    CASE_POOL_REFILL_SECONDS: int = int(os.getenv("CASE_POOL_REFILL_SECONDS", "60"))
+    CASE_POOL_MAX_PER_REFILL: int = int(os.getenv("CASE_POOL_MAX_PER_REFILL", "2"))
+    REQUEST_COUNT_FLUSH_SECONDS: int = int(os.getenv("REQUEST_COUNT_FLUSH_SECONDS", "30"))
+    SUBSCRIPTION_EXPIRY_SWEEP_SECONDS: int = int(os.getenv("SUBSCRIPTION_EXPIRY_SWEEP_SECONDS", "60"))
+
+    FSM_STORAGE: str = os.getenv("FSM_STORAGE", "memory").lower()
+    FSM_CACHE_MAX_SIZE: int = int(os.getenv("FSM_CACHE_MAX_SIZE", "10000"))
+    # How long a clean cached FSM entry is served without re-reading users; it bounds how long another
+    # bot instance can see a state this one replaced, so keep it to a few seconds when running several instances
+    FSM_CACHE_TTL_SECONDS: float = float(os.getenv("FSM_CACHE_TTL_SECONDS", "2"))
+    FSM_FLUSH_INTERVAL_MS: int = int(os.getenv("FSM_FLUSH_INTERVAL_MS", "200"))
+    # redis://host:6379/0, or memory:// for an in-process stand-in (fakeredis if installed, MemoryStorage without the redis package)
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    FSM_REDIS_TTL_SECONDS: int = int(os.getenv("FSM_REDIS_TTL_SECONDS", "0"))
+
+    BOT_RUN_MODE: str = os.getenv("BOT_RUN_MODE", "polling").lower()
+    WEBHOOK_BASE_URL: Optional[str] = os.getenv("WEBHOOK_BASE_URL")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/telegram/webhook")
+    # Required in webhook mode, the same value on every instance (1-256 characters of A-Z, a-z, 0-9, _ and -)
+    WEBHOOK_SECRET_TOKEN: Optional[str] = os.getenv("WEBHOOK_SECRET_TOKEN")
+    WEBHOOK_HOST: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    WEBHOOK_MAX_CONCURRENCY: int = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "50"))
+    WEBHOOK_MAX_PENDING: int = int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+    CHAT_QUEUE_WARN_DEPTH: int = int(os.getenv("CHAT_QUEUE_WARN_DEPTH", "3"))
+    # Only one instance should send trial notifications and run the expiry sweep when several run behind a load balancer
+    SCHEDULED_JOBS_ENABLED: bool = os.getenv("SCHEDULED_JOBS_ENABLED", "true").lower() == "true"
+
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT_SECONDS: int = int(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+
     SUPPORT_EMAIL: Optional[str] = os.getenv("SUPPORT_EMAIL", "BTrainerbot@yandex.com")
     TELEGRAM_CHANNEL_URL: Optional[str] = os.getenv("TELEGRAM_CHANNEL_URL", "https://t.me/BTrainer")
 
@@ -0,0 +1,121 @@
+import logging
+import logging.handlers
+import queue
+import sys
+from typing import Dict, List, Optional
+
+# Attributes every LogRecord has. Anything else on a record came from `extra=` and is rendered as key=value.
+_STANDARD_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class KeyValueFormatter(logging.Formatter):
+    """Renders records as `ts=... level=... logger=... msg="..." key=value ...`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage().replace('"', '\\"')
+        parts = [
+            f"ts={self.formatTime(record)}",
+            f"level={record.levelname}",
+            f"logger={record.name}",
+            f'msg="{message}"',
+        ]
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_RECORD_ATTRS and not key.startswith("_"):
+                parts.append(f"{key}={value}")
+        line = " ".join(parts)
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        elif record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps one of every N records below WARNING for the configured loggers (and their children).
+
+    Rates are fractions: {"app.middlewares.db": 0.1} keeps every 10th INFO/DEBUG line of that logger,
+    0 drops them all. WARNING and above always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self._every: Dict[str, int] = {
+            name: (0 if rate <= 0 else max(1, round(1 / rate))) for name, rate in rates.items()
+        }
+        self._counters: Dict[str, int] = {name: 0 for name in rates}
+
+    def _rule_for(self, logger_name: str) -> Optional[str]:
+        name = logger_name
+        while name:
+            if name in self._every:
+                return name
+            name = name.rpartition(".")[0]
+        return None
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self._every:
+            return True
+        rule = self._rule_for(record.name)
+        if rule is None:
+            return True
+        every = self._every[rule]
+        if every == 0:
+            return False
+        self._counters[rule] += 1
+        return (self._counters[rule] - 1) % every == 0
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves message formatting to the listener thread.
+
+    The stock prepare() renders the message on the caller's thread, the event loop in our case.
+    Log arguments must therefore not be mutated after the call, which holds for the ids and strings we log.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def parse_logger_settings(raw: str) -> Dict[str, str]:
+    """Parses "logger.name=value,other.logger=value" as used by LOG_SAMPLING and LOG_LEVEL_OVERRIDES."""
+    pairs: Dict[str, str] = {}
+    for item in raw.split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            pairs[name.strip()] = value.strip()
+    return pairs
+
+
+def setup_logging(
+    level: str,
+    log_file: Optional[str] = "app.log",
+    sampling: Optional[Dict[str, float]] = None,
+    level_overrides: Optional[Dict[str, str]] = None,
+) -> logging.handlers.QueueListener:
+    """Routes all logging through a queue so file and console writes happen on a background thread.
+
+    Returns the started listener; call stop() on shutdown to drain the queue.
+    """
+    formatter = KeyValueFormatter()
+    handlers: List[logging.Handler] = [logging.StreamHandler(sys.stderr)]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    if sampling:
+        queue_handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    for logger_name, logger_level in (level_overrides or {}).items():
+        logging.getLogger(logger_name).setLevel(logger_level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -2,10 +2,7 @@ CASE_GENERATION_SYSTEM_PROMPT = """Ты — ИИ-ассистент, генер
 Твоя ГЛАВНАЯ ЗАДАЧА — создать реалистичный, но вымышленный, уникальный и **живой** кейс клиента и его проблемы.
 **ВАЖНО: ОСНОВЫВАЙСЯ ИСКЛЮЧИТЕЛЬНО на ПРЕДОСТАВЛЕННЫХ ИСТОЧНИКАХ. Категорически ЗАПРЕЩЕНО использовать любые другие знания, интернет или собственные допущения и упоминать в кейсе про какие-то источники!**
 
-**Обязательные источники для использования (используй ТОЛЬКО их):**
---- НАЧАЛО ИСТОЧНИКОВ ---
-{formatted_references}
---- КОНЕЦ ИСТОЧНИКОВ ---
+**Обязательные источники для использования (используй ТОЛЬКО их)** приведены в сообщении пользователя между строками «--- НАЧАЛО ИСТОЧНИКОВ ---» и «--- КОНЕЦ ИСТОЧНИКОВ ---».
 
 Твоя цель — сгенерировать уникальные, живые кейсы, максимально используя информацию из предоставленных источников. Внимательно изучи ВСЕ источники, синтезируй из них информацию для кейса. Связывай описание клиента, проблемы, мысли, эмоции, поведение с информацией из этих источников.
 Если для какого-либо аспекта кейса (клиент, проблема/симптомы, проявления проблемы) информация в предоставленных источниках действительно отсутствует или явно недостаточна для полноценного описания, КРАТКО и КОНКРЕТНО укажи это В КОНЦЕ соответствующей части 'description'. Например: 'Подробности семейного анамнеза клиента в источниках не представлены.' или 'Эмоциональные реакции на специфические ситуации X не детализированы в источниках.' **Не добавляй общих фраз о ВОЗМОЖНОЙ нехватке информации, если ты не констатировал ее фактическое отсутствие для конкретного пункта.** НЕ ПРИДУМЫВАЙ недостающую информацию.
@@ -27,7 +24,7 @@ JSON должен содержать три ключа:
 
 **Пример JSON ответа:**
 ```json
-{{
+{
   "title": "Кейс: Социальная тревожность у разработчика",
   "description": "Алексей, 28 лет, программист. Испытывает выраженную тревогу в ситуациях социального взаимодействия на работе, особенно во время совещаний. Его основные мысли: 'Я скажу глупость', 'Меня осудят коллеги'. Эмоции: страх, стыд. Поведение: избегает высказываться, часто молчит, отказывается от участия в неформальных мероприятиях.",
   "supporting_questions": [
@@ -36,10 +33,16 @@ JSON должен содержать три ключа:
     "Какие факторы могут поддерживать социальную тревожность Алексея?",
     "Какие поведенческие эксперименты могли бы помочь Алексею проверить его негативные мысли?"
   ]
-}}
+}
 ```
 """
 
+# The system prompts above carry no variable content, so every call of a task shares a byte-identical prefix
+# that OpenAI-compatible providers can serve from their prompt cache. References, cases and user input go last.
+REFERENCES_BLOCK_TEMPLATE = "--- НАЧАЛО ИСТОЧНИКОВ ---\n{formatted_references}\n--- КОНЕЦ ИСТОЧНИКОВ ---"
+
+CASE_GENERATION_USER_PROMPT_TEMPLATE = "{references_block}\n\n{request}"
+
 CASE_GENERATION_USER_PROMPT = "Сгенерируй, пожалуйста, новый кейс для КПТ-терапевта. **Строго следуй инструкциям системного сообщения, особенно в части ИСКЛЮЧИТЕЛЬНОГО использования предоставленных источников.**"
 
 
@@ -57,13 +60,13 @@ SOLUTION_ANALYSIS_SYSTEM_PROMPT = """
 **В таких случаях НЕ ПРОВОДИ детальный анализ по пунктам "Что получилось хорошо", "Что можно усилить" и т.д.**
 Вместо этого, твой JSON ответ ДОЛЖЕН СТРОГО СООТВЕТСТВОВАТЬ следующей структуре:
 ```json
-{{
+{
   "strengths": [],
   "areas_for_improvement": [],
   "overall_impression": "Понимаю, что случай может показаться сложным, или вы пока не уверены, с чего начать. С точки зрения КПТ, при анализе подобных кейсов полезно подумать о следующем:\n\n1.  <b>Автоматические мысли:</b> Какие негативные мысли могут часто возникать у клиента в описанных ситуациях? (Например, о себе, своих способностях, будущем, отношении других людей).\n2.  <b>Эмоции:</b> Какие ключевые эмоции испытывает клиент (например, грусть, тревога, вина, безнадежность), и как они могут быть связаны с его мыслями и поведением?\n3.  <b>Поведенческие паттерны:</b> Какие действия или какое бездействие клиента (например, избегание, снижение активности, самоизоляция) вы замечаете, и как это поведение может усугублять его состояние?\n4.  <b>Связь Мысли-Эмоции-Поведение:</b> Попробуйте проследить, как мысли клиента влияют на его эмоции, а эмоции, в свою очередь, на его поступки (и наоборот).\n5.  <b>Возможные мишени для КПТ:</b> Какие из этих мыслей или поведенческих паттернов могли бы стать первоочередными целями для терапевтической работы?\n\nПожалуйста, попробуйте сформулировать ваши гипотезы или начальный план, опираясь на эти направления. Даже несколько мыслей по каждому пункту помогут дать более предметную обратную связь.",
   "solution_rating": "insufficient_input",
   "sources_referenced": []
-}}
+}
 ```
 **Не добавляй никаких других полей или информации в JSON, если решение не содержательное.**
 
@@ -74,10 +77,7 @@ SOLUTION_ANALYSIS_SYSTEM_PROMPT = """
  **Важно (для содержательных решений):** Не используй информацию вне предоставленных источников (включая личный опыт, интернет или догадки). 
 Ты можешь ссылаться на общепринятые стандарты КПТ только если они подтверждаются или не противоречат источникам.
 
- **Источники анализа (используй только их, если решение содержательное):**
---- НАЧАЛО ИСТОЧНИКОВ ---
-{formatted_references}
---- КОНЕЦ ИСТОЧников ---
+ **Источники анализа (используй только их, если решение содержательное)** приведены в сообщении пользователя между строками «--- НАЧАЛО ИСТОЧНИКОВ ---» и «--- КОНЕЦ ИСТОЧНИКОВ ---».
 
  **Структура анализа (оцени через призму источников, ЕСЛИ РЕШЕНИЕ СОДЕРЖАТЕЛЬНО):**
 1. **Что получилось хорошо:** Отметь, что в решении особенно ценно, полезно, соответствует подходу. Упомяни конкретные элементы, на которые можно опереться в будущем.
@@ -95,7 +95,7 @@ SOLUTION_ANALYSIS_SYSTEM_PROMPT = """
 
  **Формат ответа — строго JSON (ЕСЛИ РЕШЕНИЕ СОДЕРЖАТЕЛЬНО). Пример:**
 ```json
-{{
+{
   "strengths": [
     "Хорошо определены автоматические мысли клиента, как рекомендовано в источнике «Название 1».",
     "Структура сессии выстроена в духе КПТ, согласно источнику «Название 2»."
@@ -108,7 +108,7 @@ SOLUTION_ANALYSIS_SYSTEM_PROMPT = """
   "overall_impression": "Решение в целом отражает принципы КПТ. Есть потенциал для развития в некоторых аспектах. Источники позволили провести достаточно полный анализ.",
   "solution_rating": "partially_meets_expectations",
   "sources_referenced": ["Название 1", "Название 2", "Название 3"]
-}}
+}
 ```
 
 ---
@@ -135,6 +135,7 @@ SOLUTION_ANALYSIS_USER_PROMPT_TEMPLATE = (
     "Цель анализа — поддержать начинающего терапевта, помочь увидеть сильные стороны и области, которые можно развить. "
     "**Важно:** ориентируйся ТОЛЬКО на предоставленные источники и следуй инструкциям из системного сообщения. "
     "Фокусируйся на обучении и росте, избегай критических и оценочных формулировок.\n\n"
+    "{references_block}\n\n"
     "**Кейс:**\n{case_description}\n\n"
     "**Решение терапевта:**\n{user_solution_text}\n\n"
     "Предоставь свой анализ строго в формате JSON, согласно описанной структуре."
@@ -196,3 +197,38 @@ FEEDBACK_ANALYSIS_USER_PROMPT_TEMPLATE = """Проанализируй след
 
 Пожалуйста, верни свой анализ в формате JSON, как указано в системных инструкциях.
 """
+
+
+FEEDBACK_BATCH_ANALYSIS_INSTRUCTIONS = """
+
+**Пакетный режим:** в этом запросе несколько отзывов разных пользователей. Каждый отзыв анализируйте независимо от остальных по тем же правилам.
+Ваш ответ ДОЛЖЕН быть СТРОГО JSON объектом вида {"results": [...]}, где "results" — массив с одним элементом на каждый отзыв.
+Каждый элемент содержит ключ "id" (число из заголовка отзыва) и ключи "is_meaningful", "reason", "category", описанные выше.
+"""
+
+FEEDBACK_BATCH_ANALYSIS_SYSTEM_PROMPT = FEEDBACK_ANALYSIS_SYSTEM_PROMPT + FEEDBACK_BATCH_ANALYSIS_INSTRUCTIONS
+
+FEEDBACK_BATCH_ITEM_TEMPLATE = """--- ОТЗЫВ id={item_id} НАЧАЛО ---
+{feedback_text}
+--- ОТЗЫВ id={item_id} КОНЕЦ ---
+"""
+
+FEEDBACK_BATCH_ANALYSIS_USER_PROMPT_TEMPLATE = """Проанализируй следующие отзывы пользователей ({count} шт.):
+
+{feedback_items}
+Пожалуйста, верни анализ каждого отзыва в формате JSON, как указано в системных инструкциях.
+"""
+
+REFERENCE_DIGEST_SYSTEM_PROMPT = """Ты — редактор справочных материалов для ИИ-ассистента, который обучает КПТ-терапевтов.
+Сожми описание источника в краткий конспект не длиннее {max_words} слов.
+Сохрани: ключевые понятия, техники и протоколы, целевые расстройства и проблемы, важные ограничения и оговорки.
+Убери: общие слова, рекламные формулировки, повторы, биографию авторов.
+Не добавляй ничего, чего нет в исходном описании. Ответь только текстом конспекта, без заголовков и пояснений.
+"""
+
+REFERENCE_DIGEST_USER_PROMPT_TEMPLATE = """Тип источника: {source_type}
+
+--- ОПИСАНИЕ НАЧАЛО ---
+{description}
+--- ОПИСАНИЕ КОНЕЦ ---
+"""
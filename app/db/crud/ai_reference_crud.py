@@ -5,6 +5,8 @@ from sqlalchemy import func, update, delete
 from typing import Optional, List, Dict, Any
 
 from ..models import AIReference, AISourceType # Ensure AISourceType is imported if used in function signatures or type hints for data
+from app.services.reference_cache import reference_cache, ActiveReferenceSet
+from app.core.config import settings
 
 import logging
 logger = logging.getLogger(__name__)
@@ -21,6 +23,7 @@ async def create_ai_reference(db: AsyncSession, source_data: Dict[str, Any]) ->
     db.add(db_source)
     await db.commit()
     await db.refresh(db_source)
+    reference_cache.bump()
     logger.info(f"Created AI Reference: ID {db_source.id}, Type: {db_source.source_type}, Desc: {db_source.description[:50]}")
     return db_source
 
@@ -70,6 +73,7 @@ async def update_ai_reference(db: AsyncSession, reference_id: int, update_data:
     
     await db.commit()
     await db.refresh(db_source)
+    reference_cache.bump()
     logger.info(f"Updated AI Reference: ID {db_source.id}")
     return db_source
 
@@ -81,11 +85,15 @@ async def delete_ai_reference(db: AsyncSession, reference_id: int) -> bool:
     
     await db.delete(db_source)
     await db.commit()
+    reference_cache.bump()
     logger.info(f"Deleted AI Reference: ID {reference_id}")
     return True
 
 async def get_active_ai_references_for_prompt(db: AsyncSession) -> List[Dict[str, str]]:
-    stmt = select(AIReference.source_type, AIReference.description, AIReference.url, AIReference.citation_details).filter(AIReference.is_active == True).order_by(AIReference.id)
+    stmt = select(
+        AIReference.source_type, AIReference.description, AIReference.url, AIReference.citation_details,
+        AIReference.digest, AIReference.digest_source_updated_at, AIReference.updated_at
+    ).filter(AIReference.is_active == True).order_by(AIReference.id)
     result = await db.execute(stmt)
     
     formatted_sources = []
@@ -98,6 +106,45 @@ async def get_active_ai_references_for_prompt(db: AsyncSession) -> List[Dict[str
             source_entry["url"] = row.url
         if row.citation_details:
             source_entry["citation"] = row.citation_details
+        if settings.REFERENCE_DIGESTS_IN_PROMPTS and row.digest and row.digest_source_updated_at == row.updated_at:
+            source_entry["digest"] = row.digest
         formatted_sources.append(source_entry)
         
-    return formatted_sources 
\ No newline at end of file
+    return formatted_sources
+
+async def get_references_needing_digest(db: AsyncSession, limit: int, exclude_ids: Optional[List[int]] = None) -> List[AIReference]:
+    """Active references without a digest or whose row changed since the digest was written."""
+    stmt = (
+        select(AIReference)
+        .filter(
+            AIReference.is_active == True,
+            (AIReference.digest.is_(None)) | (AIReference.digest_source_updated_at.is_distinct_from(AIReference.updated_at)),
+        )
+        .order_by(AIReference.id)
+        .limit(limit)
+    )
+    if exclude_ids:
+        stmt = stmt.filter(AIReference.id.not_in(exclude_ids))
+    result = await db.execute(stmt)
+    return result.scalars().all()
+
+async def save_reference_digest(db: AsyncSession, reference_id: int, digest: str, source_updated_at: datetime.datetime) -> bool:
+    """Stores a digest unless the reference was edited after source_updated_at; updated_at itself is left untouched."""
+    stmt = (
+        update(AIReference)
+        .where(AIReference.id == reference_id, AIReference.updated_at == source_updated_at)
+        .values(digest=digest, digest_source_updated_at=source_updated_at, updated_at=AIReference.updated_at)
+        .execution_options(synchronize_session=False)
+    )
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.rowcount > 0
+
+async def get_active_reference_set(db: AsyncSession) -> ActiveReferenceSet:
+    reference_set = reference_cache.get()
+    if reference_set:
+        return reference_set
+
+    version = reference_cache.version
+    references = await get_active_ai_references_for_prompt(db)
+    return reference_cache.put(references, version) 
\ No newline at end of file
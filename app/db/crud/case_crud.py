@@ -1,15 +1,17 @@
+import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update, delete
 from typing import List, Optional
 
 from ..models import Case
 
-async def create_case(db: AsyncSession, title: str, case_text: str, ai_model_used: Optional[str] = None, prompt_version: Optional[str] = None) -> Case:
+async def create_case(db: AsyncSession, title: str, case_text: str, ai_model_used: Optional[str] = None, prompt_version: Optional[str] = None, is_pooled: bool = False) -> Case:
     db_case = Case(
         title=title, 
         case_text=case_text, 
         ai_model_used=ai_model_used,
-        prompt_version=prompt_version
+        prompt_version=prompt_version,
+        is_pooled=is_pooled
     )
     db.add(db_case)
     await db.flush()
@@ -21,7 +23,7 @@ async def get_case(db: AsyncSession, case_id: int) -> Optional[Case]:
     return await db.get(Case, case_id)
 
 async def get_cases(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[Case]:
-    result = await db.execute(select(Case).order_by(Case.id.desc()).offset(skip).limit(limit))
+    result = await db.execute(select(Case).filter(Case.is_pooled == False).order_by(Case.id.desc()).offset(skip).limit(limit))
     return result.scalars().all()
 
 async def get_random_case(db: AsyncSession) -> Optional[Case]:
@@ -29,5 +31,39 @@ async def get_random_case(db: AsyncSession) -> Optional[Case]:
     return result.scalars().first()
 
 async def count_all_cases(db: AsyncSession) -> int:
-    result = await db.execute(select(func.count(Case.id)))
+    result = await db.execute(select(func.count(Case.id)).filter(Case.is_pooled == False))
     return result.scalar_one()
+
+def _pool_cutoff(max_age_hours: int) -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=max_age_hours)
+
+async def claim_pooled_case(db: AsyncSession, max_age_hours: int) -> Optional[Case]:
+    # SKIP LOCKED lets concurrent claimers each take a different row instead of queueing on the oldest one.
+    next_case_id = (
+        select(Case.id)
+        .filter(Case.is_pooled == True, Case.generated_at >= _pool_cutoff(max_age_hours))
+        .order_by(Case.generated_at)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await db.execute(
+        update(Case)
+        .where(Case.id == next_case_id)
+        .values(is_pooled=False)
+        .returning(Case)
+        .execution_options(synchronize_session=False)
+    )
+    return result.scalars().first()
+
+async def count_pooled_cases(db: AsyncSession, max_age_hours: int) -> int:
+    result = await db.execute(
+        select(func.count(Case.id)).filter(Case.is_pooled == True, Case.generated_at >= _pool_cutoff(max_age_hours))
+    )
+    return result.scalar_one()
+
+async def delete_stale_pooled_cases(db: AsyncSession, max_age_hours: int) -> int:
+    result = await db.execute(
+        delete(Case).where(Case.is_pooled == True, Case.generated_at < _pool_cutoff(max_age_hours))
+    )
+    return result.rowcount
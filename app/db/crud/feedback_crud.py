@@ -1,10 +1,12 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
+from sqlalchemy import update, func, values, column, Integer, Boolean, String, Text, JSON
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 
-from app.db.models import Feedback, User, Solution
+from app.db.models import Feedback, User, Solution, FeedbackAnalysisCache
 
 
 async def create_feedback(
@@ -30,6 +32,68 @@ async def create_feedback(
     return db_feedback
 
 
+async def update_feedback_analyses(db: AsyncSession, analyses: Dict[int, Dict[str, Any]]) -> int:
+    """Writes AI verdicts for many feedback rows in one UPDATE ... FROM (VALUES ...). analyses maps feedback id to the verdict."""
+    if not analyses:
+        return 0
+    analysis_values = values(
+        column("id", Integer),
+        column("is_meaningful_ai", Boolean),
+        column("ai_analysis_reason", Text),
+        column("ai_analysis_category", String),
+        column("raw_ai_response", JSON),
+        name="analysis_values",
+    ).data([
+        (feedback_id, analysis.get("is_meaningful"), analysis.get("reason"), analysis.get("category"), analysis)
+        for feedback_id, analysis in analyses.items()
+    ])
+    result = await db.execute(
+        update(Feedback)
+        .where(Feedback.id == analysis_values.c.id)
+        .values(
+            is_meaningful_ai=analysis_values.c.is_meaningful_ai,
+            ai_analysis_reason=analysis_values.c.ai_analysis_reason,
+            ai_analysis_category=analysis_values.c.ai_analysis_category,
+            raw_ai_response=analysis_values.c.raw_ai_response,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def get_feedback_pending_analysis(db: AsyncSession, pending_category: str, limit: int) -> List[Feedback]:
+    result = await db.execute(
+        select(Feedback)
+        .where(Feedback.ai_analysis_category == pending_category)
+        .order_by(Feedback.id)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def get_cached_feedback_analysis(db: AsyncSession, text_hash: str) -> Optional[Dict[str, Any]]:
+    """Returns the stored analysis for text_hash and counts the hit in the same statement."""
+    result = await db.execute(
+        update(FeedbackAnalysisCache)
+        .where(FeedbackAnalysisCache.text_hash == text_hash)
+        .values(hit_count=FeedbackAnalysisCache.hit_count + 1, last_hit_at=func.now())
+        .returning(FeedbackAnalysisCache.is_meaningful, FeedbackAnalysisCache.category, FeedbackAnalysisCache.reason)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if row is None:
+        return None
+    return {"is_meaningful": row.is_meaningful, "category": row.category, "reason": row.reason}
+
+
+async def save_feedback_analysis(db: AsyncSession, text_hash: str, is_meaningful: bool, category: str, reason: str) -> None:
+    await db.execute(
+        pg_insert(FeedbackAnalysisCache)
+        .values(text_hash=text_hash, is_meaningful=is_meaningful, category=category, reason=reason)
+        .on_conflict_do_nothing(index_elements=[FeedbackAnalysisCache.text_hash])
+    )
+
+
 async def get_feedback_by_id(db: AsyncSession, feedback_id: int) -> Feedback | None:
     result = await db.execute(
         select(Feedback)
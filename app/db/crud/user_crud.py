@@ -3,14 +3,32 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from sqlalchemy import func, and_
-from typing import Optional, List
-from sqlalchemy import update
+from typing import Optional, List, Dict, Tuple, Any
+from sqlalchemy import update, values, column, BigInteger, Integer, String, JSON
 import logging
 
 from ..models import User, UserRole, SubscriptionStatus, Solution, Transaction
+from app.services.user_access_cache import user_access_cache, UserAccessSnapshot
 
 logger = logging.getLogger(__name__)
 
+
+def compute_access_until(
+    status: SubscriptionStatus,
+    subscription_expires_at: Optional[datetime.datetime],
+    trial_end_date: Optional[datetime.datetime],
+) -> Optional[datetime.datetime]:
+    if status == SubscriptionStatus.ACTIVE:
+        return subscription_expires_at
+    if status == SubscriptionStatus.TRIAL:
+        return trial_end_date
+    return None
+
+
+def _sync_access_until(user: User) -> None:
+    user.access_until = compute_access_until(user.subscription_status, user.subscription_expires_at, user.trial_end_date)
+
+
 async def get_user(db: AsyncSession, user_id: int) -> Optional[User]:
     return await db.get(User, user_id)
 
@@ -20,6 +38,93 @@ async def get_user_by_telegram_id(db: AsyncSession, telegram_id: int) -> Optiona
     return result.scalars().first()
 
 
+async def get_user_access_snapshot(db: AsyncSession, telegram_id: int) -> Optional[UserAccessSnapshot]:
+    snapshot = user_access_cache.get(telegram_id)
+    if snapshot:
+        return snapshot
+
+    generation = user_access_cache.generation
+    result = await db.execute(
+        select(
+            User.id,
+            User.telegram_id,
+            User.role,
+            User.is_blocked,
+            User.subscription_status,
+            User.access_until,
+        ).where(User.telegram_id == telegram_id)
+    )
+    row = result.mappings().first()
+    if not row:
+        return None
+
+    snapshot = UserAccessSnapshot(**row)
+    user_access_cache.put(snapshot, generation)
+    return snapshot
+
+
+async def add_user_request_counts(db: AsyncSession, counts: Dict[int, int]) -> int:
+    if not counts:
+        return 0
+    deltas = values(
+        column("telegram_id", BigInteger),
+        column("delta", Integer),
+        name="request_deltas",
+    ).data(list(counts.items()))
+    result = await db.execute(
+        update(User)
+        .where(User.telegram_id == deltas.c.telegram_id)
+        .values(db_request_count=User.db_request_count + deltas.c.delta)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def expire_overdue_subscriptions(db: AsyncSession) -> List[int]:
+    now = datetime.datetime.now(datetime.timezone.utc)
+    result = await db.execute(
+        update(User)
+        .where(
+            User.subscription_status.in_([SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIAL]),
+            User.access_until <= now,
+        )
+        .values(subscription_status=SubscriptionStatus.EXPIRED, access_until=None)
+        .returning(User.telegram_id)
+        .execution_options(synchronize_session=False)
+    )
+    expired_telegram_ids = list(result.scalars().all())
+    await db.commit()
+    for telegram_id in expired_telegram_ids:
+        user_access_cache.invalidate(telegram_id)
+    return expired_telegram_ids
+
+
+async def get_user_fsm_record(db: AsyncSession, telegram_id: int) -> Optional[Tuple[Optional[str], Dict[str, Any]]]:
+    result = await db.execute(select(User.state, User.fsm_data).where(User.telegram_id == telegram_id))
+    row = result.first()
+    if row is None:
+        return None
+    return row.state, row.fsm_data or {}
+
+
+async def save_user_fsm_records(db: AsyncSession, records: Dict[int, Tuple[Optional[str], Dict[str, Any]]]) -> int:
+    if not records:
+        return 0
+    fsm_values = values(
+        column("telegram_id", BigInteger),
+        column("state", String),
+        column("fsm_data", JSON),
+        name="fsm_values",
+    ).data([(telegram_id, state, data) for telegram_id, (state, data) in records.items()])
+    result = await db.execute(
+        update(User)
+        .where(User.telegram_id == fsm_values.c.telegram_id)
+        .values(state=fsm_values.c.state, fsm_data=fsm_values.c.fsm_data)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
 async def get_user_with_details(db: AsyncSession, telegram_id: int) -> User | None:
     result = await db.execute(
         select(User)
@@ -56,9 +161,11 @@ async def create_user(
         last_active_at=last_seen if last_seen else datetime.datetime.now(datetime.timezone.utc),
         trial_ending_notification_sent=trial_ending_notification_sent
     )
+    _sync_access_until(db_user)
     db.add(db_user)
     await db.commit()
     await db.refresh(db_user)
+    user_access_cache.refresh(db_user)
     return db_user
 
 
@@ -101,8 +208,10 @@ async def update_user(
     if db_user:
         for key, value in update_data_filtered.items():
             setattr(db_user, key, value)
+        _sync_access_until(db_user)
         await db.commit()
         await db.refresh(db_user)
+        user_access_cache.refresh(db_user)
     return db_user
 
 
@@ -159,9 +268,11 @@ async def count_users(db: AsyncSession) -> int:
 
 
 async def get_total_db_request_count(db: AsyncSession) -> int:
+    from app.services.request_counter import request_counter
+
     result = await db.execute(select(func.sum(User.db_request_count).label("total_requests")))
     total = result.scalar_one_or_none()
-    return total if total is not None else 0
+    return (total if total is not None else 0) + request_counter.pending_total()
 
 
 async def count_converted_from_trial_users(db: AsyncSession) -> int:
@@ -192,6 +303,7 @@ async def grant_subscription_to_user(
     values_to_update = {
         "subscription_status": SubscriptionStatus.ACTIVE,
         "subscription_expires_at": new_expiration_date,
+        "access_until": new_expiration_date,
         "current_plan_name": plan_name,
     }
     if was_on_trial:
@@ -207,6 +319,7 @@ async def grant_subscription_to_user(
     )
     result = await db_session.execute(stmt)
     await db_session.commit()
+    user_access_cache.invalidate(telegram_id)
     updated_user = await get_user_by_telegram_id(db_session, telegram_id)
     return updated_user
 
@@ -238,8 +351,10 @@ async def update_user_subscription(
             user.trial_ending_notification_sent = False
             pass 
 
+        _sync_access_until(user)
         await db.commit()
         await db.refresh(user)
+        user_access_cache.refresh(user)
         logger.info(f"User {telegram_id} subscription updated to {status}, plan {plan_name}, expires {expires_at}.")
         return user
     logger.warning(f"Failed to update subscription for non-existent user {telegram_id}.")
@@ -265,9 +380,11 @@ async def grant_trial_period(db: AsyncSession, user_id: int, trial_days: int) ->
     user.trial_end_date = trial_end
     user.trial_ending_notification_sent = False
     user.converted_from_trial = False
+    _sync_access_until(user)
 
     await db.commit()
     await db.refresh(user)
+    user_access_cache.refresh(user)
     logger.info(f"Granted {trial_days}-day trial to user {user.telegram_id} (DB ID: {user.id}). Trial ends: {trial_end}")
     return user
 
@@ -330,8 +447,10 @@ async def cancel_trial_period(db: AsyncSession, user_id: int) -> Optional[User]:
     else:
         logger.warning(f"Attempted to cancel trial for user ID {user_id} (TG: {user.telegram_id}) who is not on trial (status: {user.subscription_status}).")
 
+    _sync_access_until(user)
     await db.commit()
     await db.refresh(user)
+    user_access_cache.refresh(user)
     return user
 
 async def activate_user_subscription(db: AsyncSession, user_id: int, plan_name: str, duration_days: int) -> Optional[User]:
@@ -354,9 +473,11 @@ async def activate_user_subscription(db: AsyncSession, user_id: int, plan_name:
     user.trial_ending_notification_sent = False
     if was_on_trial:
         user.converted_from_trial = True
+    _sync_access_until(user)
 
     await db.commit()
     await db.refresh(user)
+    user_access_cache.refresh(user)
     logger.info(f"Activated subscription '{plan_name}' for user ID {user_id} (TG: {user.telegram_id}) for {duration_days} days. Expires: {new_expiration_date}")
     return user
 
@@ -374,6 +495,8 @@ async def deactivate_user_subscription(db: AsyncSession, user_id: int) -> Option
     else:
         logger.warning(f"Attempted to deactivate subscription for user ID {user_id} (TG: {user.telegram_id}) who has no active subscription (status: {user.subscription_status}).")
 
+    _sync_access_until(user)
     await db.commit()
     await db.refresh(user)
+    user_access_cache.refresh(user)
     return user 
\ No newline at end of file
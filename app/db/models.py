@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLAlchemyEnum, Boolean, SmallInteger, BigInteger, Numeric, JSON
+from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, Enum as SQLAlchemyEnum, Boolean, SmallInteger, BigInteger, Numeric, JSON, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column, declarative_base
 from sqlalchemy.sql import func
 import enum
@@ -42,6 +42,8 @@ class User(Base):
     subscription_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     trial_start_date: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     trial_end_date: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # End of the paid or trial entitlement, derived from the three columns above by the user_crud writers.
+    access_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     is_blocked: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
     db_request_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False, server_default="0")
     converted_from_trial: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False, server_default='false')
@@ -50,6 +52,7 @@ class User(Base):
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
     current_case_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("cases.id", ondelete="SET NULL"), nullable=True)
     state: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    fsm_data: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
     trial_ending_notification_sent: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
     solutions: Mapped[List["Solution"]] = relationship(back_populates="user", cascade="all, delete-orphan")
@@ -61,6 +64,13 @@ class User(Base):
     def __repr__(self):
         return f"<User(id={self.id}, telegram_id={self.telegram_id}, username='{self.username}')>"
 
+# Partial index for the expiry sweeper: only entitled users can become overdue.
+Index(
+    "ix_users_access_until_entitled",
+    User.access_until,
+    postgresql_where=User.subscription_status.in_([SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIAL]),
+)
+
 class Case(Base):
     __tablename__ = "cases"
 
@@ -71,10 +81,14 @@ class Case(Base):
     ai_model_used = Column(String, nullable=True)
     prompt_version = Column(String, nullable=True)
     generated_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Pre-generated by the case pool and not yet handed out to a user.
+    is_pooled = Column(Boolean, default=False, nullable=False, server_default='false')
 
     solutions = relationship("Solution", back_populates="case")
     created_by_user: Mapped[Optional["User"]] = relationship(back_populates="created_cases", foreign_keys=[created_by_user_id])
 
+Index("ix_cases_pooled", Case.generated_at, postgresql_where=Case.is_pooled == True)
+
 class Solution(Base):
     __tablename__ = "solutions"
 
@@ -122,6 +136,21 @@ class Feedback(Base):
     def __repr__(self):
         return f"<Feedback(id={self.id}, user_id={self.user_id}, submitted_at={self.submitted_at}, meaningful_ai={self.is_meaningful_ai})>"
 
+class FeedbackAnalysisCache(Base):
+    __tablename__ = "feedback_analysis_cache"
+
+    # sha256 of the normalized feedback text, see app.services.feedback_analysis_cache.normalize_feedback_text
+    text_hash: Mapped[str] = mapped_column(String(64), primary_key=True)
+    is_meaningful: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    category: Mapped[str] = mapped_column(String, nullable=False)
+    reason: Mapped[str] = mapped_column(Text, nullable=False)
+    hit_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    last_hit_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<FeedbackAnalysisCache(text_hash={self.text_hash[:12]}, meaningful={self.is_meaningful}, category='{self.category}', hits={self.hit_count})>"
+
 class TransactionStatus(str, enum.Enum):
     PENDING = "pending"
     SUCCEEDED = "succeeded"
@@ -178,6 +207,9 @@ class AIReference(Base):
     description: Mapped[str] = mapped_column(Text, nullable=False)
     url: Mapped[Optional[str]] = mapped_column(String(2048), nullable=True)
     citation_details: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    # Compact summary of description used in prompts; valid while digest_source_updated_at equals updated_at
+    digest: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    digest_source_updated_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
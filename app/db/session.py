@@ -6,6 +6,9 @@ from app.core.config import settings
 async_engine = create_async_engine(
     settings.DATABASE_URL, 
     pool_pre_ping=True,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
     echo=settings.LOG_LEVEL == "DEBUG"
 )
 
@@ -15,4 +18,41 @@ AsyncSessionLocal = async_sessionmaker(
     autocommit=False, 
     autoflush=False, 
     expire_on_commit=False
-) 
\ No newline at end of file
+)
+
+
+async def release_connection(session: AsyncSession) -> None:
+    """Ends the session's transaction so its pooled connection is returned before a long external call.
+
+    The session stays usable: the next query checks out a connection again. Objects loaded so far
+    keep their attributes because the session factory uses expire_on_commit=False.
+    """
+    if session.in_transaction():
+        await session.commit()
+
+
+class LazySession:
+    """Stands in for an AsyncSession and only creates the real one on first attribute access.
+
+    Updates whose handlers never touch the database then cost no session setup, no pool checkout
+    and no pre-ping round trip.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession]):
+        self._session_pool = session_pool
+        self._session: AsyncSession | None = None
+
+    @property
+    def is_started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if name in ("_session", "_session_pool"):
+            raise AttributeError(name)
+        if self._session is None:
+            self._session = self._session_pool()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
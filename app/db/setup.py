@@ -1,8 +1,8 @@
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, text, update, case
 from sqlalchemy.orm import sessionmaker
 
 from app.core.config import settings
-from app.db.models import Base
+from app.db.models import Base, User, SubscriptionStatus
 
 sync_db_url = settings.DATABASE_URL
 if settings.DATABASE_URL.startswith("postgresql+asyncpg://"):
@@ -13,11 +13,45 @@ engine = create_engine(sync_db_url)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# create_all() does not alter existing tables, so columns added after the first deploy are listed here.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS access_until TIMESTAMP WITH TIME ZONE",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS fsm_data JSON",
+    "ALTER TABLE cases ADD COLUMN IF NOT EXISTS is_pooled BOOLEAN NOT NULL DEFAULT false",
+    "ALTER TABLE ai_references ADD COLUMN IF NOT EXISTS digest TEXT",
+    "ALTER TABLE ai_references ADD COLUMN IF NOT EXISTS digest_source_updated_at TIMESTAMP WITH TIME ZONE",
+]
+
+def apply_schema_upgrades():
+    print("Applying schema upgrades...")
+    with engine.begin() as connection:
+        for statement in SCHEMA_UPGRADES:
+            connection.execute(text(statement))
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=connection, checkfirst=True)
+
+        backfill = (
+            update(User)
+            .where(
+                User.access_until.is_(None),
+                User.subscription_status.in_([SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIAL]),
+            )
+            .values(access_until=case(
+                (User.subscription_status == SubscriptionStatus.ACTIVE, User.subscription_expires_at),
+                (User.subscription_status == SubscriptionStatus.TRIAL, User.trial_end_date),
+                else_=None,
+            ))
+        )
+        result = connection.execute(backfill)
+        print(f"Backfilled access_until for {result.rowcount} users.")
+
 def create_db_tables():
     print("Attempting to create database tables...")
     try:
         Base.metadata.create_all(bind=engine)
         print("Database tables created successfully (or already exist).")
+        apply_schema_upgrades()
 
         with engine.connect() as connection:
             result = connection.execute(text("SELECT 1"))
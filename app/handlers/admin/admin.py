@@ -18,6 +18,15 @@ from .admin_ai_reference_management import admin_ai_ref_router
 from .filters import AdminTelegramFilter
 from app.db.crud.user_crud import get_total_db_request_count, count_converted_from_trial_users
 from aiogram.utils.formatting import Text, Bold, Italic, Code
+from app.services.ai_service import ai_router
+from app.services.ai_scheduler import ai_scheduler
+from app.services.ai_schemas import structured_output_stats
+from app.services.feedback_analysis_cache import feedback_analysis_cache
+from app.services.feedback_batcher import feedback_batcher
+from app.services.reference_index import reference_index
+from app.services.prompt_budget import prompt_budgeter
+from app.services.reference_digests import reference_digester
+from app.middlewares.ordering import chat_ordering
 
 logger = logging.getLogger(__name__)
 admin_router = Router(name="admin_handlers")
@@ -112,6 +121,100 @@ async def handle_admin_trial_conversion_stats_callback(callback_query: types.Cal
         reply_markup=get_admin_panel_main_keyboard()
     )
 
+BREAKER_STATE_DISPLAY = {
+    "closed": "🟢 закрыт",
+    "open": "🔴 открыт",
+    "half_open": "🟡 пробный запрос",
+}
+
+def _format_ms(value) -> str:
+    return "—" if value is None else f"{value:.0f} мс"
+
+@admin_router.callback_query(F.data == "admin_ai_status", AdminTelegramFilter())
+async def handle_admin_ai_status_callback(callback_query: types.CallbackQuery, session: AsyncSession):
+    await callback_query.answer()
+    logger.debug(f"Admin {callback_query.from_user.id} requested AI status.")
+
+    router_stats = ai_router.stats()
+    feedback_stats = feedback_analysis_cache.stats()
+    batch_stats = feedback_batcher.stats()
+    index_stats = reference_index.stats()
+    digest_stats = reference_digester.stats()
+    ordering_stats = chat_ordering.stats()
+    parts = [Bold("🤖 Состояние AI"), "\n\n", Bold("Провайдеры:"), "\n"]
+    if not router_stats["providers"]:
+        parts.append("Ни один провайдер не настроен.\n")
+    for name, provider in router_stats["providers"].items():
+        p50 = None if provider["p50_s"] is None else provider["p50_s"] * 1000
+        p95 = None if provider["p95_s"] is None else provider["p95_s"] * 1000
+        parts += [
+            Code(name), f": вызовов {provider['calls']}, ошибок {provider['failures']}, ",
+            f"p50 {_format_ms(p50)}, p95 {_format_ms(p95)}, ",
+            "кеш промптов ", Code("—" if provider["cache_hit_rate"] is None else f"{provider['cache_hit_rate']:.0%}"),
+            f" ({provider['cached_prompt_tokens']} из {provider['prompt_tokens']} токенов)\n",
+        ]
+
+    parts += ["\n", Bold("Предохранители (provider/model):"), "\n"]
+    if not router_stats["breakers"]:
+        parts.append("Вызовов еще не было.\n")
+    for name, breaker in router_stats["breakers"].items():
+        line = f": {BREAKER_STATE_DISPLAY.get(breaker['state'], breaker['state'])}, срабатываний {breaker['trips']}, ошибок подряд {breaker['consecutive_failures']}"
+        if breaker["retry_in_s"] is not None:
+            line += f", пробный запрос через {breaker['retry_in_s']:.0f} с"
+        parts += [Code(name), line, "\n"]
+
+    parts += ["\n", Bold("Очередь вызовов (по моделям):"), "\n"]
+    for model, lane in ai_scheduler.stats().items():
+        parts += [
+            Code(model), f": в работе {lane['in_flight']}, ждут {lane['waiting']}, ",
+            f"ожидание в очереди ср. {_format_ms(lane['avg_queue_wait_ms'])}, ",
+            f"ответ провайдера ср. {_format_ms(lane['avg_provider_ms'])}\n",
+        ]
+
+    parts += ["\n", Bold("Размер промптов (по задачам):"), "\n"]
+    budget_stats = prompt_budgeter.stats()
+    if not budget_stats:
+        parts.append("Промптов еще не было.\n")
+    for task, prompt_stats in budget_stats.items():
+        parts += [
+            Code(task), f": вызовов {prompt_stats['calls']}, токенов ср. {prompt_stats['avg_tokens']:.0f}, ",
+            f"макс. {prompt_stats['max_tokens']}, сокращено {prompt_stats['truncated_calls']}\n",
+        ]
+
+    parts += ["\n", Bold("Разбор структурированных ответов (по моделям):"), "\n"]
+    structured_stats = structured_output_stats.stats()
+    if not structured_stats:
+        parts.append("Ответов еще не было.\n")
+    for model, counts in structured_stats.items():
+        parts += [
+            Code(model), f": сразу валидных {counts['ok']}, исправлено повтором {counts['repaired']}, ",
+            f"отброшено {counts['failed']}, доля сбоев {counts['failure_rate']:.1%}\n",
+        ]
+
+    parts += [
+        "\n",
+        "Хеджирование: запущено ", Code(str(router_stats["hedges_started"])), ", выиграло ", Code(str(router_stats["hedges_won"])), "\n",
+        "Переключений на резервного провайдера: ", Code(str(router_stats["failovers"])), "\n",
+        "Превышений дедлайна: ", Code(str(router_stats["deadline_exceeded"])), "\n",
+        "Кеш анализа отзывов: попаданий ", Code(f"{feedback_stats['hit_ratio']:.0%}"),
+        f" (память {feedback_stats['memory_hits']}, БД {feedback_stats['db_hits']}, промахов {feedback_stats['misses']})\n",
+        "Пакетный анализ отзывов: в очереди ", Code(str(batch_stats["pending"])),
+        f", пакетов {batch_stats['batches']}, классифицировано {batch_stats['items_classified']}, без результата {batch_stats['items_failed']}\n",
+        "Отбор источников: выборок ", Code(str(index_stats["selections"])),
+        f", токенов блока источников ~{index_stats['prompt_tokens_full']} → ~{index_stats['prompt_tokens_selected']}\n",
+        "Конспекты источников: создано ", Code(str(digest_stats["digested"])),
+        f", без изменений {digest_stats['kept_as_is']}, ошибок {digest_stats['failures']}, сэкономлено токенов {digest_stats['tokens_saved']}\n",
+        "Очередь обновлений по чатам: чатов в работе ", Code(str(ordering_stats["active_chats"])),
+        f", обновлений в обработке и в очереди {ordering_stats['queued_updates']}, макс. глубина {ordering_stats['max_depth_seen']}\n\n",
+        Italic("Данные текущего процесса с момента запуска."),
+    ]
+
+    await callback_query.message.edit_text(
+        text=Text(*parts).as_markdown(),
+        parse_mode="MarkdownV2",
+        reply_markup=get_admin_panel_main_keyboard()
+    )
+
 @admin_router.message(Command("cancel_admin_action"), AdminTelegramFilter())
 async def handle_cancel_admin_action(message: types.Message, state: FSMContext, session: AsyncSession):
     current_admin_state = await state.get_state()
@@ -5,6 +5,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import math
 
 from app.db.crud.case_crud import count_all_cases, get_cases
+from app.services.case_pool import case_pool
 from app.ui.keyboards import (
     get_admin_cases_menu_keyboard, 
     get_admin_case_list_keyboard
@@ -23,8 +24,15 @@ async def handle_admin_cases_menu_callback(callback_query: types.CallbackQuery,
     await callback_query.answer()
     logger.debug(f"Admin {callback_query.from_user.id} pressed 'admin_cases_menu'.")
     cases_menu_kb = get_admin_cases_menu_keyboard()
+    menu_text = "Управление кейсами:"
+    if case_pool.enabled:
+        pool_depth = await case_pool.depth(session)
+        menu_text += (
+            f"\n\nПул готовых кейсов: {pool_depth}/{case_pool.target_size}"
+            f"\nВыдано из пула: {case_pool.hits}, сгенерировано на лету: {case_pool.misses}"
+        )
     await callback_query.message.edit_text(
-        "Управление кейсами:",
+        menu_text,
         reply_markup=cases_menu_kb
     )
 
@@ -27,6 +27,7 @@ from app.db.crud.user_crud import (
     grant_trial_period, cancel_trial_period, activate_user_subscription, deactivate_user_subscription
 )
 from app.db.crud.admin_log_crud import create_admin_log
+from app.services.request_counter import request_counter
 
 logger = logging.getLogger(__name__)
 admin_user_mgmt_router = Router(name="admin_user_management")
@@ -64,7 +65,7 @@ async def display_user_details(message_or_cq: types.Message | types.CallbackQuer
     details_text += f"📅 Дата регистрации: `{format_datetime_md(db_user.created_at)}`\n"
     details_text += f"🕰️ Последняя активность: `{format_datetime_md(db_user.last_active_at) if db_user.last_active_at else 'Никогда'}`\n"
     details_text += f"🚫 Заблокирован: `{'Да' if db_user.is_blocked else 'Нет'}`\n"
-    details_text += f"📊 Запросов к БД: `{db_user.db_request_count}`\n"
+    details_text += f"📊 Запросов к БД: `{db_user.db_request_count + request_counter.pending_for(db_user.telegram_id)}`\n"
 
     user_actions_kb = get_admin_user_actions_keyboard(db_user)
     
@@ -4,7 +4,7 @@ from aiogram.filters import Filter
 from sqlalchemy.ext.asyncio import AsyncSession # For type hint
 
 from app.core.config import settings
-from app.db.crud.user_crud import get_user_by_telegram_id
+from app.db.crud.user_crud import get_user_access_snapshot
 from app.db.models import UserRole
 
 logger = logging.getLogger(__name__)
@@ -22,7 +22,7 @@ class AdminTelegramFilter(Filter):
         else:
             logger.debug(f"User {user_id} is NOT in ADMIN_IDS list. Checking DB role...")
         
-        db_user = await get_user_by_telegram_id(db=session, telegram_id=user_id)
+        db_user = await get_user_access_snapshot(db=session, telegram_id=user_id)
         
         if db_user and db_user.role == UserRole.ADMIN:
             logger.debug(f"User {user_id} has ADMIN role in DB. Granting access.")
@@ -17,11 +17,21 @@ except ImportError:
 from app.db.crud.user_crud import get_user_by_telegram_id
 from app.db.crud.case_crud import create_case, get_case
 from app.db.crud.solution_crud import create_solution
-from app.db.crud.ai_reference_crud import get_active_ai_references_for_prompt
+from app.db.crud.ai_reference_crud import get_active_reference_set
+from app.services.reference_index import reference_index
 from app.db.models import Solution, Case as DBCase
+from app.db.session import release_connection
+from app.core.config import settings
 from app.ui.keyboards import get_after_case_keyboard, get_after_solution_analysis_keyboard
-from app.services.ai_service import generate_case_from_ai, analyze_solution_with_ai
+from app.services.ai_service import (
+    generate_case_from_ai, stream_case_from_ai, finalize_streamed_case, CASE_GENERATION_MODEL,
+    analyze_solution_with_ai, stream_solution_analysis_from_ai, finalize_streamed_solution_analysis,
+)
+from app.services.case_pool import case_pool
+from app.services.reference_cache import ActiveReferenceSet
 from app.states.solve_case import SolveCaseStates
+from app.utils.partial_json import parse_partial_json, IncrementalJsonParser
+from app.utils.throttled_editor import ThrottledMessageEditor
 
 logger = logging.getLogger(__name__)
 case_lifecycle_router = Router(name="case_lifecycle_handlers")
@@ -48,16 +58,109 @@ def manual_text_splitter(text: str, max_chunk_size: int = MAX_MESSAGE_LENGTH) ->
     return chunks
 
 
+def _render_case_preview(raw_text: str) -> str | None:
+    partial_case = parse_partial_json(raw_text)
+    if not isinstance(partial_case, dict) or not partial_case.get("title"):
+        return None
+    title = partial_case.get("title")
+    description = partial_case.get("description")
+    if not isinstance(title, str) or (description is not None and not isinstance(description, str)):
+        return None
+    return f"<b>{html.escape(title)}</b>\n\n{html.escape(description or '')} ▌"
+
+
+async def _stream_case_into_message(status_message: types.Message, reference_set: ActiveReferenceSet, user_id: int) -> dict | None:
+    editor = ThrottledMessageEditor(status_message, min_interval=settings.STREAM_EDIT_INTERVAL_SECONDS, parse_mode=ParseMode.HTML)
+    chunks: list[str] = []
+    try:
+        async for delta in stream_case_from_ai(active_references=reference_set.references, formatted_references=reference_set.prompt_block):
+            chunks.append(delta)
+            if editor.is_due():
+                preview = _render_case_preview("".join(chunks))
+                if preview:
+                    editor.update(preview)
+    except Exception as e:
+        logger.error(f"Streaming case generation failed for user {user_id} after {len(chunks)} chunks: {e}", exc_info=True)
+        return None
+    finally:
+        await editor.close()
+    logger.debug(f"Streamed case for user {user_id}: {len(chunks)} chunks, {editor.edits} progressive edits.")
+    return await finalize_streamed_case(
+        "".join(chunks), active_references=reference_set.references, formatted_references=reference_set.prompt_block
+    )
+
+
+def _format_analysis_text(case_title: str, analysis: dict) -> str:
+    """Renders the analysis sections present in analysis; a partial dict from a stream renders the sections received so far."""
+    sections = [f"<b>{html.escape('Анализ вашего решения для кейса:')}</b> \"{html.escape(case_title)}\""]
+    for key, heading in (("strengths", "Сильные стороны:"), ("areas_for_improvement", "Области для улучшения:")):
+        if key in analysis:
+            items = analysis[key] if isinstance(analysis[key], list) else []
+            items_text = "\n".join([f"- {html.escape(str(item))}" for item in items]) if items else "(Не отмечено)"
+            sections.append(f"<b>{html.escape(heading)}</b>\n{items_text}")
+    if "overall_impression" in analysis:
+        sections.append(f"<b>{html.escape('Общее впечатление:')}</b>\n{analysis.get('overall_impression', 'N/A')}")
+    return "\n\n".join(sections) + "\n\n"
+
+
+async def _stream_analysis_into_message(
+    status_message: types.Message,
+    case_title: str,
+    case_text: str,
+    solution_text: str,
+    reference_set: ActiveReferenceSet,
+    user_id: int
+) -> dict | None:
+    editor = ThrottledMessageEditor(status_message, min_interval=settings.STREAM_EDIT_INTERVAL_SECONDS, parse_mode=ParseMode.HTML)
+    parser = IncrementalJsonParser()
+    try:
+        async for delta in stream_solution_analysis_from_ai(
+            case_text,
+            solution_text,
+            active_references=reference_set.references,
+            formatted_references=reference_set.prompt_block
+        ):
+            if parser.feed(delta):
+                editor.update(_format_analysis_text(case_title, parser.completed) + "⏳ …")
+    except Exception as e:
+        logger.error(f"Streaming solution analysis failed for user {user_id}: {e}", exc_info=True)
+        return None
+    finally:
+        await editor.close()
+    logger.debug(f"Streamed solution analysis for user {user_id}: {len(parser.completed)} sections, {editor.edits} progressive edits.")
+    return await finalize_streamed_solution_analysis(
+        parser.text,
+        case_text,
+        solution_text,
+        active_references=reference_set.references,
+        formatted_references=reference_set.prompt_block
+    )
+
+
 async def _generate_new_case_content(
     session: AsyncSession,
-    user_id: int
+    user_id: int,
+    status_message: types.Message | None = None
 ) -> tuple[DBCase | None, str | None]:
-    """Generates a new case, saves it to DB, and returns the case object and formatted text or an error message."""
-    active_references = await get_active_ai_references_for_prompt(db=session)
+    """Generates a new case, saves it to DB, and returns the case object and formatted text or an error message.
+
+    With status_message the case is streamed into that message while it is being generated.
+    """
+    pooled_case = await case_pool.claim(session)
+    if pooled_case:
+        logger.info(f"Case {pooled_case.id} served from the case pool to user {user_id}.")
+        return pooled_case, None
+
+    reference_set = reference_index.for_case_generation(await get_active_reference_set(db=session))
+    active_references = reference_set.references
     if not active_references:
         logger.warning(f"No active AI references found in DB for user {user_id} during case generation.")
 
-    case_data = await generate_case_from_ai(active_references=active_references)
+    await release_connection(session)
+    if status_message is not None and settings.AI_STREAMING_ENABLED:
+        case_data = await _stream_case_into_message(status_message, reference_set, user_id)
+    else:
+        case_data = await generate_case_from_ai(active_references=active_references, formatted_references=reference_set.prompt_block)
 
     if not case_data or not case_data.get("title") or not case_data.get("description"):
         error_message = "К сожалению, не удалось сгенерировать кейс в данный момент. Попробуйте, пожалуйста, позже."
@@ -66,7 +169,7 @@ async def _generate_new_case_content(
 
     case_title = case_data["title"]
     case_description = case_data["description"]
-    ai_model_name = "gpt-4o-mini"
+    ai_model_name = CASE_GENERATION_MODEL
     prompt_version_placeholder = "generic_case_prompt_v1_json_output_with_refs" 
 
     try:
@@ -90,7 +193,7 @@ async def handle_new_case_button(message: types.Message, state: FSMContext, sess
     logger.info(f"User {message.from_user.id} requested a new case via '📝 Новый кейс' button.")
     status_msg = await message.answer("⏳ Генерирую кейс для вас, это может занять некоторое время...")
     
-    new_case, error = await _generate_new_case_content(session, message.from_user.id)
+    new_case, error = await _generate_new_case_content(session, message.from_user.id, status_message=status_msg)
     
     if error:
         await status_msg.edit_text(html.escape(error))
@@ -111,7 +214,7 @@ async def handle_request_case_button(message: types.Message, state: FSMContext,
     logger.info(f"User {message.from_user.id} requested a new case via '💼 Получить кейс' button.")
     status_msg = await message.answer("⏳ Генерирую кейс для вас, это может занять некоторое время...")
     
-    new_case, error = await _generate_new_case_content(session, message.from_user.id)
+    new_case, error = await _generate_new_case_content(session, message.from_user.id, status_message=status_msg)
     
     if error:
         await status_msg.edit_text(html.escape(error))
@@ -136,7 +239,7 @@ async def handle_request_another_case_callback(
     await callback_query.answer()
     await callback_query.message.edit_text("⏳ Генерирую новый кейс для вас, подождите немного...", reply_markup=None)
     
-    new_case, error = await _generate_new_case_content(session, callback_query.from_user.id)
+    new_case, error = await _generate_new_case_content(session, callback_query.from_user.id, status_message=callback_query.message)
     
     if error:
         await callback_query.message.edit_text(html.escape(error), reply_markup=None, parse_mode=ParseMode.HTML)
@@ -165,7 +268,7 @@ async def handle_request_case_again_callback(
         reply_markup=None
     )
     
-    new_case, error = await _generate_new_case_content(session, callback_query.from_user.id)
+    new_case, error = await _generate_new_case_content(session, callback_query.from_user.id, status_message=status_msg)
     
     if error:
         await status_msg.edit_text(html.escape(error), reply_markup=None, parse_mode=ParseMode.HTML)
@@ -218,16 +321,26 @@ async def handle_solution_submission(
     solution_text = message.text
     status_message = await message.answer("⏳ Анализирую ваше решение... Это может занять некоторое время.")
 
-    active_references = await get_active_ai_references_for_prompt(db=session)
+    reference_set = reference_index.for_analysis(
+        await get_active_reference_set(db=session), f"{original_case.case_text}\n{solution_text}"
+    )
+    active_references = reference_set.references
     if not active_references:
         logger.warning(f"No active AI references found in DB for user {user_telegram_id} during solution analysis for case {current_case_id}.")
 
+    await release_connection(session)
     try:
-        analysis_report = await analyze_solution_with_ai(
-            original_case.case_text, 
-            solution_text,
-            active_references=active_references
-        )
+        if settings.AI_STREAMING_ENABLED:
+            analysis_report = await _stream_analysis_into_message(
+                status_message, case_title, original_case.case_text, solution_text, reference_set, user_telegram_id
+            )
+        else:
+            analysis_report = await analyze_solution_with_ai(
+                original_case.case_text, 
+                solution_text,
+                active_references=active_references,
+                formatted_references=reference_set.prompt_block
+            )
         if not (
             analysis_report and not analysis_report.get("error") and
             isinstance(analysis_report.get("strengths"), list) and
@@ -240,12 +353,6 @@ async def handle_solution_submission(
             await status_message.edit_text("К сожалению, не удалось получить анализ вашего решения от AI (неверный формат или структура ответа). Попробуйте позже.")
             return
 
-        escaped_strengths = [html.escape(s) for s in analysis_report['strengths']] if analysis_report['strengths'] else []
-        escaped_improvements = [html.escape(i) for i in analysis_report['areas_for_improvement']] if analysis_report['areas_for_improvement'] else []
-
-        strengths_text = "\n".join([f"- {s}" for s in escaped_strengths]) if escaped_strengths else "(Не отмечено)" 
-        improvements_text = "\n".join([f"- {i}" for i in escaped_improvements]) if escaped_improvements else "(Не отмечено)"
-        
         RATING_DISPLAY_MAP = {
             "meets_expectations": "Соответствует ожиданиям",
             "partially_meets_expectations": "Частично соответствует ожиданиям",
@@ -256,17 +363,10 @@ async def handle_solution_submission(
         solution_rating_key = analysis_report.get('solution_rating', 'not_applicable')
         solution_rating_display = RATING_DISPLAY_MAP.get(solution_rating_key, solution_rating_key.replace("_", " ").capitalize()) 
 
-        escaped_case_title = html.escape(case_title)
-        overall_impression_text = analysis_report.get('overall_impression', 'N/A') 
         escaped_solution_rating_display = html.escape(solution_rating_display)
 
-        formatted_analysis = (
-            f"<b>{html.escape('Анализ вашего решения для кейса:')}</b> \"{escaped_case_title}\"\n\n"
-            f"<b>{html.escape('Сильные стороны:')}</b>\n{strengths_text}\n\n"
-            f"<b>{html.escape('Области для улучшения:')}</b>\n{improvements_text}\n\n"
-            f"<b>{html.escape('Общее впечатление:')}</b>\n{overall_impression_text}\n\n"
-            #f"<b>{html.escape('Оценка решения:')}</b> {escaped_solution_rating_display}"
-        )
+        formatted_analysis = _format_analysis_text(case_title, analysis_report)
+        #formatted_analysis += f"<b>{html.escape('Оценка решения:')}</b> {escaped_solution_rating_display}"
         raw_analysis_json_string = json.dumps(analysis_report, ensure_ascii=False)
         solution = await create_solution(
             db=session,
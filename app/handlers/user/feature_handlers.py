@@ -17,13 +17,15 @@ from app.db.crud.solution_crud import (
 )
 from app.db import crud
 from app.db.models import SubscriptionStatus, UserRole
+from app.middlewares.db import SKIP_ACCESS_CHECK_FLAG
 from app.db.crud import transaction_crud
 import uuid
 from decimal import Decimal
 from aiogram.types import LabeledPrice
 from app.core.config import settings, is_admin
 from app.states.feedback_states import FeedbackStates
-from app.services import ai_service
+from app.services.feedback_analysis_cache import feedback_analysis_cache, feedback_text_hash
+from app.services.feedback_batcher import feedback_batcher, PENDING_CATEGORY, PENDING_REASON
 from app.utils.formatters import format_datetime_md, escape_md
 
 from app.handlers.payment_handlers import (
@@ -370,6 +372,8 @@ async def process_feedback_text(message: types.Message, session: AsyncSession, s
         await state.clear()
         return
     current_user_role = db_user.role
+    # The rollback below expires db_user, and reloading its attributes lazily is not possible under asyncio
+    db_user_id = db_user.id
 
     ai_analysis_result = None
     is_meaningful_ai = None
@@ -379,33 +383,39 @@ async def process_feedback_text(message: types.Message, session: AsyncSession, s
 
     await message.answer("✨ Спасибо! Ваш отзыв принят и скоро будет рассмотрен.")
 
+    text_hash = feedback_text_hash(feedback_text)
     try:
-        ai_analysis_result = await ai_service.analyze_feedback_substance(feedback_text)
-        if ai_analysis_result:
+        ai_analysis_result = await feedback_analysis_cache.get(session, text_hash)
+        if ai_analysis_result is None:
+            # Classified later in a batch, see feedback_batcher; the row is saved as pending meanwhile.
+            ai_reason = PENDING_REASON
+            ai_category = PENDING_CATEGORY
+        elif ai_analysis_result:
             raw_ai_data = ai_analysis_result
             is_meaningful_ai = ai_analysis_result.get("is_meaningful")
             ai_reason = ai_analysis_result.get("reason", "No reason provided by AI.")
             ai_category = ai_analysis_result.get("category", "unknown")
             logger.info(f"AI analysis for feedback from {user_telegram_id}: Meaningful={is_meaningful_ai}, Category='{ai_category}', Reason='{ai_reason}'")
-        else:
-            logger.warning(f"AI analysis returned None for feedback from {user_telegram_id}.")
-            ai_reason = "AI analysis did not return a result."
 
     except Exception as e:
-        logger.error(f"Error during AI feedback analysis for user {user_telegram_id}: {e}", exc_info=True)
-        ai_reason = f"Error during AI analysis: {str(e)}"
+        logger.error(f"Feedback analysis cache lookup failed for user {user_telegram_id}, queueing for AI analysis: {e}", exc_info=True)
+        await session.rollback()
+        ai_reason = PENDING_REASON
+        ai_category = PENDING_CATEGORY
 
     try:
         new_feedback = await crud.create_feedback(
             db=session, 
-            user_id=db_user.id, 
+            user_id=db_user_id, 
             text=feedback_text,
             is_meaningful_ai=is_meaningful_ai,
             ai_analysis_reason=ai_reason,
             ai_analysis_category=ai_category,
             raw_ai_response=raw_ai_data
         )
-        logger.info(f"Feedback from user {db_user.telegram_id} saved with ID {new_feedback.id}, AI meaningful: {is_meaningful_ai}, Category: {ai_category}.")
+        logger.info(f"Feedback from user {user_telegram_id} saved with ID {new_feedback.id}, AI meaningful: {is_meaningful_ai}, Category: {ai_category}.")
+        if ai_category == PENDING_CATEGORY:
+            feedback_batcher.submit(new_feedback.id, feedback_text, text_hash=text_hash)
         
         response_message = "✅ Готово! Ваш отзыв получен и бережно сохранен."
         response_message += "\nКаждое мнение важно для нас, и мы обязательно его изучим."
@@ -415,7 +425,7 @@ async def process_feedback_text(message: types.Message, session: AsyncSession, s
             reply_markup=get_main_menu_keyboard(user_role=current_user_role)
         )
     except Exception as e:
-        logger.error(f"Failed to save feedback (with AI analysis) for user {db_user.telegram_id}: {e}", exc_info=True)
+        logger.error(f"Failed to save feedback (with AI analysis) for user {user_telegram_id}: {e}", exc_info=True)
         await message.answer(
             "Ой, что-то пошло не так, и ваш отзыв не сохранился. "
             "Пожалуйста, попробуйте отправить его еще раз чуть позже. Мы уже разбираемся!",
@@ -431,7 +441,7 @@ async def cq_main_menu_request_case(query: types.CallbackQuery, session: AsyncSe
     
     status_msg = await query.message.answer("⏳ Генерирую новый кейс для вас, подождите немного...")
     
-    new_case, error = await _generate_new_case_content(session, query.from_user.id)
+    new_case, error = await _generate_new_case_content(session, query.from_user.id, status_message=status_msg)
     
     if error:
         await status_msg.edit_text(error)
@@ -500,7 +510,7 @@ async def cq_main_menu_tariffs(query: types.CallbackQuery, session: AsyncSession
         parse_mode="MarkdownV2"
     )
 
-@feature_router.callback_query(F.data == "main_menu:help")
+@feature_router.callback_query(F.data == "main_menu:help", flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def cq_main_menu_help(query: types.CallbackQuery, state: FSMContext):
     logger.info(f"User {query.from_user.id} selected 'Help' from inline menu.")
     await query.answer()
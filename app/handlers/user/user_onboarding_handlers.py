@@ -20,6 +20,7 @@ from app.ui.keyboards import (
 from app.db.models import SubscriptionStatus, UserRole
 from app.core.config import settings
 from app.states.feedback_states import FeedbackStates
+from app.middlewares.db import SKIP_ACCESS_CHECK_FLAG
 
 logger = logging.getLogger(__name__)
 user_onboarding_router = Router(name="user_onboarding_handlers")
@@ -156,12 +157,12 @@ async def handle_start(message: types.Message, session: AsyncSession, state: FSM
         menu_msg = await message.answer(WELCOME_BACK_TEXT, reply_markup=get_main_inline_menu_keyboard())
         await state.update_data(last_menu_msg_id=menu_msg.message_id)
 
-@user_onboarding_router.callback_query(OnboardingCallback.filter(F.action == "tell_me_more"))
+@user_onboarding_router.callback_query(OnboardingCallback.filter(F.action == "tell_me_more"), flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def cq_onboarding_tell_me_more(query: types.CallbackQuery, callback_data: OnboardingCallback, session: AsyncSession):
     await query.message.edit_text(EXPLANATION_TEXT, reply_markup=get_onboarding_explanation_keyboard())
     await query.answer()
 
-@user_onboarding_router.callback_query(OnboardingCallback.filter(F.action == "how_to_start"))
+@user_onboarding_router.callback_query(OnboardingCallback.filter(F.action == "how_to_start"), flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def cq_onboarding_how_to_start(query: types.CallbackQuery, callback_data: OnboardingCallback, session: AsyncSession):
     await query.message.edit_text(TRIAL_OFFER_TEXT, reply_markup=get_onboarding_trial_offer_keyboard())
     await query.answer()
@@ -227,8 +228,8 @@ async def cq_onboarding_start_trial(query: types.CallbackQuery, callback_data: O
     
     await query.answer()
 
-@user_onboarding_router.message(Command("help"))
-@user_onboarding_router.message(F.text == "ℹ️ Помощь")
+@user_onboarding_router.message(Command("help"), flags={SKIP_ACCESS_CHECK_FLAG: True})
+@user_onboarding_router.message(F.text == "ℹ️ Помощь", flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def handle_help_command(message: types.Message, state: FSMContext):
     await state.clear()
     await message.answer(HELP_TEXT, disable_web_page_preview=True, parse_mode='HTML')
@@ -293,7 +294,7 @@ async def handle_menu_command(message: types.Message, session: AsyncSession, sta
     await state.update_data(last_menu_msg_id=new_menu_msg.message_id)
     logger.info(f"Sent new menu {new_menu_msg.message_id} for user {user_id} and updated last_menu_msg_id.")
 
-@user_onboarding_router.callback_query(F.data == "main_menu:show")
+@user_onboarding_router.callback_query(F.data == "main_menu:show", flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def cq_show_main_menu(query: types.CallbackQuery, session: AsyncSession, state: FSMContext):
     current_fsm_state = await state.get_state()
     if current_fsm_state == FeedbackStates.awaiting_feedback_text.state:
@@ -307,7 +308,7 @@ async def cq_show_main_menu(query: types.CallbackQuery, session: AsyncSession, s
     await state.update_data(last_menu_msg_id=query.message.message_id)
     await query.answer()
 
-@user_onboarding_router.callback_query(F.data == "main_menu:support_email")
+@user_onboarding_router.callback_query(F.data == "main_menu:support_email", flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def cq_support_email(query: types.CallbackQuery, session: AsyncSession):
     processed_email = ""
     if settings.SUPPORT_EMAIL:
@@ -331,7 +332,7 @@ async def cq_support_email(query: types.CallbackQuery, session: AsyncSession):
         )
     await query.answer()
 
-@user_onboarding_router.message(Command("support"))
+@user_onboarding_router.message(Command("support"), flags={SKIP_ACCESS_CHECK_FLAG: True})
 async def handle_support_command(message: types.Message, session: AsyncSession, state: FSMContext):
     user_id = message.from_user.id
     current_state_data = await state.get_data()
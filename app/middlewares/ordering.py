@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyLock:
+    __slots__ = ("lock", "depth")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.depth = 0
+
+
+class ChatOrderingMiddleware(BaseMiddleware):
+    """Processes updates of one chat strictly one after another while different chats run in parallel.
+
+    Each chat gets an asyncio.Lock while it has updates running or waiting. The lock is dropped as soon as
+    the last of them finishes, so memory is bounded by the number of chats with work in flight.
+    Register it before DbSessionMiddleware so a waiting update holds no DB session.
+    """
+
+    def __init__(self, warn_depth: int = 3):
+        super().__init__()
+        self.warn_depth = warn_depth
+        self._locks: Dict[int, _KeyLock] = {}
+        self.max_depth_seen = 0
+
+    @staticmethod
+    def _chat_key(update: Update) -> Optional[int]:
+        if update.message:
+            return update.message.chat.id
+        if update.edited_message:
+            return update.edited_message.chat.id
+        if update.callback_query:
+            return update.callback_query.from_user.id
+        if update.pre_checkout_query:
+            return update.pre_checkout_query.from_user.id
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active_chats": len(self._locks),
+            "queued_updates": sum(key_lock.depth for key_lock in self._locks.values()),
+            "max_depth_seen": self.max_depth_seen,
+        }
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat_id = self._chat_key(event)
+        if chat_id is None:
+            return await handler(event, data)
+
+        key_lock = self._locks.get(chat_id)
+        if key_lock is None:
+            key_lock = self._locks[chat_id] = _KeyLock()
+        key_lock.depth += 1
+        if key_lock.depth > self.max_depth_seen:
+            self.max_depth_seen = key_lock.depth
+        if key_lock.depth >= self.warn_depth:
+            logger.warning(f"Chat {chat_id} has {key_lock.depth} updates queued (update {event.update_id} waiting).")
+        elif key_lock.depth > 1:
+            logger.debug("Update queued behind %s others.", key_lock.depth - 1, extra={"chat_id": chat_id, "update_id": event.update_id})
+
+        try:
+            async with key_lock.lock:
+                return await handler(event, data)
+        finally:
+            key_lock.depth -= 1
+            if key_lock.depth == 0:
+                del self._locks[chat_id]
+
+
+chat_ordering = ChatOrderingMiddleware(warn_depth=settings.CHAT_QUEUE_WARN_DEPTH)
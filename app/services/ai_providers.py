@@ -0,0 +1,385 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+import openai
+
+from app.services.ai_scheduler import AIPriority, ai_scheduler, current_ai_priority, estimate_tokens
+from app.services.ai_schemas import response_format_for
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+_RETRYABLE_ERRORS = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError, asyncio.TimeoutError)
+
+
+class NoProviderAvailable(Exception):
+    pass
+
+
+class AIDeadlineExceeded(Exception):
+    """The task deadline ran out before a provider call could start (e.g. while queued or backing off)."""
+
+
+class _HedgedCallFailed(Exception):
+    """Every request of a hedged call failed; hedge_started tells whether the secondary provider was sent one."""
+
+    def __init__(self, error: BaseException, hedge_started: bool):
+        super().__init__(str(error))
+        self.error = error
+        self.hedge_started = hedge_started
+
+
+@dataclass(frozen=True)
+class TaskPolicy:
+    """How one kind of AI task is sent: provider order, retries per provider and optional hedging.
+
+    hedge_percentile (e.g. 0.95) starts a duplicate request on the next provider once the first one has
+    been running longer than that latency percentile of its recent calls; 0 disables hedging.
+    deadline bounds the whole call, retries and failover included, streamed calls up to their last delta.
+    """
+    providers: Tuple[str, ...]
+    deadline: float = 30.0
+    max_retries: int = 2
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+    hedge_percentile: float = 0.0
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def add(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class AIProvider:
+    """An OpenAI-compatible endpoint. model_map translates the app's model names; "*" is the fallback for any other name.
+
+    structured_output is the response_format mode the endpoint supports: "json_schema" or "json_object".
+    """
+
+    def __init__(self, name: str, client: openai.AsyncOpenAI, model_map: Optional[Dict[str, str]] = None,
+                 structured_output: str = "json_schema"):
+        self.name = name
+        self.client = client
+        self.model_map = model_map or {}
+        self.structured_output = structured_output
+        self.latency = LatencyTracker()
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+
+    def resolve_model(self, model: str) -> str:
+        return self.model_map.get(model, self.model_map.get("*", model))
+
+    def record_usage(self, usage: Any) -> None:
+        """Counts prompt tokens and the part served from the provider's prompt cache.
+
+        OpenAI reports cached tokens in prompt_tokens_details.cached_tokens, DeepSeek in prompt_cache_hit_tokens.
+        """
+        self.prompt_tokens += usage.prompt_tokens or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+        if cached is None:
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        self.cached_prompt_tokens += cached or 0
+
+    @property
+    def cache_hit_rate(self) -> Optional[float]:
+        return self.cached_prompt_tokens / self.prompt_tokens if self.prompt_tokens else None
+
+    def request_options(self, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """Turns the router's response_model option into this provider's response_format."""
+        response_model = kwargs.pop("response_model", None)
+        if response_model is not None:
+            kwargs["response_format"] = response_format_for(response_model, self.structured_output)
+        return kwargs
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class AIProviderRouter:
+    """Sends chat completions through the providers of a task policy with retries, hedging and failover.
+
+    Retryable errors (429, 5xx, timeouts, connection errors) are retried on the same provider with
+    exponential backoff and jitter, honoring Retry-After. Any other error, or running out of retries,
+    moves on to the next provider. Every attempt takes its own AICallScheduler slot.
+    Each provider/model pair has a CircuitBreaker; while it is open that provider is skipped without a call.
+    """
+
+    def __init__(self, providers: List[AIProvider], policies: Dict[str, TaskPolicy], hedge_min_samples: int = 20,
+                 breaker_failure_threshold: int = 5, breaker_reset_seconds: float = 30.0):
+        self.providers = {provider.name: provider for provider in providers}
+        self.policies = policies
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.hedges_started = 0
+        self.hedges_won = 0
+        self.failovers = 0
+        self.deadline_exceeded = 0
+
+    def _breaker(self, provider: AIProvider, provider_model: str) -> CircuitBreaker:
+        name = f"{provider.name}/{provider_model}"
+        breaker = self.breakers.get(name)
+        if breaker is None:
+            breaker = self.breakers[name] = CircuitBreaker(name, self.breaker_failure_threshold, self.breaker_reset_seconds)
+        return breaker
+
+    def _policy(self, task: str) -> TaskPolicy:
+        return self.policies.get(task) or self.policies["default"]
+
+    def _providers_for(self, task: str) -> List[AIProvider]:
+        return [self.providers[name] for name in self._policy(task).providers if name in self.providers]
+
+    def _backoff(self, policy: TaskPolicy, attempt: int, error: Exception) -> float:
+        delay = _retry_after(error)
+        if delay is None:
+            delay = min(policy.max_delay, policy.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+        return min(delay, policy.max_delay)
+
+    async def _call_once(self, provider: AIProvider, model: str, messages: List[Dict[str, str]], deadline_at: float, **kwargs: Any) -> Any:
+        provider_model = provider.resolve_model(model)
+        kwargs = provider.request_options(kwargs)
+        breaker = self._breaker(provider, provider_model)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker {breaker.name} is open.")
+        try:
+            async with ai_scheduler.slot(provider_model, estimate_tokens(messages, kwargs.get("max_tokens", 0))) as slot:
+                remaining = deadline_at - time.monotonic()
+                if remaining <= 0:
+                    raise AIDeadlineExceeded(f"Deadline passed while waiting for a {provider_model} slot.")
+                started_at = time.monotonic()
+                provider.calls += 1
+                response = await asyncio.wait_for(
+                    provider.client.chat.completions.create(model=provider_model, messages=messages, stream=False, **kwargs),
+                    timeout=remaining,
+                )
+                if response.usage:
+                    slot.record_usage(response.usage.total_tokens)
+                    provider.record_usage(response.usage)
+        except _RETRYABLE_ERRORS:
+            provider.failures += 1
+            breaker.record_failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record_success()
+        provider.latency.add(time.monotonic() - started_at)
+        return response
+
+    async def _call_with_retries(self, provider: AIProvider, policy: TaskPolicy, model: str, messages: List[Dict[str, str]],
+                                 deadline_at: float, **kwargs: Any) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await self._call_once(provider, model, messages, deadline_at, **kwargs)
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= policy.max_retries:
+                    raise
+                delay = self._backoff(policy, attempt, e)
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                logger.warning(f"AI provider {provider.name} ({model}) failed with {type(e).__name__}, retry {attempt + 1}/{policy.max_retries} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    def _hedge_delay(self, provider: AIProvider, policy: TaskPolicy) -> Optional[float]:
+        if policy.hedge_percentile <= 0 or current_ai_priority() == AIPriority.BACKGROUND:
+            return None
+        if len(provider.latency) < self.hedge_min_samples:
+            return None
+        return provider.latency.percentile(policy.hedge_percentile)
+
+    async def _hedged(self, primary: AIProvider, secondary: AIProvider, hedge_after: float, policy: TaskPolicy,
+                      model: str, messages: List[Dict[str, str]], deadline_at: float, **kwargs: Any) -> Any:
+        tasks = {asyncio.create_task(self._call_with_retries(primary, policy, model, messages, deadline_at, **kwargs)): primary}
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        hedge_started = not done
+        if hedge_started:
+            self.hedges_started += 1
+            logger.info(f"AI provider {primary.name} exceeded {hedge_after:.1f}s for {model}, sending a hedged request to {secondary.name}.")
+            tasks[asyncio.create_task(self._call_with_retries(secondary, policy, model, messages, deadline_at, **kwargs))] = secondary
+        pending = set(tasks)
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if tasks[task] is secondary:
+                            self.hedges_won += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise _HedgedCallFailed(last_error, hedge_started) from last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def complete(self, task: str, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> Any:
+        """Returns the provider's ChatCompletion; raises the last error once every provider has failed or the deadline ran out."""
+        policy = self._policy(task)
+        providers = self._providers_for(task)
+        if not providers:
+            raise NoProviderAvailable(f"No configured AI provider for task '{task}'.")
+
+        deadline_at = time.monotonic() + policy.deadline
+        last_error: Optional[Exception] = None
+        index = 0
+        while index < len(providers):
+            if time.monotonic() >= deadline_at:
+                self.deadline_exceeded += 1
+                raise AIDeadlineExceeded(f"Task '{task}' exceeded its {policy.deadline:.0f}s deadline.") from last_error
+            provider = providers[index]
+            hedge_after = self._hedge_delay(provider, policy) if index + 1 < len(providers) else None
+            try:
+                if hedge_after is not None:
+                    return await self._hedged(provider, providers[index + 1], hedge_after, policy, model, messages, deadline_at, **kwargs)
+                return await self._call_with_retries(provider, policy, model, messages, deadline_at, **kwargs)
+            except _HedgedCallFailed as e:
+                last_error = e.error
+                # A hedge partner that was sent a request has failed too; one that never started is the next to try
+                index += 2 if e.hedge_started else 1
+            except Exception as e:
+                last_error = e
+                index += 1
+            if index < len(providers):
+                self.failovers += 1
+                logger.warning(f"AI provider {provider.name} failed for task '{task}' ({type(last_error).__name__}: {last_error}), failing over to {providers[index].name}.")
+        raise last_error
+
+    async def stream(self, task: str, model: str, messages: List[Dict[str, str]], **kwargs: Any) -> AsyncIterator[str]:
+        """Streams content deltas. Retries and failover apply until the first delta; later errors propagate.
+
+        Raises AIDeadlineExceeded once the task deadline runs out, also in the middle of a stream.
+        """
+        policy = self._policy(task)
+        providers = self._providers_for(task)
+        if not providers:
+            raise NoProviderAvailable(f"No configured AI provider for task '{task}'.")
+
+        deadline_at = time.monotonic() + policy.deadline
+        last_error: Optional[Exception] = None
+        for index, provider in enumerate(providers):
+            provider_model = provider.resolve_model(model)
+            provider_kwargs = provider.request_options(dict(kwargs))
+            breaker = self._breaker(provider, provider_model)
+            attempt = 0
+            while True:
+                if time.monotonic() >= deadline_at:
+                    self.deadline_exceeded += 1
+                    raise AIDeadlineExceeded(f"Task '{task}' exceeded its {policy.deadline:.0f}s deadline.") from last_error
+                yielded = False
+                try:
+                    if not breaker.allow():
+                        raise CircuitOpenError(f"Circuit breaker {breaker.name} is open.")
+                    try:
+                        async with ai_scheduler.slot(provider_model, estimate_tokens(messages, kwargs.get("max_tokens", 0))) as slot:
+                            remaining = deadline_at - time.monotonic()
+                            if remaining <= 0:
+                                raise AIDeadlineExceeded(f"Deadline passed while waiting for a {provider_model} slot.")
+                            started_at = time.monotonic()
+                            provider.calls += 1
+                            stream = await asyncio.wait_for(
+                                provider.client.chat.completions.create(
+                                    model=provider_model, messages=messages, stream=True, stream_options={"include_usage": True}, **provider_kwargs
+                                ),
+                                timeout=remaining,
+                            )
+                            chunks = stream.__aiter__()
+                            while True:
+                                try:
+                                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=deadline_at - time.monotonic())
+                                except StopAsyncIteration:
+                                    break
+                                if chunk.usage:
+                                    slot.record_usage(chunk.usage.total_tokens)
+                                    provider.record_usage(chunk.usage)
+                                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                                    yielded = True
+                                    yield chunk.choices[0].delta.content
+                    except _RETRYABLE_ERRORS:
+                        provider.failures += 1
+                        breaker.record_failure()
+                        raise
+                    except BaseException:
+                        breaker.release()
+                        raise
+                    breaker.record_success()
+                    provider.latency.add(time.monotonic() - started_at)
+                    return
+                except Exception as e:
+                    last_error = e
+                    if time.monotonic() >= deadline_at:
+                        self.deadline_exceeded += 1
+                        raise AIDeadlineExceeded(f"Task '{task}' exceeded its {policy.deadline:.0f}s deadline.") from e
+                    if yielded:
+                        raise
+                    delay = self._backoff(policy, attempt, e) if isinstance(e, _RETRYABLE_ERRORS) and attempt < policy.max_retries else None
+                    # A retry that could not start before the deadline is skipped in favour of the next provider
+                    if delay is not None and time.monotonic() + delay < deadline_at:
+                        logger.warning(f"AI stream from {provider.name} ({model}) failed with {type(e).__name__}, retry {attempt + 1}/{policy.max_retries} in {delay:.1f}s.")
+                        await asyncio.sleep(delay)
+                        attempt += 1
+                        continue
+                    if index + 1 == len(providers):
+                        raise
+                    self.failovers += 1
+                    logger.warning(f"AI stream from {provider.name} failed for task '{task}' ({type(e).__name__}: {e}), failing over to {providers[index + 1].name}.")
+                    break
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "providers": {
+                name: {
+                    "calls": provider.calls,
+                    "failures": provider.failures,
+                    "p50_s": provider.latency.percentile(0.5),
+                    "p95_s": provider.latency.percentile(0.95),
+                    "prompt_tokens": provider.prompt_tokens,
+                    "cached_prompt_tokens": provider.cached_prompt_tokens,
+                    "cache_hit_rate": provider.cache_hit_rate,
+                }
+                for name, provider in self.providers.items()
+            },
+            "breakers": {name: breaker.snapshot() for name, breaker in self.breakers.items()},
+            "hedges_started": self.hedges_started,
+            "hedges_won": self.hedges_won,
+            "failovers": self.failovers,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
+
+
+def parse_provider_order(raw: str) -> Tuple[str, ...]:
+    return tuple(name.strip().lower() for name in raw.split(",") if name.strip())
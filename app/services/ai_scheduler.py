@@ -0,0 +1,277 @@
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AIPriority(enum.IntEnum):
+    """Lower value is served first when several AI calls wait for the same model."""
+    PAID = 0
+    TRIAL = 1
+    STANDARD = 2
+    BACKGROUND = 3
+
+
+# Set per update by AccessCheckMiddleware; calls made outside an update (scheduler jobs) count as background work.
+_current_priority: ContextVar[AIPriority] = ContextVar("ai_priority", default=AIPriority.BACKGROUND)
+
+
+def set_ai_priority(priority: AIPriority):
+    return _current_priority.set(priority)
+
+
+def reset_ai_priority(token) -> None:
+    _current_priority.reset(token)
+
+
+def current_ai_priority() -> AIPriority:
+    return _current_priority.get()
+
+
+@contextmanager
+def ai_priority(priority: AIPriority) -> Iterator[None]:
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    """Rough token count used for the TPM bucket before the provider reports usage: ~4 chars per token plus the completion budget."""
+    prompt_chars = sum(len(message.get("content") or "") for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+
+@dataclass(frozen=True)
+class ModelLimits:
+    max_concurrency: int
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+def parse_model_limits(raw: str) -> Dict[str, ModelLimits]:
+    """Parses "model=concurrency/rpm/tpm,..." as used by AI_MODEL_LIMITS; 0 disables a limit."""
+    limits: Dict[str, ModelLimits] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        model, values = item.split("=", 1)
+        try:
+            concurrency, rpm, tpm = (int(value) for value in values.split("/"))
+        except ValueError:
+            logger.warning(f"Ignoring malformed AI_MODEL_LIMITS entry: '{item.strip()}'")
+            continue
+        limits[model.strip()] = ModelLimits(concurrency, rpm, tpm)
+    return limits
+
+
+class TokenBucket:
+    """Refills continuously at capacity per minute. A capacity of 0 means unlimited."""
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity = float(capacity_per_minute)
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.capacity / 60)
+        self._updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount can be taken; requests larger than the bucket wait for a full bucket."""
+        if self.capacity <= 0:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60 / self.capacity
+
+    def take(self, amount: float) -> None:
+        if self.capacity > 0:
+            self.tokens -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        if self.capacity > 0 and amount > 0:
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+    enqueued_at: float = field(compare=False)
+
+
+class _CallStats:
+    __slots__ = ("calls", "queue_wait_total", "queue_wait_max", "provider_total", "provider_max", "errors")
+
+    def __init__(self):
+        self.calls = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+        self.provider_total = 0.0
+        self.provider_max = 0.0
+        self.errors = 0
+
+
+class _ModelLane:
+    def __init__(self, model: str, limits: ModelLimits):
+        self.model = model
+        self.limits = limits
+        self.requests = TokenBucket(limits.requests_per_minute)
+        self.tokens = TokenBucket(limits.tokens_per_minute)
+        self.in_flight = 0
+        self.waiters: List[_Waiter] = []
+        self.wakeup: Optional[asyncio.TimerHandle] = None
+        self.stats = _CallStats()
+
+
+class AICallSlot:
+    """Held for the duration of one provider call; returned by AICallScheduler.slot()."""
+
+    def __init__(self, scheduler: "AICallScheduler", lane: _ModelLane, priority: AIPriority, estimated_tokens: int):
+        self._scheduler = scheduler
+        self._lane = lane
+        self.priority = priority
+        self.estimated_tokens = estimated_tokens
+        self.actual_tokens: Optional[int] = None
+        self.queue_wait = 0.0
+        self.provider_latency = 0.0
+        self._started_at = 0.0
+
+    def record_usage(self, total_tokens: Optional[int]) -> None:
+        self.actual_tokens = total_tokens
+
+    async def __aenter__(self) -> "AICallSlot":
+        self.queue_wait = await self._scheduler._acquire(self._lane, self.priority, self.estimated_tokens)
+        self._started_at = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.provider_latency = time.monotonic() - self._started_at
+        self._scheduler._release(self, failed=exc_type is not None)
+
+
+class AICallScheduler:
+    """Admits AI calls per model within a concurrency cap and requests/tokens-per-minute budgets.
+
+    Waiting calls are served by priority (paid, trial, standard, background) and FIFO within a class.
+    Queue wait and provider latency are tracked separately per model.
+    """
+
+    def __init__(self, default_limits: ModelLimits, model_limits: Optional[Dict[str, ModelLimits]] = None):
+        self.default_limits = default_limits
+        self.model_limits = model_limits or {}
+        self._lanes: Dict[str, _ModelLane] = {}
+        self._seq = itertools.count()
+
+    def _lane(self, model: str) -> _ModelLane:
+        lane = self._lanes.get(model)
+        if lane is None:
+            lane = self._lanes[model] = _ModelLane(model, self.model_limits.get(model, self.default_limits))
+        return lane
+
+    def slot(self, model: str, estimated_tokens: int, priority: Optional[AIPriority] = None) -> AICallSlot:
+        if priority is None:
+            priority = current_ai_priority()
+        return AICallSlot(self, self._lane(model), priority, estimated_tokens)
+
+    async def _acquire(self, lane: _ModelLane, priority: AIPriority, tokens: int) -> float:
+        loop = asyncio.get_running_loop()
+        waiter = _Waiter(int(priority), next(self._seq), tokens, loop.create_future(), time.monotonic())
+        heapq.heappush(lane.waiters, waiter)
+        self._dispatch(lane)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Admitted and cancelled in the same tick: hand the slot back.
+                lane.in_flight -= 1
+                lane.tokens.give_back(tokens)
+                self._dispatch(lane)
+            raise
+        return time.monotonic() - waiter.enqueued_at
+
+    def _dispatch(self, lane: _ModelLane) -> None:
+        if lane.wakeup is not None:
+            lane.wakeup.cancel()
+            lane.wakeup = None
+        while lane.waiters:
+            waiter = lane.waiters[0]
+            if waiter.future.done():
+                heapq.heappop(lane.waiters)
+                continue
+            if lane.limits.max_concurrency > 0 and lane.in_flight >= lane.limits.max_concurrency:
+                return
+            now = time.monotonic()
+            delay = max(lane.requests.wait_time(1, now), lane.tokens.wait_time(waiter.tokens, now))
+            if delay > 0:
+                lane.wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch, lane)
+                return
+            heapq.heappop(lane.waiters)
+            lane.requests.take(1)
+            lane.tokens.take(waiter.tokens)
+            lane.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _release(self, slot: AICallSlot, failed: bool) -> None:
+        lane = slot._lane
+        lane.in_flight -= 1
+        if slot.actual_tokens is not None:
+            lane.tokens.give_back(slot.estimated_tokens - slot.actual_tokens)
+
+        stats = lane.stats
+        stats.calls += 1
+        stats.errors += failed
+        stats.queue_wait_total += slot.queue_wait
+        stats.queue_wait_max = max(stats.queue_wait_max, slot.queue_wait)
+        stats.provider_total += slot.provider_latency
+        stats.provider_max = max(stats.provider_max, slot.provider_latency)
+        logger.debug(
+            "AI call finished: queue_wait_ms=%.0f provider_ms=%.0f",
+            slot.queue_wait * 1000, slot.provider_latency * 1000,
+            extra={"model": lane.model, "priority": slot.priority.name, "tokens": slot.actual_tokens or slot.estimated_tokens},
+        )
+        if slot.queue_wait > 5:
+            logger.warning(f"AI call for {lane.model} ({slot.priority.name}) waited {slot.queue_wait:.1f}s in the scheduler queue; {len(lane.waiters)} still waiting.")
+        self._dispatch(lane)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = {}
+        for model, lane in self._lanes.items():
+            calls = lane.stats.calls or 1
+            result[model] = {
+                "in_flight": lane.in_flight,
+                "waiting": sum(1 for waiter in lane.waiters if not waiter.future.done()),
+                "calls": lane.stats.calls,
+                "errors": lane.stats.errors,
+                "avg_queue_wait_ms": lane.stats.queue_wait_total / calls * 1000,
+                "max_queue_wait_ms": lane.stats.queue_wait_max * 1000,
+                "avg_provider_ms": lane.stats.provider_total / calls * 1000,
+                "max_provider_ms": lane.stats.provider_max * 1000,
+            }
+        return result
+
+
+ai_scheduler = AICallScheduler(
+    default_limits=ModelLimits(
+        max_concurrency=settings.AI_MAX_CONCURRENCY,
+        requests_per_minute=settings.AI_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.AI_TOKENS_PER_MINUTE,
+    ),
+    model_limits=parse_model_limits(settings.AI_MODEL_LIMITS),
+)
@@ -0,0 +1,143 @@
+import json
+import logging
+from typing import Any, Dict, List, Literal, Optional, Tuple, Type, TypeVar
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+logger = logging.getLogger(__name__)
+
+# Response models for the structured AI tasks. They double as the JSON schema sent to the provider
+# (response_format) and as the validator for whatever comes back, so both sides never drift apart.
+# Constraints that OpenAI's strict schema mode does not accept (e.g. minLength) live in validators.
+
+
+class _StrictModel(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+
+class CaseResponse(_StrictModel):
+    title: str
+    description: str
+    supporting_questions: List[str]
+
+    @field_validator("title", "description")
+    @classmethod
+    def _not_blank(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError("must not be empty")
+        return value
+
+
+class SolutionAnalysisResponse(_StrictModel):
+    strengths: List[str]
+    areas_for_improvement: List[str]
+    overall_impression: str
+    solution_rating: Literal[
+        "meets_expectations", "partially_meets_expectations", "below_expectations", "insufficient_input", "not_applicable"
+    ]
+    sources_referenced: List[str]
+
+
+class FeedbackVerdict(_StrictModel):
+    is_meaningful: bool
+    reason: str
+    category: str
+
+
+class FeedbackBatchVerdict(FeedbackVerdict):
+    id: int
+
+
+class FeedbackBatchResponse(_StrictModel):
+    results: List[FeedbackBatchVerdict]
+
+
+ResponseModel = TypeVar("ResponseModel", bound=BaseModel)
+
+_schema_cache: Dict[Type[BaseModel], Dict[str, Any]] = {}
+
+
+def response_format_for(response_model: Type[BaseModel], mode: str) -> Dict[str, Any]:
+    """Builds the response_format argument: "json_schema" sends the model's schema in strict mode, "json_object" only forces JSON."""
+    if mode != "json_schema":
+        return {"type": "json_object"}
+    schema = _schema_cache.get(response_model)
+    if schema is None:
+        schema = _schema_cache[response_model] = response_model.model_json_schema()
+    return {"type": "json_schema", "json_schema": {"name": response_model.__name__, "schema": schema, "strict": True}}
+
+
+def _strip_to_json(text: str) -> str:
+    content = text.strip()
+    if content.startswith("```"):
+        content = content[3:]
+        if content.startswith("json"):
+            content = content[4:]
+        if content.endswith("```"):
+            content = content[:-3]
+        content = content.strip()
+    if not content.startswith("{"):
+        start, end = content.find("{"), content.rfind("}")
+        if start != -1 and end > start:
+            content = content[start:end + 1]
+    return content
+
+
+def parse_structured(text: Optional[str], response_model: Type[ResponseModel]) -> Tuple[Optional[ResponseModel], Optional[str]]:
+    """Validates a model reply against response_model. Returns (instance, None) or (None, error description).
+
+    The reply is first handed to pydantic's JSON parser as is, which is the common case with schema-enforced
+    output. Only if that fails are code fences and surrounding prose stripped before a second attempt.
+    """
+    if not text or not text.strip():
+        return None, "empty response"
+    try:
+        return response_model.model_validate_json(text), None
+    except ValidationError as first_error:
+        stripped = _strip_to_json(text)
+        if stripped == text:
+            return None, _describe(first_error)
+        try:
+            return response_model.model_validate_json(stripped), None
+        except ValidationError as e:
+            return None, _describe(e)
+
+
+def _describe(error: ValidationError) -> str:
+    problems = []
+    for item in error.errors()[:5]:
+        location = ".".join(str(part) for part in item["loc"]) or "response"
+        problems.append(f"{location}: {item['msg']}")
+    return "; ".join(problems)
+
+
+def build_repair_messages(messages: List[Dict[str, str]], bad_reply: str, error: str, response_model: Type[BaseModel]) -> List[Dict[str, str]]:
+    schema = json.dumps(response_model.model_json_schema(), ensure_ascii=False)
+    return messages + [
+        {"role": "assistant", "content": bad_reply},
+        {"role": "user", "content": (
+            f"Your previous reply does not match the required JSON schema ({error}). "
+            f"Reply again with only the corrected JSON object, keeping the same content. Schema: {schema}"
+        )},
+    ]
+
+
+class StructuredOutputStats:
+    """Parse outcomes per model: first-try successes, repaired replies and replies that stayed invalid."""
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, outcome: str) -> None:
+        counts = self._counts.setdefault(model, {"ok": 0, "repaired": 0, "failed": 0})
+        counts[outcome] += 1
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        result = {}
+        for model, counts in self._counts.items():
+            total = sum(counts.values())
+            result[model] = dict(counts, total=total, failure_rate=(counts["repaired"] + counts["failed"]) / total if total else 0.0)
+        return result
+
+
+structured_output_stats = StructuredOutputStats()
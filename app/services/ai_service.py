@@ -1,11 +1,20 @@
 import logging
 from openai import AsyncOpenAI
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, AsyncIterator, Type
 import openai
-import json
+from pydantic import BaseModel
 
 from app.core.config import settings
 from app.core import prompts
+from app.services.reference_cache import render_references_block
+from app.services.prompt_budget import prompt_budgeter
+from app.services.ai_scheduler import ai_priority, AIPriority
+from app.services.ai_providers import AIProvider, AIProviderRouter, AIDeadlineExceeded, NoProviderAvailable, TaskPolicy, parse_provider_order
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.ai_schemas import (
+    CaseResponse, SolutionAnalysisResponse, FeedbackVerdict, FeedbackBatchResponse, ResponseModel,
+    parse_structured, build_repair_messages, structured_output_stats,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -13,7 +22,8 @@ if settings.OPENAI_API_KEY and settings.OPENAI_API_KEY != "YOUR_DEFAULT_OPENAI_K
     logger.info("Initializing OpenAI client with key from settings.")
     ai_client = AsyncOpenAI(
         api_key=settings.OPENAI_API_KEY,
-        base_url="https://api.openai.com/v1"
+        base_url="https://api.openai.com/v1",
+        max_retries=0  # retries are handled by ai_router
     )
 else:
     logger.warning(
@@ -24,7 +34,42 @@ else:
 
 async_openai_client = openai.AsyncOpenAI(
     api_key=settings.deep_seek_api_key,
-    base_url="https://api.deepseek.com/v1"
+    base_url="https://api.deepseek.com/v1",
+    max_retries=0
+)
+
+_ai_providers = []
+if ai_client:
+    _ai_providers.append(AIProvider("openai", ai_client))
+if settings.deep_seek_api_key and settings.deep_seek_api_key != "YOUR_DEEP_SEEK_API_KEY_HERE":
+    _ai_providers.append(AIProvider("deepseek", async_openai_client, model_map={"*": "deepseek-chat"}, structured_output="json_object"))
+
+def _task_policy(providers: str, deadline: float, hedge_percentile: float) -> TaskPolicy:
+    return TaskPolicy(
+        providers=parse_provider_order(providers),
+        deadline=deadline,
+        max_retries=settings.AI_MAX_RETRIES,
+        base_delay=settings.AI_RETRY_BASE_DELAY_SECONDS,
+        max_delay=settings.AI_RETRY_MAX_DELAY_SECONDS,
+        hedge_percentile=hedge_percentile,
+    )
+
+ai_router = AIProviderRouter(
+    providers=_ai_providers,
+    policies={
+        "default": _task_policy(settings.AI_DEFAULT_PROVIDERS, settings.AI_DEFAULT_DEADLINE_SECONDS, 0),
+        "case_generation": _task_policy(
+            settings.AI_CASE_GENERATION_PROVIDERS, settings.AI_CASE_GENERATION_DEADLINE_SECONDS, settings.AI_CASE_GENERATION_HEDGE_PERCENTILE
+        ),
+        "solution_analysis": _task_policy(
+            settings.AI_SOLUTION_ANALYSIS_PROVIDERS, settings.AI_SOLUTION_ANALYSIS_DEADLINE_SECONDS, settings.AI_SOLUTION_ANALYSIS_HEDGE_PERCENTILE
+        ),
+        "feedback_analysis": _task_policy(
+            settings.AI_FEEDBACK_ANALYSIS_PROVIDERS, settings.AI_FEEDBACK_ANALYSIS_DEADLINE_SECONDS, settings.AI_FEEDBACK_ANALYSIS_HEDGE_PERCENTILE
+        ),
+    },
+    breaker_failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+    breaker_reset_seconds=settings.AI_BREAKER_RESET_SECONDS,
 )
 
 class AIService:
@@ -74,223 +119,315 @@ class AIService:
 ai_service = AIService()
 
 def format_references_for_prompt(references: List[Dict[str, str]]) -> str:
-    if not references:
-        return "No specific reference materials provided. Base your response on general knowledge if necessary, but prioritize official CBT guidelines if known."
-    
-    formatted_str = "Key Reference Materials to use EXCLUSIVELY:\\n\\n"
-    for i, ref in enumerate(references):
-        formatted_str += f"Source {i+1}:\\n"
-        formatted_str += f"  Type: {ref.get('type', 'N/A')}\\n"
-        formatted_str += f"  Description: {ref.get('description', 'N/A')}\\n"
-        if ref.get('url'):
-            formatted_str += f"  URL: {ref.get('url')}\\n"
-        if ref.get('citation'):
-            formatted_str += f"  Citation: {ref.get('citation')}\\n"
-        formatted_str += "---\\n"
-    return formatted_str
+    return render_references_block(references)
+
+def _extract_message_text(response, model: str) -> Optional[str]:
+    if response.choices and response.choices[0].message:
+        content = response.choices[0].message.content
+        if content and content.strip():
+            return content.strip()
+    logger.warning(
+        f"AI API (model: {model}) returned no choices, empty message, or no content in expected fields. "
+        f"Response object: {response.model_dump_json(indent=2)}"
+    )
+    return None
 
 async def generate_text_with_ai(
     messages: List[Dict[str, str]],
     model: str, # Модель будет передаваться конкретная
     temperature: float = 0.7,
-    max_tokens: int = 3000
+    max_tokens: int = 3000,
+    task: str = "default",
+    response_model: Optional[Type[BaseModel]] = None
 ) -> Optional[str]:
-    if not ai_client:
-        logger.error("AI client (OpenRouter) is not initialized. Check API key configuration.")
+    """Returns the reply text or None. With response_model the provider is asked for output matching its schema."""
+    options = {"temperature": temperature, "max_tokens": max_tokens}
+    if response_model is not None:
+        options["response_model"] = response_model
+    try:
+        response = await ai_router.complete(task, model, messages, **options)
+        return _extract_message_text(response, model)
+    except NoProviderAvailable as e:
+        logger.error(f"{e} Check API key configuration.")
+        return None
+    except (CircuitOpenError, AIDeadlineExceeded) as e:
+        logger.warning(f"AI call for task '{task}' (model: {model}) failed fast: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Error calling AI API (model: {model}, task: {task}): {e}", exc_info=True)
         return None
 
-    try:
+async def stream_text_with_ai(
+    messages: List[Dict[str, str]],
+    model: str,
+    temperature: float = 0.7,
+    max_tokens: int = 3000,
+    task: str = "default",
+    response_model: Optional[Type[BaseModel]] = None
+) -> AsyncIterator[str]:
+    """Streaming counterpart of generate_text_with_ai: yields content deltas as they arrive. API errors propagate."""
+    if not ai_router.providers:
+        logger.error("No AI provider is initialized. Check API key configuration.")
+        return
 
-        response = await ai_client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            stream=False
-        )
-        
-        generated_text = None
-        if response.choices and response.choices[0].message:
-            message_obj = response.choices[0].message
-            if message_obj.content and message_obj.content.strip():
-                generated_text = message_obj.content.strip()
-            elif message_obj.reasoning and message_obj.reasoning.strip():
-                reasoning_content = message_obj.reasoning.strip()
-                json_start_index = reasoning_content.find("{")
-                json_end_index = reasoning_content.rfind("}")
-                if json_start_index != -1 and json_end_index != -1 and json_start_index < json_end_index:
-                    potential_json = reasoning_content[json_start_index : json_end_index + 1]
-                    if potential_json.startswith("{") and potential_json.endswith("}"):
-                         generated_text = potential_json
-                    else:
-                        logger.warning(f"Could not reliably extract JSON from reasoning for model {model}. Using full reasoning. Reasoning: {reasoning_content[:200]}...")
-                        generated_text = reasoning_content
-                else:
-                     logger.warning(f"Reasoning found for model {model} but no clear JSON object. Reasoning: {reasoning_content[:200]}...")
-
-        if generated_text:
-            return generated_text
-        else:
-            logger.warning(
-                f"AI API (model: {model}) returned no choices, empty message, or no content in expected fields. "
-                f"Response object: {response.model_dump_json(indent=2)}"
-            )
-            return None
-    except Exception as e:
-        logger.error(f"Error calling AI API (model: {model}): {e}", exc_info=True)
+    options = {"temperature": temperature, "max_tokens": max_tokens}
+    if response_model is not None:
+        options["response_model"] = response_model
+    async for delta in ai_router.stream(task, model, messages, **options):
+        yield delta
+
+async def validate_structured_output(
+    text: Optional[str],
+    messages: List[Dict[str, str]],
+    model: str,
+    response_model: Type[ResponseModel],
+    max_tokens: int,
+    task: str
+) -> Optional[ResponseModel]:
+    """Validates a reply against response_model. A reply that does not match gets one repair call quoting the validation error."""
+    if not text:
         return None
+    result, error = parse_structured(text, response_model)
+    if result is not None:
+        structured_output_stats.record(model, "ok")
+        return result
 
-async def generate_case_from_ai(
-    user_prompt_text: Optional[str] = None, 
-    active_references: Optional[List[Dict[str, str]]] = None
-) -> Optional[Dict[str, str]]:
-    
-    formatted_references = format_references_for_prompt(active_references)
-    system_prompt = prompts.CASE_GENERATION_SYSTEM_PROMPT.format(formatted_references=formatted_references)
-    current_user_prompt = user_prompt_text if user_prompt_text else prompts.CASE_GENERATION_USER_PROMPT
+    logger.warning(f"AI (model {model}) reply for task '{task}' does not match {response_model.__name__} ({error}), requesting a repair. Reply: {text[:500]}")
+    repaired_text = await generate_text_with_ai(
+        messages=build_repair_messages(messages, text, error, response_model),
+        model=model,
+        temperature=0,
+        max_tokens=max_tokens,
+        task=task,
+        response_model=response_model
+    )
+    result, repair_error = parse_structured(repaired_text, response_model)
+    if result is not None:
+        structured_output_stats.record(model, "repaired")
+        return result
+    structured_output_stats.record(model, "failed")
+    logger.error(f"AI (model {model}) reply for task '{task}' is still invalid after a repair attempt ({repair_error}). Reply: {repaired_text}")
+    return None
+
+async def generate_structured_with_ai(
+    messages: List[Dict[str, str]],
+    model: str,
+    response_model: Type[ResponseModel],
+    temperature: float,
+    max_tokens: int,
+    task: str
+) -> Optional[ResponseModel]:
+    text = await generate_text_with_ai(
+        messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, task=task, response_model=response_model
+    )
+    return await validate_structured_output(text, messages, model, response_model, max_tokens, task)
+
+CASE_GENERATION_MODEL = "gpt-4o-mini"
+
+def _build_case_generation_messages(
+    user_prompt_text: Optional[str],
+    active_references: Optional[List[Dict[str, str]]],
+    formatted_references: Optional[str],
+    record: bool = True
+) -> List[Dict[str, str]]:
+    prompt = prompt_budgeter.fit(
+        "case_generation", CASE_GENERATION_MODEL,
+        prompts.CASE_GENERATION_SYSTEM_PROMPT + prompts.CASE_GENERATION_USER_PROMPT_TEMPLATE + prompts.REFERENCES_BLOCK_TEMPLATE,
+        references=active_references,
+        formatted_references=formatted_references,
+        user_input=user_prompt_text if user_prompt_text else prompts.CASE_GENERATION_USER_PROMPT,
+        record=record
+    )
+    # The system message is the same on every call so providers can cache it; everything variable goes into the user message
+    current_user_prompt = prompts.CASE_GENERATION_USER_PROMPT_TEMPLATE.format(
+        references_block=prompts.REFERENCES_BLOCK_TEMPLATE.format(formatted_references=prompt.formatted_references),
+        request=prompt.user_input
+    )
     
-    messages = [
-        {"role": "system", "content": system_prompt},
+    return [
+        {"role": "system", "content": prompts.CASE_GENERATION_SYSTEM_PROMPT},
         {"role": "user", "content": current_user_prompt}
     ]
 
-    model_for_case_generation = "gpt-4o-mini"
-    generated_content = await generate_text_with_ai(
+async def generate_case_from_ai(
+    user_prompt_text: Optional[str] = None, 
+    active_references: Optional[List[Dict[str, str]]] = None,
+    formatted_references: Optional[str] = None
+) -> Optional[Dict[str, str]]:
+    
+    messages = _build_case_generation_messages(user_prompt_text, active_references, formatted_references)
+    case = await generate_structured_with_ai(
         messages=messages, 
-        model=model_for_case_generation, 
+        model=CASE_GENERATION_MODEL, 
+        response_model=CaseResponse,
         temperature=0.8, 
-        max_tokens=4000
+        max_tokens=4000,
+        task="case_generation"
     )
+    return case.model_dump() if case else None
 
-    if generated_content:
-        try:
-            import json
-            content_to_parse = generated_content.strip()
-            if content_to_parse.startswith("```json"):
-                content_to_parse = content_to_parse[len("```json"):].strip()
-            elif content_to_parse.startswith("```"):
-                 content_to_parse = content_to_parse[len("```"):].strip()
-            
-            if content_to_parse.endswith("```"):
-                content_to_parse = content_to_parse[:-len("```")]
-            
-            content_to_parse = content_to_parse.strip()
-            
-            case_data = json.loads(content_to_parse)
-            if isinstance(case_data, dict) and "title" in case_data and "description" in case_data:
-                return case_data
-            else:
-                logger.error(f"AI (model {model_for_case_generation}) returned malformed JSON for case: {generated_content}")
-                return {"title": f"Кейс от {model_for_case_generation} (не удалось распарсить)", "description": generated_content}
-        except json.JSONDecodeError:
-            logger.error(f"Failed to decode JSON from AI (model {model_for_case_generation}) for case: {generated_content}", exc_info=True)
-            return {"title": f"Кейс от {model_for_case_generation} (ошибка декодирования)", "description": generated_content}
-    return None
+async def stream_case_from_ai(
+    user_prompt_text: Optional[str] = None,
+    active_references: Optional[List[Dict[str, str]]] = None,
+    formatted_references: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Yields the raw completion deltas of a case generation; pass the joined text to finalize_streamed_case()."""
+    messages = _build_case_generation_messages(user_prompt_text, active_references, formatted_references)
+    async for delta in stream_text_with_ai(
+        messages=messages, model=CASE_GENERATION_MODEL, temperature=0.8, max_tokens=4000, task="case_generation", response_model=CaseResponse
+    ):
+        yield delta
 
-async def analyze_solution_with_ai(
-    case_description: str, 
-    user_solution_text: str,
-    active_references: Optional[List[Dict[str, str]]] = None
+async def finalize_streamed_case(
+    generated_content: Optional[str],
+    user_prompt_text: Optional[str] = None,
+    active_references: Optional[List[Dict[str, str]]] = None,
+    formatted_references: Optional[str] = None
 ) -> Optional[Dict[str, str]]:
-    
-    formatted_references = format_references_for_prompt(active_references)
-    system_prompt = prompts.SOLUTION_ANALYSIS_SYSTEM_PROMPT.format(formatted_references=formatted_references)
+    messages = _build_case_generation_messages(user_prompt_text, active_references, formatted_references, record=False)
+    case = await validate_structured_output(generated_content, messages, CASE_GENERATION_MODEL, CaseResponse, 4000, "case_generation")
+    return case.model_dump() if case else None
+
+SOLUTION_ANALYSIS_MODEL = "gpt-4o-mini"
+
+def _build_solution_analysis_messages(
+    case_description: str,
+    user_solution_text: str,
+    active_references: Optional[List[Dict[str, str]]],
+    formatted_references: Optional[str],
+    record: bool = True
+) -> List[Dict[str, str]]:
+    prompt = prompt_budgeter.fit(
+        "solution_analysis", SOLUTION_ANALYSIS_MODEL,
+        prompts.SOLUTION_ANALYSIS_SYSTEM_PROMPT + prompts.SOLUTION_ANALYSIS_USER_PROMPT_TEMPLATE + prompts.REFERENCES_BLOCK_TEMPLATE,
+        references=active_references,
+        formatted_references=formatted_references,
+        case_text=case_description,
+        user_input=user_solution_text,
+        record=record
+    )
     user_content = prompts.SOLUTION_ANALYSIS_USER_PROMPT_TEMPLATE.format(
-        case_description=case_description,
-        user_solution_text=user_solution_text
+        references_block=prompts.REFERENCES_BLOCK_TEMPLATE.format(formatted_references=prompt.formatted_references),
+        case_description=prompt.case_text,
+        user_solution_text=prompt.user_input
     )
     
-    messages = [
-        {"role": "system", "content": system_prompt},
+    return [
+        {"role": "system", "content": prompts.SOLUTION_ANALYSIS_SYSTEM_PROMPT},
         {"role": "user", "content": user_content}
     ]
 
-    model_for_analysis = "gpt-4o-mini"
-    generated_analysis_json = await generate_text_with_ai(
+async def analyze_solution_with_ai(
+    case_description: str, 
+    user_solution_text: str,
+    active_references: Optional[List[Dict[str, str]]] = None,
+    formatted_references: Optional[str] = None
+) -> Optional[Dict[str, str]]:
+    
+    messages = _build_solution_analysis_messages(case_description, user_solution_text, active_references, formatted_references)
+    analysis = await generate_structured_with_ai(
         messages=messages, 
-        model=model_for_analysis, 
+        model=SOLUTION_ANALYSIS_MODEL, 
+        response_model=SolutionAnalysisResponse,
         temperature=0.5, 
-        max_tokens=3000
+        max_tokens=3000,
+        task="solution_analysis"
     )
-    
-    if generated_analysis_json:
-        try:
-            import json
-            content_to_parse = generated_analysis_json.strip()
-            if content_to_parse.startswith("```json"):
-                content_to_parse = content_to_parse[len("```json"):].strip()
-            if content_to_parse.endswith("```"):
-                content_to_parse = content_to_parse[:-len("```")]
-            content_to_parse = content_to_parse.strip()
-
-            analysis_data = json.loads(content_to_parse)
-            if isinstance(analysis_data, dict) and \
-               "strengths" in analysis_data and \
-               "areas_for_improvement" in analysis_data and \
-               "overall_impression" in analysis_data and \
-               "solution_rating" in analysis_data:
-                return analysis_data
-            else:
-                logger.error(f"AI (model {model_for_analysis}) returned malformed JSON for solution analysis (missing expected keys): {generated_analysis_json}")
-                return {"error": "Malformed JSON response from AI - missing keys", "raw_response": generated_analysis_json}
-        except json.JSONDecodeError:
-            logger.error(f"Failed to decode JSON from AI (model {model_for_analysis}) for solution analysis: {generated_analysis_json}", exc_info=True)
-            return {"error": "JSONDecodeError from AI response", "raw_response": generated_analysis_json}
-    return None
+    return analysis.model_dump() if analysis else None
+
+async def stream_solution_analysis_from_ai(
+    case_description: str,
+    user_solution_text: str,
+    active_references: Optional[List[Dict[str, str]]] = None,
+    formatted_references: Optional[str] = None
+) -> AsyncIterator[str]:
+    """Yields the raw completion deltas of a solution analysis; pass the joined text to finalize_streamed_solution_analysis()."""
+    messages = _build_solution_analysis_messages(case_description, user_solution_text, active_references, formatted_references)
+    async for delta in stream_text_with_ai(
+        messages=messages, model=SOLUTION_ANALYSIS_MODEL, temperature=0.5, max_tokens=3000, task="solution_analysis",
+        response_model=SolutionAnalysisResponse
+    ):
+        yield delta
+
+async def finalize_streamed_solution_analysis(
+    generated_analysis_json: Optional[str],
+    case_description: str,
+    user_solution_text: str,
+    active_references: Optional[List[Dict[str, str]]] = None,
+    formatted_references: Optional[str] = None
+) -> Optional[Dict[str, str]]:
+    messages = _build_solution_analysis_messages(case_description, user_solution_text, active_references, formatted_references, record=False)
+    analysis = await validate_structured_output(
+        generated_analysis_json, messages, SOLUTION_ANALYSIS_MODEL, SolutionAnalysisResponse, 3000, "solution_analysis"
+    )
+    return analysis.model_dump() if analysis else None
+
+FEEDBACK_ANALYSIS_MODEL = "gpt-4o-mini"
 
 async def analyze_feedback_substance(feedback_text: str) -> Optional[Dict[str, any]]:
 
     system_prompt = prompts.FEEDBACK_ANALYSIS_SYSTEM_PROMPT
-    user_prompt = prompts.FEEDBACK_ANALYSIS_USER_PROMPT_TEMPLATE.format(feedback_text=feedback_text)
+    prompt = prompt_budgeter.fit(
+        "feedback_analysis", FEEDBACK_ANALYSIS_MODEL,
+        system_prompt + prompts.FEEDBACK_ANALYSIS_USER_PROMPT_TEMPLATE,
+        user_input=feedback_text
+    )
+    user_prompt = prompts.FEEDBACK_ANALYSIS_USER_PROMPT_TEMPLATE.format(feedback_text=prompt.user_input)
 
     messages = [
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": user_prompt}
     ]
 
-    model_for_feedback_analysis = "gpt-4o-mini"
-    
-    logger.debug(f"Sending feedback to AI for analysis. Model: {model_for_feedback_analysis}. Feedback: '{feedback_text[:100]}...' ")
+    logger.debug(f"Sending feedback to AI for analysis. Model: {FEEDBACK_ANALYSIS_MODEL}. Feedback: '{feedback_text[:100]}...' ")
 
-    raw_response = await generate_text_with_ai(
-        messages=messages,
-        model=model_for_feedback_analysis,
-        temperature=0.3,
-        max_tokens=1000
-    )
+    with ai_priority(AIPriority.BACKGROUND):
+        verdict = await generate_structured_with_ai(
+            messages=messages,
+            model=FEEDBACK_ANALYSIS_MODEL,
+            response_model=FeedbackVerdict,
+            temperature=0.3,
+            max_tokens=1000,
+            task="feedback_analysis"
+        )
+    if verdict is None:
+        logger.warning(f"No usable response from AI for feedback analysis (model: {FEEDBACK_ANALYSIS_MODEL}).")
+        return None
+    logger.info(f"Feedback analysis successful: is_meaningful={verdict.is_meaningful}")
+    return verdict.model_dump()
 
-    if raw_response:
-        logger.debug(f"Raw AI response for feedback analysis: {raw_response}")
-        try:
-            import json
-            content_to_parse = raw_response.strip()
-            if content_to_parse.startswith("```json"):
-                content_to_parse = content_to_parse[len("```json"):].strip()
-            if content_to_parse.endswith("```"):
-                content_to_parse = content_to_parse[:-len("```")]
-            content_to_parse = content_to_parse.strip()
-            
-            if not (content_to_parse.startswith("{") and content_to_parse.endswith("}")):
-                logger.error(f"AI response for feedback analysis is not a valid JSON object: {content_to_parse}")
-                return {"is_meaningful": None, "reason": "AI response was not valid JSON.", "category": "error", "raw_response": raw_response}
+async def analyze_feedback_batch(items: Dict[int, str]) -> Dict[int, Dict[str, any]]:
+    """Classifies several feedback texts in one call. items maps a caller-chosen id to the text.
 
-            analysis_data = json.loads(content_to_parse)
-            
-            if isinstance(analysis_data, dict) and \
-               isinstance(analysis_data.get("is_meaningful"), bool) and \
-               isinstance(analysis_data.get("reason"), str) and \
-               isinstance(analysis_data.get("category"), str):
-                logger.info(f"Feedback analysis successful: is_meaningful={analysis_data['is_meaningful']}")
-                return analysis_data
-            else:
-                logger.error(f"AI (model {model_for_feedback_analysis}) returned malformed or incomplete JSON for feedback analysis: {raw_response}")
-                return {"is_meaningful": None, "reason": "Malformed or incomplete JSON response from AI.", "category": "error", "raw_response": raw_response}
-        except json.JSONDecodeError:
-            logger.error(f"Failed to decode JSON from AI (model {model_for_feedback_analysis}) for feedback analysis: {raw_response}", exc_info=True)
-            return {"is_meaningful": None, "reason": "JSONDecodeError from AI response.", "category": "error", "raw_response": raw_response}
-        except Exception as e:
-            logger.error(f"Unexpected error during feedback analysis post-processing: {e}", exc_info=True)
-            return {"is_meaningful": None, "reason": f"Unexpected error: {str(e)}", "category": "error", "raw_response": raw_response}
+    Returns verdicts by id; ids the model skipped are missing from the result.
+    """
+    if not items:
+        return {}
+    feedback_items = "\n".join(
+        prompts.FEEDBACK_BATCH_ITEM_TEMPLATE.format(
+            item_id=item_id, feedback_text=prompt_budgeter.truncate_input("feedback_analysis", FEEDBACK_ANALYSIS_MODEL, text)
+        )
+        for item_id, text in items.items()
+    )
+    messages = [
+        {"role": "system", "content": prompts.FEEDBACK_BATCH_ANALYSIS_SYSTEM_PROMPT},
+        {"role": "user", "content": prompts.FEEDBACK_BATCH_ANALYSIS_USER_PROMPT_TEMPLATE.format(count=len(items), feedback_items=feedback_items)}
+    ]
+
+    with ai_priority(AIPriority.BACKGROUND):
+        batch = await generate_structured_with_ai(
+            messages=messages,
+            model=FEEDBACK_ANALYSIS_MODEL,
+            response_model=FeedbackBatchResponse,
+            temperature=0.3,
+            max_tokens=min(250 * len(items) + 200, 8000),
+            task="feedback_analysis"
+        )
+    if batch is None:
+        logger.warning(f"No usable response from AI for a batch of {len(items)} feedback items.")
+        return {}
 
-    logger.warning(f"No response from AI for feedback analysis (model: {model_for_feedback_analysis}).")
-    return None 
+    results = {verdict.id: verdict.model_dump(exclude={"id"}) for verdict in batch.results if verdict.id in items}
+    if len(results) < len(items):
+        logger.warning(f"Feedback batch returned {len(results)} usable verdicts for {len(items)} items.")
+    return results
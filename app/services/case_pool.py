@@ -0,0 +1,123 @@
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.crud.ai_reference_crud import get_active_reference_set
+from app.services.reference_index import reference_index
+from app.db.crud.case_crud import claim_pooled_case, count_pooled_cases, create_case, delete_stale_pooled_cases
+from app.db.models import Case
+from app.services.ai_service import generate_case_from_ai, CASE_GENERATION_MODEL
+
+logger = logging.getLogger(__name__)
+
+POOLED_CASE_PROMPT_VERSION = "generic_case_prompt_v1_json_output_with_refs"
+
+
+class CasePoolManager:
+    """Keeps up to target_size unassigned AI-generated cases ready so a case request does not wait on the model.
+
+    refill() runs from the scheduler and generates at most max_per_refill cases per run, one after
+    another, which bounds the background load on the AI provider.
+    """
+
+    def __init__(self, target_size: int, max_age_hours: int, max_per_refill: int):
+        self.target_size = target_size
+        self.max_age_hours = max_age_hours
+        self.max_per_refill = max_per_refill
+        self._refill_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.generation_failures = 0
+        self.last_depth: Optional[int] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.target_size > 0
+
+    async def claim(self, session: AsyncSession) -> Optional[Case]:
+        if not self.enabled:
+            return None
+        case = await claim_pooled_case(db=session, max_age_hours=self.max_age_hours)
+        if case:
+            self.hits += 1
+        else:
+            self.misses += 1
+            logger.info("Case pool is empty, falling back to live generation.")
+        return case
+
+    async def depth(self, session: AsyncSession) -> int:
+        self.last_depth = await count_pooled_cases(db=session, max_age_hours=self.max_age_hours)
+        return self.last_depth
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        return {
+            "target_size": self.target_size,
+            "last_depth": self.last_depth,
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "generation_failures": self.generation_failures,
+        }
+
+    async def _generate_one(self, session_pool: async_sessionmaker[AsyncSession]) -> bool:
+        async with session_pool() as session:
+            reference_set = await get_active_reference_set(db=session)
+        reference_set = reference_index.for_case_generation(reference_set)
+        case_data = await generate_case_from_ai(
+            active_references=reference_set.references,
+            formatted_references=reference_set.prompt_block,
+        )
+        if not case_data or not case_data.get("title") or not case_data.get("description"):
+            logger.warning(f"Case pool: generation returned no usable case: {case_data}")
+            return False
+        async with session_pool() as session:
+            new_case = await create_case(
+                db=session,
+                title=case_data["title"],
+                case_text=case_data["description"],
+                ai_model_used=CASE_GENERATION_MODEL,
+                prompt_version=POOLED_CASE_PROMPT_VERSION,
+                is_pooled=True,
+            )
+            await session.commit()
+        logger.debug(f"Case pool: added case {new_case.id}.")
+        return True
+
+    async def refill(self, session_pool: async_sessionmaker[AsyncSession]) -> int:
+        if not self.enabled or self._refill_lock.locked():
+            return 0
+        async with self._refill_lock:
+            async with session_pool() as session:
+                removed = await delete_stale_pooled_cases(db=session, max_age_hours=self.max_age_hours)
+                await session.commit()
+                depth = await self.depth(session)
+            if removed:
+                logger.info(f"Case pool: removed {removed} cases older than {self.max_age_hours}h.")
+
+            to_generate = min(self.target_size - depth, self.max_per_refill)
+            added = 0
+            for _ in range(max(to_generate, 0)):
+                try:
+                    if await self._generate_one(session_pool):
+                        added += 1
+                    else:
+                        self.generation_failures += 1
+                except Exception as e:
+                    self.generation_failures += 1
+                    logger.error(f"Case pool: failed to generate a case: {e}", exc_info=True)
+            self.generated += added
+            if added:
+                self.last_depth = depth + added
+            logger.info(f"Case pool: depth {self.last_depth}/{self.target_size}, added {added}, hits {self.hits}, misses {self.misses}.")
+            return added
+
+
+case_pool = CasePoolManager(
+    target_size=settings.CASE_POOL_SIZE,
+    max_age_hours=settings.CASE_POOL_MAX_AGE_HOURS,
+    max_per_refill=settings.CASE_POOL_MAX_PER_REFILL,
+)
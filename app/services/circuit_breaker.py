@@ -0,0 +1,79 @@
+import enum
+import logging
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BreakerState(str, enum.Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calls to one provider/model after failure_threshold consecutive failures or timeouts.
+
+    While open, allow() refuses calls for reset_seconds. After that a single probe call is let through
+    (half-open): its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self.trips = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == BreakerState.CLOSED:
+            return True
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self.opened_at < self.reset_seconds:
+                return False
+            self.state = BreakerState.HALF_OPEN
+            logger.info(f"Circuit breaker {self.name} is half-open, sending a probe call.")
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        if self.state != BreakerState.CLOSED:
+            logger.info(f"Circuit breaker {self.name} closed after a successful probe.")
+        self.state = BreakerState.CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.consecutive_failures += 1
+        if self.state == BreakerState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != BreakerState.OPEN:
+                self.trips += 1
+                logger.warning(f"Circuit breaker {self.name} opened after {self.consecutive_failures} consecutive failures.")
+            self.state = BreakerState.OPEN
+            self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """Ends a call that says nothing about provider health (cancelled, or rejected as a bad request)."""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, object]:
+        retry_in = None
+        if self.state == BreakerState.OPEN:
+            retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at))
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "trips": self.trips,
+            "retry_in_s": retry_in,
+        }
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.crud.feedback_crud import get_cached_feedback_analysis, save_feedback_analysis
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_feedback_text(text: str) -> str:
+    """Case-folds, drops punctuation, symbols and emoji, and collapses whitespace, so near-identical repeats share a key."""
+    text = unicodedata.normalize("NFKC", text).casefold()
+    kept = "".join(char if unicodedata.category(char)[0] in "LN" else " " for char in text)
+    return " ".join(kept.split())
+
+
+def feedback_text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_feedback_text(text).encode("utf-8")).hexdigest()
+
+
+def is_cacheable_analysis(analysis: Optional[Dict[str, Any]]) -> bool:
+    return bool(analysis) and isinstance(analysis.get("is_meaningful"), bool) \
+        and isinstance(analysis.get("category"), str) and analysis.get("category") != "error" \
+        and isinstance(analysis.get("reason"), str)
+
+
+class FeedbackAnalysisCache:
+    """Feedback analyses keyed by the hash of the normalized text, stored in feedback_analysis_cache.
+
+    An optional in-process LRU (lru_size > 0) sits in front of the table. Only well-formed analyses are
+    stored, so a provider error is retried on the next submission.
+    """
+
+    def __init__(self, lru_size: int):
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return (self.memory_hits + self.db_hits) / lookups if lookups else 0.0
+
+    def _remember(self, text_hash: str, analysis: Dict[str, Any]) -> None:
+        if self.lru_size <= 0:
+            return
+        self._lru[text_hash] = analysis
+        self._lru.move_to_end(text_hash)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    async def get(self, db: AsyncSession, text_hash: str) -> Optional[Dict[str, Any]]:
+        analysis = self._lru.get(text_hash)
+        if analysis is not None:
+            self._lru.move_to_end(text_hash)
+            self.memory_hits += 1
+        else:
+            analysis = await get_cached_feedback_analysis(db=db, text_hash=text_hash)
+            if analysis is None:
+                self.misses += 1
+                return None
+            self.db_hits += 1
+            self._remember(text_hash, analysis)
+        logger.info(f"Feedback analysis cache hit for {text_hash[:12]} (hit ratio {self.hit_ratio:.0%}).")
+        return dict(analysis)
+
+    async def put(self, db: AsyncSession, text_hash: str, analysis: Dict[str, Any]) -> None:
+        if not is_cacheable_analysis(analysis):
+            return
+        entry = {"is_meaningful": analysis["is_meaningful"], "category": analysis["category"], "reason": analysis["reason"]}
+        self._remember(text_hash, entry)
+        try:
+            # A savepoint keeps a failed insert from aborting the caller's transaction.
+            async with db.begin_nested():
+                await save_feedback_analysis(db=db, text_hash=text_hash, **entry)
+        except Exception as e:
+            logger.warning(f"Could not store feedback analysis {text_hash[:12]} in the cache table: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hit_ratio,
+            "lru_entries": len(self._lru),
+        }
+
+
+feedback_analysis_cache = FeedbackAnalysisCache(lru_size=settings.FEEDBACK_CACHE_LRU_SIZE)
@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.crud.feedback_crud import get_feedback_pending_analysis, update_feedback_analyses
+from app.db.session import AsyncSessionLocal
+from app.services.ai_service import analyze_feedback_batch
+from app.services.feedback_analysis_cache import feedback_analysis_cache, feedback_text_hash
+
+logger = logging.getLogger(__name__)
+
+# Stored on a feedback row until its batch has been classified; rows left in this state are re-queued on startup.
+PENDING_CATEGORY = "pending"
+PENDING_REASON = "AI analysis pending."
+
+
+@dataclass(slots=True)
+class _PendingFeedback:
+    feedback_id: int
+    text_hash: str
+    text: str
+
+
+class FeedbackBatcher:
+    """Collects feedback awaiting AI classification and classifies it in batches.
+
+    A batch is sent when batch_size items are queued or max_wait seconds after the first of them
+    arrived. Texts with the same normalized hash in one batch are sent once. The verdicts are written
+    back to all their feedback rows in one bulk UPDATE and stored in the feedback analysis cache.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession], batch_size: int, max_wait: float):
+        self.session_pool = session_pool
+        self.batch_size = max(batch_size, 1)
+        self.max_wait = max_wait
+        self._pending: List[_PendingFeedback] = []
+        self._flush_lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_tasks: set[asyncio.Task] = set()
+        self.batches = 0
+        self.items_classified = 0
+        self.items_failed = 0
+
+    def submit(self, feedback_id: int, text: str, text_hash: Optional[str] = None) -> None:
+        self._pending.append(_PendingFeedback(feedback_id, text_hash or feedback_text_hash(text), text))
+        if len(self._pending) >= self.batch_size:
+            self._start_flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.create_task(self._flush_after_wait())
+
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def _start_flush(self) -> None:
+        task = asyncio.create_task(self.flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush_after_wait(self) -> None:
+        await asyncio.sleep(self.max_wait)
+        await self.flush()
+
+    async def flush(self) -> int:
+        """Classifies everything queued so far, batch_size items per AI call. Returns the number of rows updated."""
+        updated = 0
+        async with self._flush_lock:
+            while self._pending:
+                batch, self._pending = self._pending[:self.batch_size], self._pending[self.batch_size:]
+                updated += await self._classify(batch)
+        return updated
+
+    async def _classify(self, batch: List[_PendingFeedback]) -> int:
+        texts_by_hash: Dict[str, str] = {}
+        for item in batch:
+            texts_by_hash.setdefault(item.text_hash, item.text)
+        hashes = list(texts_by_hash)
+        try:
+            verdicts = await analyze_feedback_batch({index: texts_by_hash[text_hash] for index, text_hash in enumerate(hashes)})
+        except Exception as e:
+            logger.error(f"Feedback batch of {len(batch)} items failed: {e}", exc_info=True)
+            verdicts = {}
+        verdicts_by_hash = {hashes[index]: verdict for index, verdict in verdicts.items()}
+
+        analyses = {}
+        for item in batch:
+            verdict = verdicts_by_hash.get(item.text_hash)
+            if verdict is None:
+                self.items_failed += 1
+                analyses[item.feedback_id] = {"is_meaningful": None, "reason": "AI analysis did not return a result.", "category": "unknown"}
+            else:
+                self.items_classified += 1
+                analyses[item.feedback_id] = verdict
+
+        try:
+            async with self.session_pool() as session:
+                updated = await update_feedback_analyses(db=session, analyses=analyses)
+                for text_hash, verdict in verdicts_by_hash.items():
+                    await feedback_analysis_cache.put(session, text_hash, verdict)
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to write feedback analyses for {len(analyses)} items: {e}", exc_info=True)
+            return 0
+        self.batches += 1
+        logger.info(f"Classified a feedback batch: {len(batch)} items, {len(hashes)} distinct texts, {len(verdicts)} verdicts, {updated} rows updated.")
+        return updated
+
+    async def requeue_pending(self, limit: int = 500) -> int:
+        """Queues feedback rows still marked pending, e.g. after a restart dropped the in-memory queue."""
+        async with self.session_pool() as session:
+            rows = await get_feedback_pending_analysis(db=session, pending_category=PENDING_CATEGORY, limit=limit)
+        queued_ids = {item.feedback_id for item in self._pending}
+        for feedback in rows:
+            if feedback.id not in queued_ids:
+                self.submit(feedback.id, feedback.text)
+        if rows:
+            logger.info(f"Re-queued {len(rows)} feedback items awaiting AI analysis.")
+        return len(rows)
+
+    async def close(self) -> None:
+        """Cancels the wait timer and classifies whatever is still queued."""
+        if self._timer is not None and not self._timer.done():
+            self._timer.cancel()
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "items_classified": self.items_classified,
+            "items_failed": self.items_failed,
+        }
+
+
+feedback_batcher = FeedbackBatcher(
+    session_pool=AsyncSessionLocal,
+    batch_size=settings.FEEDBACK_BATCH_SIZE,
+    max_wait=settings.FEEDBACK_BATCH_MAX_WAIT_SECONDS,
+)
@@ -0,0 +1,236 @@
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.services.reference_cache import render_references_block
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+    logger.info("tiktoken package not installed. Prompt token counts are estimated from text length.")
+
+# The gpt-4o models' encoding, also used for models tiktoken does not know, e.g. the DeepSeek fallback; close enough for budgeting
+_FALLBACK_ENCODING = "o200k_base"
+TRUNCATION_MARKER = "\n[…текст сокращён…]"
+
+_encodings: Dict[str, object] = {}
+# Set once an encoding could not be loaded; from then on every count falls back to _estimate_tokens
+_encoding_load_failed = False
+
+
+def _encoding_for(model: str):
+    global _encoding_load_failed
+    if not TIKTOKEN_AVAILABLE or _encoding_load_failed:
+        return None
+    encoding = _encodings.get(model)
+    if encoding is None:
+        # tiktoken downloads the BPE file on first use unless it is in TIKTOKEN_CACHE_DIR (the Docker image pre-fetches it)
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding(_FALLBACK_ENCODING)
+        except Exception as e:
+            _encoding_load_failed = True
+            logger.warning(f"Could not load the tiktoken encoding for {model} ({type(e).__name__}: {e}). Prompt token counts are estimated from text length.")
+            return None
+        _encodings[model] = encoding
+    return encoding
+
+
+def preload_encoding() -> bool:
+    """Loads the tiktoken encoding of the app's models. Blocking (it may download), so run it off the event loop at startup."""
+    return _encoding_for(_FALLBACK_ENCODING) is not None
+
+
+def _estimate_tokens(text: str) -> int:
+    # Latin text averages ~4 characters per token, Cyrillic closer to 2.5
+    non_ascii = sum(1 for char in text if ord(char) > 127)
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii / 2.5)
+
+
+def count_tokens(text: Optional[str], model: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return _estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Keeps the beginning of text within max_tokens, marking the cut. max_tokens <= 0 means no limit."""
+    if max_tokens <= 0 or count_tokens(text, model) <= max_tokens:
+        return text
+    budget = max(max_tokens - count_tokens(TRUNCATION_MARKER, model), 1)
+    encoding = _encoding_for(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:budget]).rstrip() + TRUNCATION_MARKER
+    length = len(text) * budget // _estimate_tokens(text)
+    while length > 0 and _estimate_tokens(text[:length]) > budget:
+        length = length * 9 // 10
+    return text[:length].rstrip() + TRUNCATION_MARKER
+
+
+@dataclass(frozen=True)
+class PromptBudget:
+    """Input-token limits for one task; 0 leaves a section (or the total) unlimited."""
+    total: int
+    references: int
+    case_text: int
+    user_input: int
+
+
+def parse_prompt_budgets(raw: str) -> Dict[str, PromptBudget]:
+    """Parses "task=total/references/case_text/user_input,..." as used by AI_PROMPT_BUDGETS."""
+    budgets: Dict[str, PromptBudget] = {}
+    for item in raw.split(","):
+        if "=" not in item:
+            continue
+        task, values = item.split("=", 1)
+        try:
+            total, references, case_text, user_input = (int(value) for value in values.split("/"))
+        except ValueError:
+            logger.warning(f"Ignoring malformed AI_PROMPT_BUDGETS entry: '{item.strip()}'")
+            continue
+        budgets[task.strip()] = PromptBudget(total, references, case_text, user_input)
+    return budgets
+
+
+@dataclass
+class FittedPrompt:
+    formatted_references: Optional[str]
+    case_text: Optional[str]
+    user_input: Optional[str]
+    breakdown: Dict[str, int]
+    truncated: List[str] = field(default_factory=list)
+
+
+class PromptBudgeter:
+    """Fits the variable parts of a prompt into the task's token budget and records the breakdown.
+
+    Each section is first cut to its own limit. If the prompt still exceeds the total, sections are reduced
+    in a fixed order of priority: references first (whole references are dropped from the end, the first one
+    is always kept), then the case text, then the user's input. The fixed template is never cut.
+    """
+
+    def __init__(self, budgets: Dict[str, PromptBudget]):
+        self.budgets = budgets
+        self._fixed_counts: Dict[tuple, int] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def _fixed_tokens(self, template_text: str, model: str) -> int:
+        key = (template_text, model)
+        count = self._fixed_counts.get(key)
+        if count is None:
+            count = self._fixed_counts[key] = count_tokens(template_text, model)
+        return count
+
+    def _fit_references(
+        self,
+        references: Optional[Sequence[Dict[str, str]]],
+        formatted_references: str,
+        limit: int,
+        model: str
+    ) -> str:
+        if limit <= 0 or count_tokens(formatted_references, model) <= limit:
+            return formatted_references
+        if not references:
+            return truncate_to_tokens(formatted_references, limit, model)
+        kept = list(references)
+        block = formatted_references
+        while len(kept) > 1 and count_tokens(block, model) > limit:
+            kept.pop()
+            block = render_references_block(kept)
+        return block
+
+    def fit(
+        self,
+        task: str,
+        model: str,
+        template_text: str,
+        references: Optional[Sequence[Dict[str, str]]] = None,
+        formatted_references: Optional[str] = None,
+        case_text: Optional[str] = None,
+        user_input: Optional[str] = None,
+        record: bool = True
+    ) -> FittedPrompt:
+        """template_text is the fixed part of the prompt (system and user templates); the other arguments are its variable parts.
+
+        record=False skips the statistics, for prompts rebuilt after the call was already counted.
+        """
+        if formatted_references is None and references is not None:
+            formatted_references = render_references_block(references)
+        budget = self.budgets.get(task)
+        fixed = self._fixed_tokens(template_text, model)
+        original = {
+            "references": count_tokens(formatted_references, model),
+            "case_text": count_tokens(case_text, model),
+            "user_input": count_tokens(user_input, model),
+        }
+        sections = {"references": formatted_references, "case_text": case_text, "user_input": user_input}
+        counts = dict(original)
+
+        def limit_section(name: str, limit: int) -> None:
+            if sections[name] is None or limit <= 0 or counts[name] <= limit:
+                return
+            if name == "references":
+                sections[name] = self._fit_references(references, sections[name], limit, model)
+            else:
+                sections[name] = truncate_to_tokens(sections[name], limit, model)
+            counts[name] = count_tokens(sections[name], model)
+
+        if budget is not None:
+            for name in ("references", "case_text", "user_input"):
+                limit_section(name, getattr(budget, name))
+            for name in ("references", "case_text", "user_input"):
+                excess = fixed + sum(counts.values()) - budget.total
+                if budget.total <= 0 or excess <= 0:
+                    break
+                limit_section(name, max(counts[name] - excess, 1))
+
+        truncated = [name for name in counts if counts[name] < original[name]]
+        breakdown = dict(counts, fixed=fixed, total=fixed + sum(counts.values()))
+        if not record:
+            return FittedPrompt(sections["references"], sections["case_text"], sections["user_input"], breakdown, truncated)
+        self._record(task, breakdown, truncated)
+        logger.info(
+            "Prompt for %s (%s): %d tokens (fixed %d, references %d, case %d, input %d)%s",
+            task, model, breakdown["total"], fixed, counts["references"], counts["case_text"], counts["user_input"],
+            f", cut: {', '.join(truncated)}" if truncated else "",
+        )
+        return FittedPrompt(sections["references"], sections["case_text"], sections["user_input"], breakdown, truncated)
+
+    def truncate_input(self, task: str, model: str, text: str) -> str:
+        """Applies the task's user_input limit to one text, e.g. each item of a batched prompt."""
+        budget = self.budgets.get(task)
+        return truncate_to_tokens(text, budget.user_input, model) if budget is not None else text
+
+    def _record(self, task: str, breakdown: Dict[str, int], truncated: List[str]) -> None:
+        stats = self._stats.setdefault(task, {"calls": 0, "truncated_calls": 0, "tokens": 0, "max_tokens": 0})
+        stats["calls"] += 1
+        stats["truncated_calls"] += bool(truncated)
+        stats["tokens"] += breakdown["total"]
+        stats["max_tokens"] = max(stats["max_tokens"], breakdown["total"])
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            task: {
+                "calls": stats["calls"],
+                "truncated_calls": stats["truncated_calls"],
+                "avg_tokens": stats["tokens"] / stats["calls"],
+                "max_tokens": stats["max_tokens"],
+            }
+            for task, stats in self._stats.items()
+        }
+
+
+prompt_budgeter = PromptBudgeter(parse_prompt_budgets(settings.AI_PROMPT_BUDGETS))
+if prompt_budgeter.budgets and not TIKTOKEN_AVAILABLE:
+    logger.warning("AI_PROMPT_BUDGETS is set but tiktoken is not installed; budgets are enforced on estimated token counts.")
@@ -0,0 +1,81 @@
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NO_REFERENCES_PROMPT_BLOCK = "No specific reference materials provided. Base your response on general knowledge if necessary, but prioritize official CBT guidelines if known."
+
+
+def render_references_block(references: Optional[List[Dict[str, str]]]) -> str:
+    if not references:
+        return NO_REFERENCES_PROMPT_BLOCK
+
+    parts = ["Key Reference Materials to use EXCLUSIVELY:\\n\\n"]
+    for i, ref in enumerate(references):
+        parts.append(f"Source {i+1}:\\n")
+        parts.append(f"  Type: {ref.get('type', 'N/A')}\\n")
+        parts.append(f"  Description: {ref.get('digest') or ref.get('description', 'N/A')}\\n")
+        if ref.get('url'):
+            parts.append(f"  URL: {ref.get('url')}\\n")
+        if ref.get('citation'):
+            parts.append(f"  Citation: {ref.get('citation')}\\n")
+        parts.append("---\\n")
+    return "".join(parts)
+
+
+@dataclass(frozen=True, slots=True)
+class ActiveReferenceSet:
+    version: int
+    references: Tuple[Dict[str, str], ...]
+    prompt_block: str
+
+
+class ReferenceCache:
+    """Holds the active AI references and their rendered prompt block for the current reference-set version.
+
+    The ai_reference_crud writers bump the version, which drops the cached set in this process.
+    The TTL covers writes made by other processes, such as scripts/batch_add_references.py.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._version = 0
+        self._entry: Optional[Tuple[float, ActiveReferenceSet]] = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self) -> Optional[ActiveReferenceSet]:
+        if self._entry is not None:
+            expires_at, reference_set = self._entry
+            if reference_set.version == self._version and expires_at > time.monotonic():
+                self.hits += 1
+                return reference_set
+        self.misses += 1
+        return None
+
+    def put(self, references: List[Dict[str, str]], version: int) -> ActiveReferenceSet:
+        reference_set = ActiveReferenceSet(
+            version=version,
+            references=tuple(references),
+            prompt_block=render_references_block(references),
+        )
+        if version == self._version and self.ttl_seconds > 0:
+            self._entry = (time.monotonic() + self.ttl_seconds, reference_set)
+        else:
+            logger.debug(f"Not caching reference set version {version}, current version is {self._version}.")
+        return reference_set
+
+    def bump(self) -> None:
+        self._version += 1
+        self._entry = None
+
+
+reference_cache = ReferenceCache(ttl_seconds=settings.REFERENCE_CACHE_TTL_SECONDS)
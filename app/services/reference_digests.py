@@ -0,0 +1,111 @@
+import logging
+import time
+from typing import Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import prompts
+from app.core.config import settings
+from app.db.crud.ai_reference_crud import get_references_needing_digest, save_reference_digest
+from app.db.session import AsyncSessionLocal
+from app.services.ai_scheduler import ai_priority, AIPriority
+from app.services.ai_service import generate_text_with_ai
+from app.services.prompt_budget import count_tokens, truncate_to_tokens
+from app.services.reference_cache import reference_cache
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_DIGEST_MODEL = "gpt-4o-mini"
+# A reference whose digest could not be generated is left out of the following runs for this long
+_FAILURE_BACKOFF_SECONDS = 3600
+
+
+class ReferenceDigester:
+    """Writes a compact digest of each active reference's description, off the request path.
+
+    Only references without a digest or edited since it was written are picked up, batch_size per run.
+    Descriptions already within max_tokens are stored as their own digest without an AI call, and a
+    digest is never written over a reference that changed while it was being generated.
+    """
+
+    def __init__(self, session_pool: async_sessionmaker[AsyncSession], max_tokens: int, batch_size: int):
+        self.session_pool = session_pool
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+        self._failed_at: Dict[int, float] = {}
+        self.digested = 0
+        self.kept_as_is = 0
+        self.failures = 0
+        self.stale = 0
+        self.tokens_saved = 0
+
+    async def _digest(self, source_type: str, description: str) -> Optional[str]:
+        messages = [
+            {"role": "system", "content": prompts.REFERENCE_DIGEST_SYSTEM_PROMPT.format(max_words=max(self.max_tokens // 2, 20))},
+            {"role": "user", "content": prompts.REFERENCE_DIGEST_USER_PROMPT_TEMPLATE.format(source_type=source_type, description=description)},
+        ]
+        with ai_priority(AIPriority.BACKGROUND):
+            digest = await generate_text_with_ai(
+                messages=messages, model=REFERENCE_DIGEST_MODEL, temperature=0.2, max_tokens=self.max_tokens * 2, task="reference_digest"
+            )
+        if not digest:
+            return None
+        return truncate_to_tokens(digest, self.max_tokens, REFERENCE_DIGEST_MODEL)
+
+    async def refresh(self) -> int:
+        """Digests up to batch_size changed references. Returns the number of digests stored."""
+        now = time.monotonic()
+        self._failed_at = {reference_id: failed_at for reference_id, failed_at in self._failed_at.items() if now - failed_at < _FAILURE_BACKOFF_SECONDS}
+        async with self.session_pool() as session:
+            references = await get_references_needing_digest(db=session, limit=self.batch_size, exclude_ids=list(self._failed_at))
+            pending = [(reference.id, reference.source_type.value, reference.description, reference.updated_at) for reference in references]
+
+        stored = 0
+        for reference_id, source_type, description, updated_at in pending:
+            description_tokens = count_tokens(description, REFERENCE_DIGEST_MODEL)
+            if description_tokens <= self.max_tokens:
+                digest = description
+            else:
+                try:
+                    digest = await self._digest(source_type, description)
+                except Exception as e:
+                    logger.error(f"Digest generation for AI reference {reference_id} failed: {e}", exc_info=True)
+                    digest = None
+                if digest is None:
+                    self.failures += 1
+                    self._failed_at[reference_id] = time.monotonic()
+                    continue
+
+            async with self.session_pool() as session:
+                saved = await save_reference_digest(db=session, reference_id=reference_id, digest=digest, source_updated_at=updated_at)
+            if not saved:
+                self.stale += 1
+                logger.info(f"AI reference {reference_id} changed while its digest was generated, will retry on the next run.")
+                continue
+            stored += 1
+            if digest is description:
+                self.kept_as_is += 1
+            else:
+                self.digested += 1
+                self.tokens_saved += description_tokens - count_tokens(digest, REFERENCE_DIGEST_MODEL)
+
+        if stored:
+            reference_cache.bump()
+            logger.info(f"Stored {stored} AI reference digests ({len(pending) - stored} pending or failed).")
+        return stored
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "digested": self.digested,
+            "kept_as_is": self.kept_as_is,
+            "failures": self.failures,
+            "stale": self.stale,
+            "tokens_saved": self.tokens_saved,
+        }
+
+
+reference_digester = ReferenceDigester(
+    session_pool=AsyncSessionLocal,
+    max_tokens=settings.REFERENCE_DIGEST_MAX_TOKENS,
+    batch_size=settings.REFERENCE_DIGEST_BATCH_SIZE,
+)
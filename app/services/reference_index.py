@@ -0,0 +1,172 @@
+import hashlib
+import logging
+import math
+import random
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+from app.core.config import settings
+from app.services.reference_cache import ActiveReferenceSet, render_references_block
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+# Words are cut to this many characters, a crude stemmer that folds most Russian and English inflections together
+_STEM_LENGTH = 6
+_BM25_K1 = 1.5
+_BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return [word[:_STEM_LENGTH] for word in _WORD_RE.findall(text.casefold()) if len(word) > 2 and not word.isdigit()]
+
+
+def _reference_key(reference: Dict[str, str]) -> str:
+    raw = "\x1f".join(reference.get(field) or "" for field in ("type", "description", "url", "citation", "digest"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // 4
+
+
+@dataclass(slots=True)
+class _IndexedReference:
+    reference: Dict[str, str]
+    term_counts: Counter
+    terms: FrozenSet[str]
+    length: int
+
+
+class ReferenceIndex:
+    """In-process BM25 index over the description and citation of the active AI references.
+
+    sync() applies only the difference to the previous reference set, so edits by admins re-index just the
+    changed rows. for_analysis() keeps the top_k references most relevant to a case and solution,
+    for_case_generation() a varied sample of sample_size references. A limit of 0 keeps every reference.
+    """
+
+    def __init__(self, top_k: int, sample_size: int):
+        self.top_k = top_k
+        self.sample_size = sample_size
+        self._docs: Dict[str, _IndexedReference] = {}
+        self._order: List[str] = []
+        self._document_frequency: Counter = Counter()
+        self._total_length = 0
+        self._synced: Optional[Sequence[Dict[str, str]]] = None
+        self.selections = 0
+        self.prompt_tokens_full = 0
+        self.prompt_tokens_selected = 0
+
+    def sync(self, references: Sequence[Dict[str, str]]) -> None:
+        if references is self._synced:
+            return
+        keys = [_reference_key(reference) for reference in references]
+        wanted = dict(zip(keys, references))
+        removed = [key for key in self._docs if key not in wanted]
+        for key in removed:
+            doc = self._docs.pop(key)
+            self._document_frequency.subtract(doc.terms)
+            self._total_length -= doc.length
+        added = 0
+        for key, reference in wanted.items():
+            if key in self._docs:
+                continue
+            term_counts = Counter(tokenize(f"{reference.get('description') or ''} {reference.get('citation') or ''}"))
+            doc = _IndexedReference(reference, term_counts, frozenset(term_counts), sum(term_counts.values()))
+            self._docs[key] = doc
+            self._document_frequency.update(doc.terms)
+            self._total_length += doc.length
+            added += 1
+        self._document_frequency += Counter()  # drops terms whose count fell to zero
+        self._order = list(wanted)
+        self._synced = references
+        if added or removed:
+            logger.info(f"Reference index updated: {added} added, {len(removed)} removed, {len(self._docs)} indexed.")
+
+    def _scores(self, query: str) -> Dict[str, float]:
+        query_terms = set(tokenize(query))
+        doc_count = len(self._docs)
+        avg_length = self._total_length / doc_count if doc_count else 0.0
+        scores: Dict[str, float] = {}
+        for key in self._order:
+            doc = self._docs[key]
+            score = 0.0
+            for term in query_terms & doc.terms:
+                df = self._document_frequency[term]
+                idf = math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+                tf = doc.term_counts[term]
+                norm = 1 - _BM25_B + _BM25_B * (doc.length / avg_length if avg_length else 1.0)
+                score += idf * tf * (_BM25_K1 + 1) / (tf + _BM25_K1 * norm)
+            scores[key] = score
+        return scores
+
+    def top(self, query: str, k: int) -> List[Dict[str, str]]:
+        scores = self._scores(query)
+        ranked = sorted(self._order, key=lambda key: scores[key], reverse=True)[:k]
+        # References sharing no term with the query are dropped, unless nothing matched at all
+        chosen = {key for key in ranked if scores[key] > 0} or set(ranked)
+        # Keep the admin-defined order inside the prompt
+        return [self._docs[key].reference for key in self._order if key in chosen]
+
+    def diverse_sample(self, k: int) -> List[Dict[str, str]]:
+        """Farthest-point selection by term overlap from a random start, so successive cases draw on different sources."""
+        remaining = list(self._order)
+        chosen = [remaining.pop(random.randrange(len(remaining)))]
+        while remaining and len(chosen) < k:
+            def closest_similarity(key: str) -> float:
+                terms = self._docs[key].terms
+                return max(_jaccard(terms, self._docs[other].terms) for other in chosen)
+            best = min(remaining, key=lambda key: (closest_similarity(key), random.random()))
+            remaining.remove(best)
+            chosen.append(best)
+        chosen_set = set(chosen)
+        return [self._docs[key].reference for key in self._order if key in chosen_set]
+
+    def _narrow(self, reference_set: ActiveReferenceSet, selected: List[Dict[str, str]], purpose: str) -> ActiveReferenceSet:
+        narrowed = ActiveReferenceSet(
+            version=reference_set.version,
+            references=tuple(selected),
+            prompt_block=render_references_block(selected),
+        )
+        full_tokens = _estimate_tokens(reference_set.prompt_block)
+        selected_tokens = _estimate_tokens(narrowed.prompt_block)
+        self.selections += 1
+        self.prompt_tokens_full += full_tokens
+        self.prompt_tokens_selected += selected_tokens
+        logger.info(
+            f"References for {purpose}: {len(selected)} of {len(reference_set.references)}, "
+            f"reference block ~{full_tokens} -> ~{selected_tokens} input tokens."
+        )
+        return narrowed
+
+    def for_analysis(self, reference_set: ActiveReferenceSet, query: str) -> ActiveReferenceSet:
+        if self.top_k <= 0 or len(reference_set.references) <= self.top_k:
+            return reference_set
+        self.sync(reference_set.references)
+        return self._narrow(reference_set, self.top(query, self.top_k), "solution analysis")
+
+    def for_case_generation(self, reference_set: ActiveReferenceSet) -> ActiveReferenceSet:
+        if self.sample_size <= 0 or len(reference_set.references) <= self.sample_size:
+            return reference_set
+        self.sync(reference_set.references)
+        return self._narrow(reference_set, self.diverse_sample(self.sample_size), "case generation")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "indexed": len(self._docs),
+            "selections": self.selections,
+            "prompt_tokens_full": self.prompt_tokens_full,
+            "prompt_tokens_selected": self.prompt_tokens_selected,
+        }
+
+
+def _jaccard(left: FrozenSet[str], right: FrozenSet[str]) -> float:
+    if not left and not right:
+        return 1.0
+    return len(left & right) / len(left | right)
+
+
+reference_index = ReferenceIndex(top_k=settings.REFERENCE_TOP_K, sample_size=settings.REFERENCE_CASE_SAMPLE_SIZE)
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from typing import Dict
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud.user_crud import add_user_request_counts
+
+logger = logging.getLogger(__name__)
+
+
+class RequestCountAggregator:
+    """Accumulates per-user request counters in memory and writes them to users in one bulk UPDATE."""
+
+    def __init__(self):
+        self._pending: Dict[int, int] = {}
+        self._in_flight: Dict[int, int] = {}
+        self._flush_lock = asyncio.Lock()
+
+    def increment(self, telegram_id: int, amount: int = 1) -> None:
+        self._pending[telegram_id] = self._pending.get(telegram_id, 0) + amount
+
+    def pending_total(self) -> int:
+        return sum(self._pending.values()) + sum(self._in_flight.values())
+
+    def pending_for(self, telegram_id: int) -> int:
+        return self._pending.get(telegram_id, 0) + self._in_flight.get(telegram_id, 0)
+
+    async def flush(self, session_pool: async_sessionmaker[AsyncSession]) -> int:
+        async with self._flush_lock:
+            if not self._pending:
+                return 0
+
+            self._in_flight, self._pending = self._pending, {}
+            try:
+                async with session_pool() as session:
+                    updated_rows = await add_user_request_counts(db=session, counts=self._in_flight)
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Failed to flush request counters for {len(self._in_flight)} users, keeping them for the next flush: {e}", exc_info=True)
+                for telegram_id, delta in self._in_flight.items():
+                    self.increment(telegram_id, delta)
+                self._in_flight = {}
+                return 0
+
+            flushed_total = sum(self._in_flight.values())
+            logger.debug(f"Flushed {flushed_total} request counts for {len(self._in_flight)} users ({updated_rows} rows updated).")
+            self._in_flight = {}
+            return updated_rows
+
+
+request_counter = RequestCountAggregator()
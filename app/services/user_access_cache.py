@@ -0,0 +1,105 @@
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import settings
+from app.db.models import User, UserRole, SubscriptionStatus
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class UserAccessSnapshot:
+    """Compact view of the user columns the middleware needs to authorize an update."""
+    id: int
+    telegram_id: int
+    role: UserRole
+    is_blocked: bool
+    subscription_status: SubscriptionStatus
+    access_until: Optional[datetime]
+
+    def has_access(self, now: datetime) -> bool:
+        return self.access_until is not None and self.access_until > now
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserAccessSnapshot":
+        return cls(
+            id=user.id,
+            telegram_id=user.telegram_id,
+            role=user.role,
+            is_blocked=user.is_blocked,
+            subscription_status=user.subscription_status,
+            access_until=user.access_until,
+        )
+
+
+class UserAccessCache:
+    """Per-process cache of user access snapshots, refreshed or invalidated by the writers in user_crud.
+
+    Writers only reach the cache of their own process. With several bot instances (webhook mode) another
+    instance keeps serving its snapshot until ttl_seconds pass, so that TTL is the staleness window there.
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: int):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[int, tuple[float, UserAccessSnapshot]]" = OrderedDict()
+        # Bumped on every invalidation. A loader records it before querying the DB and
+        # the result is only stored if no writer invalidated anything in the meantime.
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, telegram_id: int) -> Optional[UserAccessSnapshot]:
+        entry = self._entries.get(telegram_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, snapshot = entry
+        if expires_at <= time.monotonic():
+            del self._entries[telegram_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(telegram_id)
+        self.hits += 1
+        return snapshot
+
+    def put(self, snapshot: UserAccessSnapshot, generation: Optional[int] = None) -> None:
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        if generation is not None and generation != self._generation:
+            logger.debug(f"Skipping stale user snapshot for {snapshot.telegram_id} (generation {generation} != {self._generation}).")
+            return
+        self._entries[snapshot.telegram_id] = (time.monotonic() + self.ttl_seconds, snapshot)
+        self._entries.move_to_end(snapshot.telegram_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._generation += 1
+        self._entries.pop(telegram_id, None)
+
+    def refresh(self, user: User) -> None:
+        """Replaces the cached snapshot with the state of a freshly committed user row."""
+        self.invalidate(user.telegram_id)
+        self.put(UserAccessSnapshot.from_user(user))
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+user_access_cache = UserAccessCache(
+    max_size=settings.USER_CACHE_MAX_SIZE,
+    ttl_seconds=settings.USER_CACHE_TTL_SECONDS,
+)
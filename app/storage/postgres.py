@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType, DEFAULT_DESTINY
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.crud.user_crud import get_user_fsm_record, save_user_fsm_records
+
+logger = logging.getLogger(__name__)
+
+
+class _FsmEntry:
+    __slots__ = ("state", "data", "expires_at")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any], expires_at: float):
+        self.state = state
+        self.data = data
+        self.expires_at = expires_at
+
+
+class PostgresStorage(BaseStorage):
+    """FSM storage that persists state and data in users.state / users.fsm_data.
+
+    Reads and writes go through an in-process cache. Changed entries are written back in one bulk
+    UPDATE every flush_interval seconds and stay pinned in the cache until then, so a handler that
+    calls set_state() and update_data() costs a single round trip. Clean entries expire after
+    ttl_seconds, which bounds how long this instance can serve a state another one replaced; the
+    default of a few seconds still covers the get/set calls of one update and of a quick follow-up.
+    Keys that do not map to a users row (group chats, topics, custom destinies) are kept in memory only.
+    """
+
+    def __init__(
+        self,
+        session_pool: async_sessionmaker[AsyncSession],
+        max_size: int,
+        ttl_seconds: float,
+        flush_interval: float,
+    ):
+        self.session_pool = session_pool
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self._entries: "OrderedDict[int, _FsmEntry]" = OrderedDict()
+        self._dirty: set[int] = set()
+        self._flushing: set[int] = set()
+        self._memory_only: Dict[StorageKey, Tuple[Optional[str], Dict[str, Any]]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @staticmethod
+    def _telegram_id(key: StorageKey) -> Optional[int]:
+        if key.destiny != DEFAULT_DESTINY or key.chat_id != key.user_id or key.thread_id is not None:
+            return None
+        return key.user_id
+
+    def _is_pinned(self, telegram_id: int) -> bool:
+        return telegram_id in self._dirty or telegram_id in self._flushing
+
+    def _store(self, telegram_id: int, state: Optional[str], data: Dict[str, Any]) -> _FsmEntry:
+        entry = _FsmEntry(state, data, time.monotonic() + self.ttl_seconds)
+        self._entries[telegram_id] = entry
+        self._entries.move_to_end(telegram_id)
+        if len(self._entries) > self.max_size:
+            for cached_id in list(self._entries):
+                if len(self._entries) <= self.max_size:
+                    break
+                if not self._is_pinned(cached_id):
+                    del self._entries[cached_id]
+        return entry
+
+    async def _load(self, telegram_id: int) -> _FsmEntry:
+        entry = self._entries.get(telegram_id)
+        if entry is not None and (self._is_pinned(telegram_id) or entry.expires_at > time.monotonic()):
+            self._entries.move_to_end(telegram_id)
+            return entry
+
+        async with self.session_pool() as session:
+            record = await get_user_fsm_record(session, telegram_id)
+
+        # A write for this user may have landed while we were reading.
+        entry = self._entries.get(telegram_id)
+        if entry is not None and self._is_pinned(telegram_id):
+            return entry
+        state, data = record if record else (None, {})
+        return self._store(telegram_id, state, data)
+
+    def _mark_dirty(self, telegram_id: int, entry: _FsmEntry) -> None:
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        self._dirty.add(telegram_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while self._dirty and not self._closed:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+
+            batch, self._dirty = self._dirty, set()
+            self._flushing = batch
+            records = {
+                telegram_id: (self._entries[telegram_id].state, self._entries[telegram_id].data.copy())
+                for telegram_id in batch
+            }
+            try:
+                async with self.session_pool() as session:
+                    updated_rows = await save_user_fsm_records(db=session, records=records)
+                    await session.commit()
+            except Exception as e:
+                logger.error(f"Failed to flush FSM state for {len(batch)} users, retrying on the next flush: {e}", exc_info=True)
+                self._dirty |= batch
+                return 0
+            finally:
+                self._flushing = set()
+
+            if updated_rows < len(records):
+                logger.debug(f"FSM flush: {len(records) - updated_rows} of {len(records)} users have no users row yet, their state is kept in cache only.")
+            return updated_rows
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state_name = state.state if isinstance(state, State) else state
+        telegram_id = self._telegram_id(key)
+        if telegram_id is None:
+            _, data = self._memory_only.get(key, (None, {}))
+            self._memory_only[key] = (state_name, data)
+            return
+        entry = await self._load(telegram_id)
+        entry.state = state_name
+        self._mark_dirty(telegram_id, entry)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        telegram_id = self._telegram_id(key)
+        if telegram_id is None:
+            return self._memory_only.get(key, (None, {}))[0]
+        return (await self._load(telegram_id)).state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        telegram_id = self._telegram_id(key)
+        if telegram_id is None:
+            state, _ = self._memory_only.get(key, (None, {}))
+            self._memory_only[key] = (state, dict(data))
+            return
+        entry = await self._load(telegram_id)
+        entry.data = dict(data)
+        self._mark_dirty(telegram_id, entry)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        telegram_id = self._telegram_id(key)
+        if telegram_id is None:
+            return self._memory_only.get(key, (None, {}))[1].copy()
+        return (await self._load(telegram_id)).data.copy()
+
+    async def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            await self._flush_task
+        await self.flush()
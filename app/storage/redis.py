@@ -0,0 +1,99 @@
+import logging
+import time
+from typing import Dict, Optional, Tuple, Union
+
+from aiogram.fsm.storage.base import BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+
+logger = logging.getLogger(__name__)
+
+try:
+    from redis.asyncio import Redis
+    from aiogram.fsm.storage.redis import RedisStorage
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+    logger.info("redis package not installed. FSM_STORAGE=redis is only available with REDIS_URL=memory://.")
+
+try:
+    from fakeredis.aioredis import FakeRedis
+    FAKEREDIS_AVAILABLE = True
+except ImportError:
+    FAKEREDIS_AVAILABLE = False
+
+IN_PROCESS_REDIS_URL = "memory://"
+
+
+class InProcessRedis:
+    """Minimal asyncio stand-in for the redis.asyncio.Redis commands used by the FSM storage.
+
+    Used for REDIS_URL=memory:// when fakeredis is not installed, e.g. in tests and benchmarks.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[bytes, Optional[float]]] = {}
+
+    @staticmethod
+    def _encode(value: Union[str, bytes, int, float]) -> bytes:
+        if isinstance(value, bytes):
+            return value
+        return str(value).encode("utf-8")
+
+    def _get_alive(self, key: str) -> Optional[bytes]:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._get_alive(key)
+
+    async def set(self, key: str, value, ex: Optional[int] = None, px: Optional[int] = None, nx: bool = False) -> Optional[bool]:
+        if nx and self._get_alive(key) is not None:
+            return None
+        expires_at = None
+        if ex:
+            expires_at = time.monotonic() + int(ex)
+        elif px:
+            expires_at = time.monotonic() + int(px) / 1000
+        self._values[key] = (self._encode(value), expires_at)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        deleted = 0
+        for key in keys:
+            if self._get_alive(key) is not None:
+                del self._values[key]
+                deleted += 1
+        return deleted
+
+    async def aclose(self, close_connection_pool: Optional[bool] = None) -> None:
+        self._values.clear()
+
+    async def close(self, close_connection_pool: Optional[bool] = None) -> None:
+        await self.aclose(close_connection_pool)
+
+
+def create_redis(url: str):
+    if url == IN_PROCESS_REDIS_URL:
+        if FAKEREDIS_AVAILABLE:
+            return FakeRedis()
+        return InProcessRedis()
+    if not REDIS_AVAILABLE:
+        raise RuntimeError(f"REDIS_URL is set to {url!r}, but the redis package is not installed.")
+    return Redis.from_url(url)
+
+
+def create_redis_storage(url: str, ttl_seconds: int = 0) -> BaseStorage:
+    if not REDIS_AVAILABLE:
+        if url == IN_PROCESS_REDIS_URL:
+            # aiogram's RedisStorage imports the redis package itself; a single-process stand-in behaves like MemoryStorage
+            logger.info("redis package not installed, using MemoryStorage for REDIS_URL=memory://.")
+            return MemoryStorage()
+        raise RuntimeError("FSM_STORAGE=redis requires the redis package (pip install redis).")
+    ttl = ttl_seconds if ttl_seconds > 0 else None
+    return RedisStorage(redis=create_redis(url), state_ttl=ttl, data_ttl=ttl)
@@ -4,10 +4,13 @@ from typing import List
 from zoneinfo import ZoneInfo
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.crud.user_crud import get_users_trial_ending_soon, set_trial_ending_notification_sent
+from app.db.crud.user_crud import get_users_trial_ending_soon, set_trial_ending_notification_sent, expire_overdue_subscriptions
 from app.db.session import AsyncSessionLocal
 from app.db.models import User
 from app.core.config import settings
+from app.services.request_counter import request_counter
+from app.services.case_pool import case_pool
+from app.services.reference_digests import reference_digester
 
 logger = logging.getLogger(__name__)
 
@@ -89,3 +92,33 @@ async def send_trial_ending_notifications(bot):
 
             except Exception as e:
                 logger.error(f"Failed to send trial ending notification to user {user.telegram_id} (DB ID: {user.id}): {e}", exc_info=True)
+
+async def flush_request_counts():
+    flushed_users = await request_counter.flush(AsyncSessionLocal)
+    if flushed_users:
+        logger.info(f"Flushed request counters for {flushed_users} users.")
+
+async def refill_case_pool():
+    try:
+        await case_pool.refill(AsyncSessionLocal)
+    except Exception as e:
+        logger.error(f"Case pool refill failed: {e}", exc_info=True)
+
+async def refresh_reference_digests():
+    try:
+        await reference_digester.refresh()
+    except Exception as e:
+        logger.error(f"AI reference digest refresh failed: {e}", exc_info=True)
+
+async def expire_overdue_subscriptions_sweep() -> int:
+    try:
+        async with AsyncSessionLocal() as db:
+            expired_telegram_ids = await expire_overdue_subscriptions(db)
+    except Exception as e:
+        logger.error(f"Subscription expiry sweep failed: {e}", exc_info=True)
+        return 0
+    if expired_telegram_ids:
+        logger.info(f"Expiry sweep set {len(expired_telegram_ids)} overdue trials/subscriptions to EXPIRED.")
+    else:
+        logger.debug("Expiry sweep found no overdue trials/subscriptions.")
+    return len(expired_telegram_ids)
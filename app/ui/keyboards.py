@@ -75,6 +75,9 @@ def get_admin_panel_main_keyboard() -> InlineKeyboardMarkup:
     builder.row(
         InlineKeyboardButton(text="📈 Конверсия из триала", callback_data="admin_trial_conversion_stats")
     )
+    builder.row(
+        InlineKeyboardButton(text="🤖 Состояние AI", callback_data="admin_ai_status")
+    )
     return builder.as_markup()
 
 def get_admin_users_menu_keyboard() -> InlineKeyboardMarkup:
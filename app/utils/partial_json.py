@@ -0,0 +1,201 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+# Parser for JSON documents that are still being generated. Values that are cut off are returned as far
+# as they go: a truncated string keeps its received prefix, unterminated objects and arrays are closed,
+# and a number or literal that may still grow is left out until it is complete.
+
+_MISSING = object()
+_WHITESPACE = " \t\r\n"
+
+
+class _PartialParser:
+    def __init__(self, text: str):
+        self.text = text
+        self.pos = 0
+
+    def _skip_ws(self) -> bool:
+        while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+            self.pos += 1
+        return self.pos < len(self.text)
+
+    def value(self) -> Tuple[Any, bool]:
+        if not self._skip_ws():
+            return _MISSING, False
+        char = self.text[self.pos]
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char == '"':
+            return self.string()
+        return self.scalar()
+
+    def object(self) -> Tuple[dict, bool]:
+        result: dict = {}
+        self.pos += 1
+        while True:
+            if not self._skip_ws():
+                return result, False
+            if self.text[self.pos] == "}":
+                self.pos += 1
+                return result, True
+            if self.text[self.pos] != '"':
+                raise ValueError(f"Expected a key at position {self.pos}")
+            key, complete = self.string()
+            if not complete or not self._skip_ws():
+                return result, False
+            if self.text[self.pos] != ":":
+                raise ValueError(f"Expected ':' at position {self.pos}")
+            self.pos += 1
+            value, complete = self.value()
+            if value is not _MISSING:
+                result[key] = value
+            if not complete or not self._skip_ws():
+                return result, False
+            if self.text[self.pos] == ",":
+                self.pos += 1
+            elif self.text[self.pos] != "}":
+                raise ValueError(f"Expected ',' or '}}' at position {self.pos}")
+
+    def array(self) -> Tuple[list, bool]:
+        result: list = []
+        self.pos += 1
+        while True:
+            if not self._skip_ws():
+                return result, False
+            if self.text[self.pos] == "]":
+                self.pos += 1
+                return result, True
+            value, complete = self.value()
+            if value is not _MISSING:
+                result.append(value)
+            if not complete or not self._skip_ws():
+                return result, False
+            if self.text[self.pos] == ",":
+                self.pos += 1
+            elif self.text[self.pos] != "]":
+                raise ValueError(f"Expected ',' or ']' at position {self.pos}")
+
+    def string(self) -> Tuple[str, bool]:
+        start = self.pos + 1
+        i = start
+        while i < len(self.text):
+            char = self.text[i]
+            if char == "\\":
+                i += 2
+                continue
+            if char == '"':
+                self.pos = i + 1
+                return json.loads(self.text[start - 1:i + 1]), True
+            i += 1
+        self.pos = len(self.text)
+        return _decode_truncated_string(self.text[start:]), False
+
+    def scalar(self) -> Tuple[Any, bool]:
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in _WHITESPACE + ",]}":
+            self.pos += 1
+        if self.pos == len(self.text):
+            return _MISSING, False
+        return json.loads(self.text[start:self.pos]), True
+
+
+def _decode_truncated_string(raw: str) -> str:
+    # Drop an escape sequence that was cut in half, e.g. a trailing "\" or "\u04".
+    backslash = raw.rfind("\\")
+    if backslash != -1:
+        escape = raw[backslash:]
+        preceding = len(raw[:backslash]) - len(raw[:backslash].rstrip("\\"))
+        if preceding % 2 == 0 and (len(escape) == 1 or (escape[1] == "u" and len(escape) < 6)):
+            raw = raw[:backslash]
+    try:
+        return json.loads(f'"{raw}"')
+    except ValueError:
+        return raw
+
+
+def parse_partial_json(text: str) -> Optional[Any]:
+    """Best-effort parse of a JSON prefix. Leading prose or a ``` fence before the first '{' or '[' is skipped.
+
+    Returns None when nothing usable has arrived yet or the text is not JSON.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return None
+    parser = _PartialParser(text[min(starts):])
+    try:
+        value, _ = parser.value()
+    except ValueError:
+        return None
+    return None if value is _MISSING else value
+
+
+class IncrementalJsonParser:
+    """Consumes a streamed JSON object chunk by chunk and reports top-level keys whose values are complete.
+
+    Nesting and string state are tracked across chunks, so every character is scanned once. The buffer is
+    only re-parsed when a top-level value has just ended.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._in_value = False
+        self.completed: Dict[str, Any] = {}
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, delta: str) -> Dict[str, Any]:
+        """Returns the top-level keys completed by this chunk, mapped to their values."""
+        value_ended = False
+        for char in delta:
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._in_value:
+                        value_ended = True
+                        self._in_value = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth <= 1 and self._in_value:
+                    value_ended = True
+                    self._in_value = False
+            elif self._depth == 1 and char == ":":
+                self._in_value = True
+            elif self._depth == 1 and char == "," and self._in_value:
+                value_ended = True
+                self._in_value = False
+        self._chunks.append(delta)
+
+        if not value_ended:
+            return {}
+        text = self.text
+        document = parse_partial_json(text[text.find("{"):])
+        if not isinstance(document, dict):
+            return {}
+        keys = list(document)
+        if self._in_value and keys:
+            keys = keys[:-1]  # the value after the last ':' is still being written
+        newly_completed = {key: document[key] for key in keys if key not in self.completed}
+        self.completed.update(newly_completed)
+        return newly_completed
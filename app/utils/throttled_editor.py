@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import re
+import time
+from typing import Any, List, Optional
+
+from aiogram import types
+from aiogram.enums import ParseMode
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_MAX_LENGTH = 4000
+_HTML_TOKEN_RE = re.compile(r"<(/?)([a-zA-Z][\w-]*)[^>]*>|&#?\w+;")
+
+
+def truncate_html(text: str, max_length: int) -> str:
+    """Cuts Telegram HTML to about max_length characters without splitting a tag or an entity and closes the tags left open."""
+    if len(text) <= max_length:
+        return text
+    cut = max_length
+    open_tags: List[str] = []
+    for match in _HTML_TOKEN_RE.finditer(text):
+        if match.start() >= max_length:
+            break
+        if match.end() > max_length:
+            cut = match.start()
+            break
+        closing, tag = match.group(1), match.group(2)
+        if not tag:
+            continue
+        tag = tag.lower()
+        if not closing:
+            open_tags.append(tag)
+        elif tag in open_tags:
+            del open_tags[len(open_tags) - 1 - open_tags[::-1].index(tag):]
+    return text[:cut] + "…" + "".join(f"</{tag}>" for tag in reversed(open_tags))
+
+
+class ThrottledMessageEditor:
+    """Progressively edits one Telegram message without exceeding the per-chat edit rate.
+
+    update() only records the newest text. A background task sends it at most once per min_interval,
+    so texts produced in between coalesce into one edit. A RetryAfter from Telegram pushes the next
+    edit back instead of failing the stream.
+    """
+
+    def __init__(self, message: types.Message, min_interval: float, parse_mode: Optional[str] = None):
+        self.message = message
+        self.min_interval = min_interval
+        self.parse_mode = parse_mode
+        self._pending: Optional[str] = None
+        self._last_sent: Optional[str] = None
+        self._next_edit_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.edits = 0
+
+    def is_due(self) -> bool:
+        """True when a new text would be sent right away; lets callers skip building previews nobody will see."""
+        return (self._task is None or self._task.done()) and time.monotonic() >= self._next_edit_at
+
+    def update(self, text: str) -> None:
+        if len(text) > PREVIEW_MAX_LENGTH:
+            text = truncate_html(text, PREVIEW_MAX_LENGTH) if self.parse_mode == ParseMode.HTML else text[:PREVIEW_MAX_LENGTH] + "…"
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._send_pending())
+
+    async def _edit(self, text: str, **kwargs: Any) -> None:
+        while True:
+            delay = self._next_edit_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                await self.message.edit_text(text, parse_mode=self.parse_mode, **kwargs)
+                self.edits += 1
+            except TelegramRetryAfter as e:
+                logger.info(f"Telegram asked to slow down edits of message {self.message.message_id} for {e.retry_after}s.")
+                self._next_edit_at = time.monotonic() + e.retry_after
+                continue
+            except TelegramBadRequest as e:
+                if "message is not modified" not in str(e):
+                    raise
+            self._last_sent = text
+            self._next_edit_at = time.monotonic() + self.min_interval
+            return
+
+    async def _send_pending(self) -> None:
+        try:
+            while self._pending is not None and self._pending != self._last_sent:
+                text, self._pending = self._pending, None
+                await self._edit(text)
+        except Exception as e:
+            logger.warning(f"Progressive edit of message {self.message.message_id} failed: {e}")
+
+    async def close(self) -> None:
+        """Waits for an in-flight edit and drops any text that has not been sent yet."""
+        self._pending = None
+        if self._task is not None:
+            await self._task
@@ -0,0 +1,81 @@
+import asyncio
+import hmac
+import logging
+from typing import Any, Dict
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebhookUpdateHandler:
+    """Receives Telegram webhook calls, acknowledges them immediately and processes the updates in the background.
+
+    At most max_concurrency updates are processed at a time. Once max_pending updates are waiting
+    or running, further requests get a 503 so Telegram redelivers them later instead of this process
+    buffering without bound. A secret token is mandatory: the endpoint is public, and without it anyone
+    could post updates in the name of any user, admins included.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, secret_token: str, max_concurrency: int, max_pending: int):
+        if not secret_token:
+            raise ValueError("The webhook endpoint needs a secret token.")
+        self.dispatcher = dispatcher
+        self.bot = bot
+        self.secret_token = secret_token
+        self.max_pending = max_pending
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.headers.get(SECRET_TOKEN_HEADER, ""), self.secret_token):
+            logger.warning(f"Rejected webhook call from {request.remote}: bad secret token.")
+            return web.Response(status=401)
+
+        if self.max_pending and len(self._tasks) >= self.max_pending:
+            logger.warning(f"Webhook backlog full ({len(self._tasks)} updates pending), asking Telegram to retry.")
+            return web.Response(status=503)
+
+        try:
+            update: Dict[str, Any] = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return web.Response(status=200)
+
+    async def _process(self, update: Dict[str, Any]) -> None:
+        async with self._semaphore:
+            try:
+                await self.dispatcher.feed_raw_update(self.bot, update)
+            except Exception as e:
+                logger.error(f"Failed to process webhook update {update.get('update_id')}: {e}", exc_info=True)
+
+    async def shutdown(self) -> None:
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} in-flight webhook updates...")
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def run_webhook_server(handler: WebhookUpdateHandler, host: str, port: int, path: str) -> None:
+    app = web.Application()
+    app.router.add_post(path, handler.handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=host, port=port)
+    await site.start()
+    logger.info(f"Webhook server listening on {host}:{port}{path}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await handler.shutdown()
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+from datetime import datetime, timezone
 
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
@@ -8,8 +9,13 @@ from aiogram.client.default import DefaultBotProperties
 from aiogram.types import BotCommand
 
 from app.core.config import settings
+from app.core.logging_config import setup_logging, parse_logger_settings
 from app.db.session import AsyncSessionLocal
-from app.middlewares.db import DbSessionMiddleware
+from app.middlewares.db import DbSessionMiddleware, AccessCheckMiddleware
+from app.middlewares.ordering import chat_ordering
+from app.storage.postgres import PostgresStorage
+from app.storage.redis import create_redis_storage
+from app.web.webhook import WebhookUpdateHandler, run_webhook_server
 
 from app.handlers.user.user_onboarding_handlers import user_onboarding_router
 from app.handlers.user.feature_handlers import feature_router as user_feature_router
@@ -19,22 +25,31 @@ from app.handlers.payment_handlers import payment_router
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-from app.tasks.scheduled_tasks import send_trial_ending_notifications
+from app.tasks.scheduled_tasks import (
+    send_trial_ending_notifications, flush_request_counts, expire_overdue_subscriptions_sweep, refill_case_pool, refresh_reference_digests,
+)
+from app.services.feedback_batcher import feedback_batcher
+from app.services.prompt_budget import preload_encoding
 
 async def main():
-    logging.basicConfig(
-        level=settings.LOG_LEVEL,
-        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
-        handlers=[
-            logging.FileHandler("app.log", encoding="utf-8"),
-            logging.StreamHandler()
-    ]
-)
     logger = logging.getLogger(__name__)
     logger.info("Starting bot...")
 
-    # Для продакшена лучше использовать RedisStorage
-    storage = MemoryStorage()
+    if settings.BOT_RUN_MODE == "webhook" and not settings.WEBHOOK_SECRET_TOKEN:
+        raise RuntimeError("BOT_RUN_MODE=webhook requires WEBHOOK_SECRET_TOKEN; without it anyone can post forged updates to the endpoint.")
+
+    if settings.FSM_STORAGE == "postgres":
+        storage = PostgresStorage(
+            session_pool=AsyncSessionLocal,
+            max_size=settings.FSM_CACHE_MAX_SIZE,
+            ttl_seconds=settings.FSM_CACHE_TTL_SECONDS,
+            flush_interval=settings.FSM_FLUSH_INTERVAL_MS / 1000,
+        )
+    elif settings.FSM_STORAGE == "redis":
+        storage = create_redis_storage(settings.REDIS_URL, ttl_seconds=settings.FSM_REDIS_TTL_SECONDS)
+    else:
+        storage = MemoryStorage()
+    logger.info(f"FSM storage: {type(storage).__name__}")
 
     bot = Bot(
         token=settings.TELEGRAM_BOT_TOKEN, 
@@ -42,7 +57,13 @@ async def main():
     )
     dp = Dispatcher(storage=storage)
 
+    dp.update.middleware(chat_ordering)
     dp.update.middleware(DbSessionMiddleware(session_pool=AsyncSessionLocal))
+    # Inner middleware: runs after the handler is resolved, so it can read the handler's skip_access_check flag
+    access_check = AccessCheckMiddleware()
+    dp.message.middleware(access_check)
+    dp.edited_message.middleware(access_check)
+    dp.callback_query.middleware(access_check)
     logger.info("Database session middleware registered.")
 
     dp.include_router(user_onboarding_router)
@@ -64,17 +85,67 @@ async def main():
     except Exception as e:
         logger.error(f"Failed to set bot commands: {e}")
 
+    # tiktoken may download its encoding on first use; do it here, off the event loop, instead of in the first AI request
+    await asyncio.to_thread(preload_encoding)
+
     scheduler = AsyncIOScheduler()
-    scheduler.add_job(send_trial_ending_notifications, 'interval', minutes=10, args=[bot])
+    scheduler.add_job(flush_request_counts, 'interval', seconds=settings.REQUEST_COUNT_FLUSH_SECONDS)
+    if settings.SCHEDULED_JOBS_ENABLED:
+        scheduler.add_job(send_trial_ending_notifications, 'interval', minutes=10, args=[bot])
+        scheduler.add_job(
+            expire_overdue_subscriptions_sweep, 'interval',
+            seconds=settings.SUBSCRIPTION_EXPIRY_SWEEP_SECONDS,
+            next_run_time=datetime.now(timezone.utc), # Catch up on anything that expired while the bot was down
+        )
+        if settings.CASE_POOL_SIZE > 0:
+            scheduler.add_job(
+                refill_case_pool, 'interval',
+                seconds=settings.CASE_POOL_REFILL_SECONDS,
+                next_run_time=datetime.now(timezone.utc),
+            )
+        if settings.REFERENCE_DIGESTS_ENABLED:
+            scheduler.add_job(
+                refresh_reference_digests, 'interval',
+                seconds=settings.REFERENCE_DIGEST_REFRESH_SECONDS,
+                next_run_time=datetime.now(timezone.utc),
+            )
     scheduler.start()
     logger.info("Scheduler started.")
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    logger.info("Starting polling...")
+    if settings.SCHEDULED_JOBS_ENABLED:
+        try:
+            await feedback_batcher.requeue_pending()
+        except Exception as e:
+            logger.error(f"Failed to re-queue pending feedback analyses: {e}", exc_info=True)
+
     try:
-        await dp.start_polling(bot)
+        if settings.BOT_RUN_MODE == "webhook":
+            if settings.WEBHOOK_BASE_URL:
+                await bot.set_webhook(
+                    url=f"{settings.WEBHOOK_BASE_URL.rstrip('/')}{settings.WEBHOOK_PATH}",
+                    secret_token=settings.WEBHOOK_SECRET_TOKEN,
+                    allowed_updates=dp.resolve_used_update_types(),
+                )
+            else:
+                logger.warning("WEBHOOK_BASE_URL is not set, not registering the webhook with Telegram (local mode).")
+            webhook_handler = WebhookUpdateHandler(
+                dispatcher=dp,
+                bot=bot,
+                secret_token=settings.WEBHOOK_SECRET_TOKEN,
+                max_concurrency=settings.WEBHOOK_MAX_CONCURRENCY,
+                max_pending=settings.WEBHOOK_MAX_PENDING,
+            )
+            logger.info("Starting webhook server...")
+            await run_webhook_server(webhook_handler, settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, settings.WEBHOOK_PATH)
+        else:
+            await bot.delete_webhook(drop_pending_updates=True)
+            logger.info("Starting polling...")
+            await dp.start_polling(bot)
     finally:
         scheduler.shutdown() # Shutdown scheduler on bot stop
+        await flush_request_counts()
+        await feedback_batcher.close()
+        await storage.close()
         await bot.session.close()
 
         from app.db.session import async_engine
@@ -82,7 +153,15 @@ async def main():
         logger.info("Bot stopped.")
 
 if __name__ == "__main__":
+    log_listener = setup_logging(
+        level=settings.LOG_LEVEL,
+        log_file=settings.LOG_FILE,
+        sampling={name: float(rate) for name, rate in parse_logger_settings(settings.LOG_SAMPLING).items()},
+        level_overrides=parse_logger_settings(settings.LOG_LEVEL_OVERRIDES),
+    )
     try:
         asyncio.run(main())
     except (KeyboardInterrupt, SystemExit):
-        logging.info("Bot stopped manually.") 
+        logging.info("Bot stopped manually.")
+    finally:
+        log_listener.stop()
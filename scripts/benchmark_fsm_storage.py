@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import statistics
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from app.core.config import settings
+from app.db.session import AsyncSessionLocal
+from app.storage.postgres import PostgresStorage
+from app.storage.redis import create_redis_storage
+
+# Simulates many users stepping through a dialog concurrently (set_state + update_data + get_data per
+# step) and reports per-operation latency for each FSM storage. The Postgres storage only persists
+# state for telegram ids that have a users row; use --first-user-id to point it at existing users.
+# With --redis-url memory:// the Redis storage runs against the in-process stand-in (MemoryStorage if redis is not installed).
+
+
+def build_storage(backend: str, redis_url: str):
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "postgres":
+        return PostgresStorage(
+            session_pool=AsyncSessionLocal,
+            max_size=settings.FSM_CACHE_MAX_SIZE,
+            ttl_seconds=settings.FSM_CACHE_TTL_SECONDS,
+            flush_interval=settings.FSM_FLUSH_INTERVAL_MS / 1000,
+        )
+    if backend == "redis":
+        return create_redis_storage(redis_url)
+    raise ValueError(f"Unknown backend: {backend}")
+
+
+async def simulated_user(storage, user_id: int, steps: int, latencies: list) -> None:
+    key = StorageKey(bot_id=0, chat_id=user_id, user_id=user_id)
+    for step in range(steps):
+        started_at = time.perf_counter()
+        await storage.set_state(key, f"BenchStates:step_{step}")
+        await storage.update_data(key, {"current_case_id": step, "last_menu_msg_id": user_id + step})
+        await storage.get_data(key)
+        latencies.append(time.perf_counter() - started_at)
+    await storage.set_state(key, None)
+    await storage.set_data(key, {})
+
+
+async def run_backend(backend: str, users: int, steps: int, first_user_id: int, redis_url: str) -> None:
+    storage = build_storage(backend, redis_url)
+    latencies: list = []
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulated_user(storage, first_user_id + i, steps, latencies) for i in range(users)))
+    finally:
+        await storage.close()
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1000
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+    print(f"{backend:>8}: {users} users x {steps} steps -> total {elapsed:.2f}s, "
+          f"step p50 {p50:.3f}ms, p99 {p99:.3f}ms ({type(storage).__name__})")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare FSM storage latency under concurrent updates.")
+    parser.add_argument("--backends", default="memory,postgres,redis")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--first-user-id", type=int, default=10_000_000)
+    parser.add_argument("--redis-url", default=settings.REDIS_URL)
+    args = parser.parse_args()
+
+    for backend in args.backends.split(","):
+        await run_backend(backend.strip(), args.users, args.steps, args.first_user_id, args.redis_url)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
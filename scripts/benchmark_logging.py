@@ -0,0 +1,80 @@
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from app.core.logging_config import setup_logging
+
+# Measures the logging cost the event loop pays per update. "before" replays the old setup
+# (basicConfig with a synchronous FileHandler and f-string messages). "after" uses the queue-based
+# pipeline with lazy key-value records and the default sampling of the middleware logger.
+# Console output goes to os.devnull so the terminal does not skew the numbers.
+
+HOT_LOGGER = "app.middlewares.db"
+
+
+def emit_before(logger: logging.Logger, update_id: int, user_id: int) -> None:
+    logger.info(f"[Middleware] Entered __call__ for raw event type: Update, Update ID: {update_id}")
+    logger.info(f"[Middleware] Actual event type: Message, User ID: {user_id}")
+    logger.info(f"[Middleware] Checking user_id: {user_id}. Found db_user: True")
+    logger.info(f"[Middleware] For user_id: {user_id}, db_user.is_blocked = False, role = UserRole.USER")
+
+
+def emit_after(logger: logging.Logger, update_id: int, user_id: int) -> None:
+    logger.info("[Middleware] Entered __call__", extra={"update_id": update_id})
+    logger.info("[Middleware] Actual event type: %s", "Message", extra={"update_id": update_id, "user_id": user_id})
+    logger.info("[Middleware] Checked user. Found db_user: %s", True, extra={"user_id": user_id})
+    logger.info("[Middleware] db_user.is_blocked = %s, role = %s", False, "UserRole.USER", extra={"user_id": user_id})
+
+
+def reset_root() -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def run(label: str, emit, updates: int) -> None:
+    logger = logging.getLogger(HOT_LOGGER)
+    started_at = time.perf_counter()
+    for update_id in range(updates):
+        emit(logger, update_id, 100_000 + update_id % 500)
+    elapsed = time.perf_counter() - started_at
+    print(f"{label:>7}: {updates} updates -> {elapsed / updates * 1_000_000:.1f}us logging overhead per update")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-update logging overhead before and after the queue-based pipeline.")
+    parser.add_argument("--updates", type=int, default=20_000)
+    parser.add_argument("--sampling", type=float, default=0.1, help="Fraction of hot-path INFO lines kept in the 'after' run")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir, open(os.devnull, "w") as devnull:
+        reset_root()
+        logging.basicConfig(
+            level="INFO",
+            format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+            handlers=[
+                logging.FileHandler(os.path.join(tmp_dir, "before.log"), encoding="utf-8"),
+                logging.StreamHandler(devnull),
+            ],
+        )
+        run("before", emit_before, args.updates)
+
+        reset_root()
+        listener = setup_logging(level="INFO", log_file=os.path.join(tmp_dir, "after.log"), sampling={"app.middlewares": args.sampling})
+        listener.handlers[0].setStream(devnull)
+        run("after", emit_after, args.updates)
+        listener.stop()
+
+        reset_root()
+        listener = setup_logging(level="INFO", log_file=os.path.join(tmp_dir, "after_unsampled.log"))
+        listener.handlers[0].setStream(devnull)
+        run("after*", emit_after, args.updates)
+        listener.stop()
+        print("(after* = queue pipeline without sampling)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.config import settings
+from app.db.session import release_connection
+
+# Simulates handlers that read from the DB, wait on a slow AI call and then persist the result,
+# and compares how long a burst of them takes when the session holds its connection across
+# the AI call versus when it releases it with release_connection().
+
+
+async def simulated_handler(session_pool: async_sessionmaker[AsyncSession], ai_latency: float, release: bool, peak: dict, engine) -> None:
+    async with session_pool() as session:
+        await session.execute(text("SELECT 1"))
+        peak["checked_out"] = max(peak["checked_out"], engine.pool.checkedout())
+        if release:
+            await release_connection(session)
+        await asyncio.sleep(ai_latency)
+        await session.execute(text("SELECT 1"))
+        peak["checked_out"] = max(peak["checked_out"], engine.pool.checkedout())
+        await session.commit()
+
+
+async def run_mode(release: bool, handlers: int, pool_size: int, ai_latency: float) -> None:
+    engine = create_async_engine(settings.DATABASE_URL, pool_size=pool_size, max_overflow=0, pool_timeout=300)
+    session_pool = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    peak = {"checked_out": 0}
+    started_at = time.perf_counter()
+    try:
+        await asyncio.gather(*(simulated_handler(session_pool, ai_latency, release, peak, engine) for _ in range(handlers)))
+    finally:
+        await engine.dispose()
+    elapsed = time.perf_counter() - started_at
+    mode = "release" if release else "hold"
+    print(f"{mode:>8}: {handlers} handlers, pool_size={pool_size}, ai_latency={ai_latency:.1f}s -> "
+          f"total {elapsed:.2f}s, peak checked out {peak['checked_out']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Compare pool occupancy with and without releasing the connection during AI calls.")
+    parser.add_argument("--handlers", type=int, default=20)
+    parser.add_argument("--pool-size", type=int, default=5)
+    parser.add_argument("--ai-latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    await run_mode(False, args.handlers, args.pool_size, args.ai_latency)
+    await run_mode(True, args.handlers, args.pool_size, args.ai_latency)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import aiohttp
+
+from app.core.config import settings
+from app.web.webhook import SECRET_TOKEN_HEADER
+
+# POSTs recorded Telegram updates (one Update JSON object per line) to a locally running bot in
+# BOT_RUN_MODE=webhook and reports response codes and latency. Without --updates-file it sends
+# synthetic "/help" messages from distinct users, which the bot answers without touching the DB.
+
+
+def synthetic_updates(count: int):
+    now = int(time.time())
+    for i in range(count):
+        user_id = 900_000_000 + i
+        yield {
+            "update_id": i + 1,
+            "message": {
+                "message_id": i + 1,
+                "date": now,
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"Load{i}"},
+                "text": "/help",
+                "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+            },
+        }
+
+
+def recorded_updates(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def post_update(http: aiohttp.ClientSession, url: str, headers: dict, update: dict, statuses: Counter, latencies: list, semaphore: asyncio.Semaphore):
+    async with semaphore:
+        started_at = time.perf_counter()
+        async with http.post(url, json=update, headers=headers) as response:
+            await response.read()
+            statuses[response.status] += 1
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay Telegram updates against the local webhook server.")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{settings.WEBHOOK_PORT}{settings.WEBHOOK_PATH}")
+    parser.add_argument("--updates-file", help="JSONL file with one recorded Update per line")
+    parser.add_argument("--count", type=int, default=500, help="Number of synthetic updates when no file is given")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--secret-token", default=settings.WEBHOOK_SECRET_TOKEN)
+    args = parser.parse_args()
+
+    updates = list(recorded_updates(args.updates_file) if args.updates_file else synthetic_updates(args.count))
+    headers = {SECRET_TOKEN_HEADER: args.secret_token} if args.secret_token else {}
+    statuses: Counter = Counter()
+    latencies: list = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    started_at = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(post_update(http, args.url, headers, update, statuses, latencies, semaphore) for update in updates))
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else 0.0
+    print(f"Sent {len(updates)} updates in {elapsed:.2f}s ({len(updates) / elapsed:.0f}/s), "
+          f"response p50 {p50:.1f}ms, p99 {p99:.1f}ms, statuses {dict(statuses)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("openai")
+
+from app.services.ai_providers import AIDeadlineExceeded, AIProvider, AIProviderRouter, TaskPolicy
+from app.services.ai_scheduler import AIPriority, ai_priority
+
+
+def make_router(behaviour):
+    """behaviour maps a provider name to (delay in seconds, error or None); every provider has enough latency samples to hedge."""
+    providers = [AIProvider(name, client=None) for name in behaviour]
+    for provider in providers:
+        provider.latency.add(0.05)
+    policy = TaskPolicy(providers=tuple(behaviour), deadline=5.0, hedge_percentile=0.95)
+    router = AIProviderRouter(providers, {"default": policy}, hedge_min_samples=1)
+    calls = []
+
+    async def fake_call(provider, policy, model, messages, deadline_at, **kwargs):
+        calls.append(provider.name)
+        delay, error = behaviour[provider.name]
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return provider.name
+
+    router._call_with_retries = fake_call
+    return router, calls
+
+
+async def complete_as_user(router):
+    # Background calls are never hedged
+    with ai_priority(AIPriority.STANDARD):
+        return await router.complete("default", "gpt-4o", [])
+
+
+def test_primary_failing_before_the_hedge_fails_over_to_the_secondary():
+    router, calls = make_router({"primary": (0, RuntimeError("down")), "secondary": (0, None), "tertiary": (0, None)})
+
+    result = asyncio.run(complete_as_user(router))
+
+    assert result == "secondary"
+    assert calls == ["primary", "secondary"]
+    assert router.hedges_started == 0
+    assert router.failovers == 1
+
+
+def test_failed_hedge_skips_the_secondary_it_already_tried():
+    router, calls = make_router({"primary": (0.2, RuntimeError("slow")), "secondary": (0, RuntimeError("down")), "tertiary": (0, None)})
+
+    result = asyncio.run(complete_as_user(router))
+
+    assert result == "tertiary"
+    assert calls == ["primary", "secondary", "tertiary"]
+    assert router.hedges_started == 1
+    assert router.failovers == 1
+
+
+class SlowStreamClient:
+    """Streams a delta every gap seconds, forever, so only the task deadline can end the call."""
+
+    def __init__(self, gap):
+        self.gap = gap
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, **kwargs):
+        return self._deltas()
+
+    async def _deltas(self):
+        while True:
+            await asyncio.sleep(self.gap)
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="x"))])
+
+
+def test_stream_deadline_bounds_the_whole_call():
+    provider = AIProvider("primary", client=SlowStreamClient(gap=0.05))
+    router = AIProviderRouter([provider], {"default": TaskPolicy(providers=("primary",), deadline=0.3)})
+    deltas = []
+
+    async def consume():
+        async for delta in router.stream("default", "gpt-4o", []):
+            deltas.append(delta)
+
+    # Every gap between deltas is far below the deadline; the stream as a whole still has to stop
+    with pytest.raises(AIDeadlineExceeded):
+        asyncio.run(consume())
+    assert deltas
+    assert router.deadline_exceeded == 1
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("openai")
+
+from app.handlers.case import case_lifecycle_handlers
+from app.services.reference_cache import render_references_block, ActiveReferenceSet
+
+
+class FakeSession:
+    """Tracks whether a transaction, and with it a pooled connection, is held."""
+
+    def __init__(self):
+        self.transaction_open = False
+        self.commits = 0
+
+    def in_transaction(self) -> bool:
+        return self.transaction_open
+
+    async def execute(self, *args, **kwargs):
+        self.transaction_open = True
+
+    async def commit(self):
+        self.transaction_open = False
+        self.commits += 1
+
+    async def flush(self):
+        self.transaction_open = True
+
+
+def test_case_generation_releases_connection_before_ai_call(monkeypatch):
+    session = FakeSession()
+    references = [{"type": "book", "description": "Когнитивная терапия депрессии"}]
+    events = []
+
+    async def claim(db):
+        return None
+
+    async def get_active_reference_set(db):
+        await db.execute("SELECT ...")
+        return ActiveReferenceSet(version=0, references=tuple(references), prompt_block=render_references_block(references))
+
+    async def generate_case_from_ai(**kwargs):
+        events.append(("ai", session.in_transaction()))
+        return {"title": "Кейс", "description": "Описание"}
+
+    async def create_case(db, **kwargs):
+        events.append(("save", None))
+        return type("Case", (), {"id": 1})()
+
+    monkeypatch.setattr(case_lifecycle_handlers.case_pool, "claim", claim)
+    monkeypatch.setattr(case_lifecycle_handlers, "get_active_reference_set", get_active_reference_set)
+    monkeypatch.setattr(case_lifecycle_handlers, "generate_case_from_ai", generate_case_from_ai)
+    monkeypatch.setattr(case_lifecycle_handlers, "create_case", create_case)
+
+    new_case, error = asyncio.run(case_lifecycle_handlers._generate_new_case_content(session, user_id=1))
+
+    assert error is None and new_case.id == 1
+    assert events == [("ai", False), ("save", None)], "the AI call must run without a transaction holding a connection"
+    assert session.commits == 1
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip("dotenv")
+
+from app.services import prompt_budget
+
+
+class OfflineTiktoken:
+    """Fails like tiktoken does when the BPE file is not cached and there is no network."""
+
+    def __init__(self):
+        self.loads = 0
+
+    def encoding_for_model(self, model):
+        self.loads += 1
+        raise ConnectionError("network is unreachable")
+
+    def get_encoding(self, name):
+        self.loads += 1
+        raise ConnectionError("network is unreachable")
+
+
+@pytest.fixture
+def offline_tiktoken(monkeypatch):
+    fake = OfflineTiktoken()
+    monkeypatch.setattr(prompt_budget, "tiktoken", fake, raising=False)
+    monkeypatch.setattr(prompt_budget, "TIKTOKEN_AVAILABLE", True)
+    monkeypatch.setattr(prompt_budget, "_encodings", {})
+    monkeypatch.setattr(prompt_budget, "_encoding_load_failed", False)
+    return fake
+
+
+def test_count_tokens_falls_back_to_the_estimate_when_the_encoding_cannot_load(offline_tiktoken):
+    text = "Снизилась конверсия в оплату, what next?"
+
+    assert prompt_budget.count_tokens(text, "gpt-4o-mini") == prompt_budget._estimate_tokens(text)
+    assert prompt_budget.count_tokens(text, "gpt-4o") == prompt_budget._estimate_tokens(text)
+    # The failed load is not retried on every call
+    assert offline_tiktoken.loads == 1
+
+
+def test_preload_encoding_reports_failure(offline_tiktoken):
+    assert prompt_budget.preload_encoding() is False
+    assert prompt_budget.truncate_to_tokens("слово " * 200, 20, "gpt-4o-mini").endswith(prompt_budget.TRUNCATION_MARKER)
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("pydantic")
+
+from app.services import ai_service
+from app.services.reference_cache import render_references_block
+
+# Providers only reuse a cached prompt prefix if it is byte-identical, so nothing that changes per call may
+# reach the system message.
+FIRST_REFERENCES = [
+    {"type": "BOOK", "description": "Основы продуктового менеджмента", "url": "https://example.com/book", "citation": "Автор, 2020"},
+]
+SECOND_REFERENCES = [
+    {"type": "ARTICLE", "description": "Приоритизация бэклога по RICE", "url": None, "citation": None},
+    {"type": "COURSE", "description": "Юнит-экономика подписочного сервиса", "url": "https://example.com/course", "citation": None},
+]
+
+
+def system_message(messages):
+    assert messages[0]["role"] == "system"
+    return messages[0]["content"].encode("utf-8")
+
+
+def test_case_generation_system_message_is_static():
+    first = ai_service._build_case_generation_messages(
+        "Кейс про запуск B2B-продукта", FIRST_REFERENCES, render_references_block(FIRST_REFERENCES), record=False
+    )
+    second = ai_service._build_case_generation_messages(
+        None, SECOND_REFERENCES, render_references_block(SECOND_REFERENCES), record=False
+    )
+
+    assert system_message(first) == system_message(second)
+    assert "Основы продуктового менеджмента" in first[1]["content"]
+    assert "Приоритизация бэклога по RICE" in second[1]["content"]
+
+
+def test_solution_analysis_system_message_is_static():
+    first = ai_service._build_solution_analysis_messages(
+        "Снизилась конверсия в оплату.", "Проверю воронку и проведу интервью.",
+        FIRST_REFERENCES, render_references_block(FIRST_REFERENCES), record=False
+    )
+    second = ai_service._build_solution_analysis_messages(
+        "Команда не успевает к релизу.", "Урежу скоуп до MVP.",
+        SECOND_REFERENCES, render_references_block(SECOND_REFERENCES), record=False
+    )
+    no_references = ai_service._build_solution_analysis_messages(
+        "Команда не успевает к релизу.", "Урежу скоуп до MVP.", None, None, record=False
+    )
+
+    assert system_message(first) == system_message(second) == system_message(no_references)
+    assert "Снизилась конверсия в оплату." in first[1]["content"]
+    assert "Урежу скоуп до MVP." in second[1]["content"]
@@ -0,0 +1,26 @@
+import html
+
+import pytest
+
+pytest.importorskip("aiogram")
+
+from app.utils.throttled_editor import truncate_html
+
+
+def test_short_text_is_unchanged():
+    assert truncate_html("<b>Кейс</b>", 100) == "<b>Кейс</b>"
+
+
+def test_cut_never_splits_an_entity():
+    text = "<b>Title</b>\n\n" + html.escape("R&D " * 50)
+    limit = text.index("&amp;", 40) + 2
+
+    assert truncate_html(text, limit) == text[:text.index("&amp;", 40)] + "…"
+
+
+def test_cut_inside_a_tag_drops_the_tag_and_closes_open_ones():
+    text = "<b>Сильные стороны:</b>\n- пункт\n\n<b>Области для улучшения:</b>\n- пункт"
+    limit = text.index("<b>", 5) + 2
+
+    assert truncate_html(text, limit) == text[:text.index("<b>", 5)] + "…"
+    assert truncate_html("<b>" + "x" * 50 + "</b>", 20) == "<b>" + "x" * 17 + "…</b>"